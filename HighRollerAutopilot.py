@@ -0,0 +1,273 @@
+"""Follow-target autopilot: keeps a tracked target centred in the video and at a set size.
+
+A tracker finds the target in the newest CameraFrame and three PID controllers turn where it is
+into RC velocities: yaw and climb centre it, forward/back holds its size and so the distance.
+The autopilot publishes straight to DroneMovementThread from its own thread, as each frame
+comes in and at most at a fixed control rate, so a command never waits for the render loop. A tracker is any callable that takes a
+downscaled RGB image and returns one Detection (see HighRollerVision) or None:
+
+- "marker": the largest ArUco marker, like the one in the simulator's video,
+- "color": the centroid of the pixels within an HSV range, red by default.
+"""
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from HighRollerProfiling import LatencyHistogram, SpanRing
+from HighRollerVision import Detection, MarkerDetector, downscale
+
+#What the autopilot is doing: state is 'off', 'tracking', 'lost' (target not seen for a moment,
+#holding the last command), 'searching' (not seen for longer, hovering), 'stale' (no fresh video,
+#hovering) or 'override' (the pilot is flying). target is the last Detection while tracking and
+#frame_age the seconds from decoding the frame to publishing the command based on it.
+AutopilotStatus = namedtuple('AutopilotStatus', ['state', 'target', 'frame_age', 'timestamp'])
+
+
+class MarkerTracker:
+    """The largest ArUco marker in view, or the one with marker_id if given."""
+
+    def __init__(self, marker_id=None):
+        self.detector = MarkerDetector()
+        self.label = None if marker_id is None else f"marker {marker_id}"
+
+    def __call__(self, image):
+        detections = [d for d in self.detector(image) if self.label is None or d.label == self.label]
+        return max(detections, key=lambda d: d.width * d.height, default=None)
+
+
+class ColorTracker:
+    """Centroid of the pixels whose HSV color is within lower..upper (OpenCV ranges, hue 0-179).
+
+    The box spans the 5th to 95th percentile of those pixels, so stray specks elsewhere in the
+    frame barely move it. Below min_fraction of the frame the target counts as not seen.
+    """
+
+    def __init__(self, lower=(0, 120, 70), upper=(10, 255, 255), min_fraction=0.001):
+        self.lower = np.array(lower, dtype=np.uint8)
+        self.upper = np.array(upper, dtype=np.uint8)
+        self.min_fraction = min_fraction
+
+    def __call__(self, image):
+        mask = cv2.inRange(cv2.cvtColor(image, cv2.COLOR_RGB2HSV), self.lower, self.upper)
+        ys, xs = np.nonzero(mask)
+        height, width = mask.shape
+        if len(xs) < self.min_fraction * width * height:
+            return None
+        left, right = np.percentile(xs, (5, 95))
+        top, bottom = np.percentile(ys, (5, 95))
+        return Detection("color", left / width, top / height, (right - left + 1) / width,
+                         (bottom - top + 1) / height, len(xs) / (width * height))
+
+
+#Trackers by name, for picking one in the controllers
+TRACKERS = {
+    'marker': MarkerTracker,
+    'color': ColorTracker,
+}
+
+
+class PID:
+    """PID controller on an error. The integral is clamped to +/- integral_limit so it can't
+    wind up while the drone can't keep up."""
+
+    def __init__(self, kp, ki=0.0, kd=0.0, integral_limit=0.5):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.integral_limit = integral_limit
+        self.reset()
+
+    def update(self, error, dt):
+        self.integral = min(max(self.integral + error * dt, -self.integral_limit), self.integral_limit)
+        derivative = 0.0 if self.previous is None or dt <= 0 else (error - self.previous) / dt
+        self.previous = error
+        return self.kp * error + self.ki * self.integral + self.kd * derivative
+
+    def reset(self):
+        self.integral = 0.0
+        self.previous = None
+
+
+class Autopilot:
+    """Flies the drone towards a tracked target through a DroneMovementThread.
+
+    While engaged, a control thread ticks at most `rate` times a second. A tick starts as soon as
+    the camera publishes a new frame, rather than on a clock of its own, so frames don't wait
+    for the next tick; without new frames it still ticks every 1 / rate seconds for the
+    watchdog. Every command comes from a frame not acted on before. The tracker runs on a copy
+    downscaled to `width` pixels wide, which keeps the time from frame to command short and
+    steady. That time is recorded per command in `latency`.
+
+    Safety:
+    - Watchdog: if the newest frame is older than stale_after seconds, when the tick starts or by
+      the time its command is ready, the drone is told to hover instead. A command is never
+      based on older video than that.
+    - A target lost for longer than lost_after seconds makes the drone hover as well.
+    - Override: call pilot_input() with the pilot's RC vector every frame. Any stick or key input
+      hands control to the pilot at once, and back override_hold seconds after it stops. Both
+      sides publish under one lock, so an autopilot command can never land after the pilot's.
+    """
+
+    WAIT_TIMEOUT = 0.5  #Seconds between checks of the autopilot state while disengaged
+
+    def __init__(self, camera, movement, tracker=MarkerTracker, rate=30, width=320, stale_after=0.25,
+                 lost_after=0.5, override_hold=1.0, target_size=0.15, max_speed=50):
+        self.camera = camera
+        self.movement = movement
+        self.tracker = tracker()
+        self.period = 1.0 / rate
+        self.width = width
+        self.stale_after = stale_after
+        self.lost_after = lost_after
+        self.override_hold = override_hold
+        self.target_size = target_size  #Target height as a fraction of the frame to hold it at
+        self.max_speed = max_speed
+
+        #Errors are fractions of the frame, outputs RC speeds
+        self.yaw_pid = PID(150, 20, 10)  #Target right of centre -> turn right
+        self.climb_pid = PID(200, 20, 10)  #Target below centre -> descend
+        self.distance_pid = PID(400, 0, 20)  #Target smaller than target_size -> fly forward
+
+        self.lock = threading.Lock()  #Serialises publishing with the pilot's override
+        self.engaged = False
+        self.override_until = 0.0
+        self.last_sequence = None  #Frame last acted on
+        self.last_step = None  #When the PIDs last ran
+        self.lost_since = None
+        self.status = AutopilotStatus('off', None, None, time.monotonic())
+        self.commands = 0
+        self.watchdog_trips = 0
+        self.latency = LatencyHistogram()  #Decode of a frame to the command based on it being published
+        self.spans = SpanRing()  #One sample per command: seconds from decode to publish
+        self.wake = threading.Event()
+        self.running = True
+        self.thread = threading.Thread(target=self.update, daemon=True)
+        self.thread.start()
+
+    def engage(self):
+        with self.lock:
+            self.engaged = True
+            self.override_until = 0.0
+        self.wake.set()
+
+    def disengage(self):
+        """Stop following. The drone is told to hover unless the pilot is flying it."""
+        with self.lock:
+            if self.engaged and time.monotonic() >= self.override_until:
+                self.movement.set_velocity(0, 0, 0, 0)
+            self.engaged = False
+            self.status = AutopilotStatus('off', None, None, time.monotonic())
+
+    def pilot_input(self, velocity):
+        """Call with the pilot's RC vector every frame. Returns True if the pilot has control and
+        the vector should be sent: always while disengaged, otherwise while any axis is off zero
+        and for override_hold seconds after."""
+        if not self.engaged:
+            return True
+        now = time.monotonic()
+        with self.lock:
+            if any(velocity):
+                self.override_until = now + self.override_hold
+            return now < self.override_until
+
+    def publish(self, velocity, status, frame=None):
+        """Send a command unless the pilot has taken over or the autopilot was disengaged meanwhile."""
+        with self.lock:
+            if not self.engaged or time.monotonic() < self.override_until:
+                return
+            self.movement.set_velocity(*velocity)
+            self.status = status
+            published = time.monotonic()
+        self.commands += 1
+        if frame is not None:
+            self.latency.add(published - frame.timestamp)
+            self.spans.record(published - frame.timestamp, published)
+
+    def hover(self, state, now):
+        self.yaw_pid.reset()
+        self.climb_pid.reset()
+        self.distance_pid.reset()
+        self.last_step = None
+        self.publish((0, 0, 0, 0), AutopilotStatus(state, None, None, now))
+
+    def step(self, now):
+        """One control tick."""
+        if now < self.override_until:
+            if self.status.state != 'override':
+                self.status = AutopilotStatus('override', None, None, now)
+                self.yaw_pid.reset()
+                self.climb_pid.reset()
+                self.distance_pid.reset()
+                self.last_step = None
+            return
+
+        frame = self.camera.get_frame()
+        if frame is None or now - frame.timestamp > self.stale_after:
+            if self.status.state != 'stale':
+                self.watchdog_trips += 1
+                print("Autopilot: video is stale, hovering.")
+            self.hover('stale', now)
+            return
+        if frame.sequence == self.last_sequence:
+            return
+        self.last_sequence = frame.sequence
+
+        target = self.tracker(downscale(frame.image, self.width))
+        ready = time.monotonic()
+        if ready - frame.timestamp > self.stale_after:
+            self.watchdog_trips += 1
+            self.hover('stale', ready)  #Tracking took too long for the command to still be right
+            return
+        if target is None:
+            self.lost_since = self.lost_since or frame.timestamp
+            if frame.timestamp - self.lost_since > self.lost_after:
+                if self.status.state != 'searching':
+                    self.hover('searching', ready)
+            else:
+                self.status = AutopilotStatus('lost', self.status.target, None, ready)
+            return
+        self.lost_since = None
+
+        dt = self.period if self.last_step is None else min(ready - self.last_step, self.lost_after)
+        self.last_step = ready
+        offset_x = target.x + target.width / 2 - 0.5
+        offset_y = target.y + target.height / 2 - 0.5
+        yaw = self.yaw_pid.update(offset_x, dt)
+        climb = -self.climb_pid.update(offset_y, dt)
+        forward = self.distance_pid.update(self.target_size - target.height, dt)
+        velocity = np.clip(np.rint((0.0, forward, climb, yaw)), -self.max_speed, self.max_speed).astype(int)
+        self.publish(tuple(velocity.tolist()), AutopilotStatus('tracking', target, ready - frame.timestamp, ready),
+                     frame)
+
+    def update(self):
+        next_tick = time.monotonic()
+        while self.running:
+            if not self.engaged:
+                self.wake.wait(self.WAIT_TIMEOUT)
+                self.wake.clear()
+                next_tick = time.monotonic()
+                self.last_sequence = None
+                self.last_step = None
+                self.lost_since = None
+                continue
+
+            now = time.monotonic()
+            if now < next_tick:
+                time.sleep(next_tick - now)
+            self.camera.wait_for_frame(self.last_sequence, self.period)
+            now = time.monotonic()
+            next_tick = now + self.period * 0.9  #Leave room for camera jitter at a rate equal to its FPS
+            try:
+                self.step(now)
+            except Exception as e:
+                print(f"Error in autopilot: {e}")
+                self.hover('stale', time.monotonic())
+
+    def stop(self):
+        self.disengage()
+        self.running = False
+        self.wake.set()
+        self.thread.join()
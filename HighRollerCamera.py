@@ -0,0 +1,206 @@
+import threading
+import time
+from collections import namedtuple
+
+from djitellopy.tello import BackgroundFrameRead
+
+from HighRollerFrameBus import FrameBus
+from HighRollerProfiling import SpanRing
+
+#A decoded frame plus its order, the monotonic time it came out of the decoder and the
+#monotonic time CameraThread received it (None until it has)
+CameraFrame = namedtuple('CameraFrame', ['sequence', 'timestamp', 'image', 'received'], defaults=(None,))
+
+
+class NotifyingFrameRead(BackgroundFrameRead):
+    """djitellopy's frame reader, but it wakes up waiters whenever the decoder stores a frame.
+
+    BackgroundFrameRead only keeps the latest image in `frame`, so the only way to notice a new
+    one is to poll. Every decoded image goes through the `frame` setter, which is where we bump
+    the sequence number and notify.
+    """
+
+    def __init__(self, tello, address):
+        #Must exist before the base class stores its placeholder frame through the setter
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.timestamp = time.monotonic()
+        self._latest = None
+        super().__init__(tello, address)
+
+        #Forget the blank placeholder the base class stores before anything is decoded
+        self.sequence = 0
+        self._latest = None
+
+    @property
+    def frame(self):
+        return self._latest
+
+    @frame.setter
+    def frame(self, value):
+        with self.condition:
+            self._latest = value
+            self.sequence += 1
+            self.timestamp = time.monotonic()
+            self.condition.notify_all()
+
+    def wait_for_frame(self, last_sequence, timeout=None):
+        """Block until a frame newer than last_sequence exists. Returns None on timeout."""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.sequence != last_sequence, timeout):
+                return None
+            return CameraFrame(self.sequence, self.timestamp, self._latest)
+
+    def stop(self):
+        super().stop()
+        with self.condition:
+            self.condition.notify_all()
+
+
+def get_notifying_frame_read(drone):
+    """Install a NotifyingFrameRead on the drone in place of get_frame_read()'s reader."""
+    reader = drone.background_frame_read
+    if not isinstance(reader, NotifyingFrameRead):
+        reader = NotifyingFrameRead(drone, drone.get_udp_video_address())
+        drone.background_frame_read = reader
+        reader.start()
+    return reader
+
+
+class CameraThread:
+    """Long-lived worker that publishes the newest CameraFrame from the drone.
+
+    start() shows the feed and pause() hides it; both can be called any number of times. After a
+    pause the video stream is left on for grace_period seconds so the decoder stays warm and the
+    next start() gets a frame right away instead of waiting for streamon and a new keyframe.
+    streamon/streamoff run on the worker, never on the caller's thread, holding command_lock so
+    they can't take another thread's reply (see CommandExecutor). stop() ends the worker.
+
+    frame_source is anything with wait_for_frame(last_sequence, timeout); by default the drone's
+    own frame_source if it has one (a flight log replay), otherwise its video stream read through
+    a NotifyingFrameRead.
+
+    The newest frame is always in `frame`, for the display. Consumers that need every frame or
+    their own back-pressure (recording, analysis) subscribe to `bus` instead, see HighRollerFrameBus.
+    """
+
+    WAIT_TIMEOUT = 0.5  #Seconds between checks of the worker state while no frames arrive
+
+    def __init__(self, drone, frame_source=None, grace_period=10.0, command_lock=None):
+        self.drone = drone
+        self.command_lock = command_lock or threading.Lock()
+        self.frame_source = frame_source
+        self.grace_period = grace_period
+        self.frame = None
+        self.sequence = 0  #Published frames, keeps counting across stream restarts
+        self.running = True
+        self.streaming = False  #Whether the feed is wanted
+        self.stream_on = False  #Whether streamon has been sent
+        self.paused_at = 0.0
+        self.dropped = 0  #Decoded frames replaced before this thread picked them up
+        self.count_drops = False  #False until a frame has been published since start()
+        self.spans = SpanRing()  #One sample per published frame: seconds from decode to publish
+        self.bus = FrameBus()  #Gets every published frame
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.update, daemon=True)
+
+    def start(self):
+        with self.condition:
+            self.streaming = True
+            self.count_drops = False  #Frames decoded while paused were never meant to be shown
+            self.condition.notify_all()
+        if self.thread.ident is None:
+            self.thread.start()
+
+    def pause(self):
+        with self.condition:
+            self.streaming = False
+            self.paused_at = time.monotonic()
+            self.frame = None
+            self.condition.notify_all()
+
+    def grace_remaining(self):
+        """Seconds until a paused stream is switched off, or None if there is nothing to switch off."""
+        if not self.stream_on:
+            return None
+        return max(0.0, self.paused_at + self.grace_period - time.monotonic())
+
+    def update(self):
+        source = None
+        source_sequence = 0
+        while True:
+            with self.condition:
+                #Sleep while paused until resumed, stopped or the grace period runs out
+                while self.running and not self.streaming and self.grace_remaining() != 0.0:
+                    self.condition.wait(self.grace_remaining())
+                if not self.running:
+                    break
+                streaming = self.streaming
+
+            try:
+                if not streaming:
+                    with self.command_lock:
+                        self.drone.streamoff()
+                    self.stream_on = False
+                    source = None
+                    continue
+
+                if not self.stream_on:
+                    with self.command_lock:
+                        self.drone.streamon()
+                    self.stream_on = True
+                if source is None:
+                    source = (self.frame_source or getattr(self.drone, 'frame_source', None)
+                              or get_notifying_frame_read(self.drone))
+                    source_sequence = 0
+
+                frame = source.wait_for_frame(source_sequence, self.WAIT_TIMEOUT)
+                if frame is not None and frame.image is not None:
+                    published = None
+                    with self.condition:
+                        if self.streaming:
+                            if self.count_drops and source_sequence:
+                                self.dropped += max(0, frame.sequence - source_sequence - 1)
+                            self.count_drops = True
+                            received = time.monotonic()
+                            self.sequence += 1
+                            published = self.frame = CameraFrame(self.sequence, frame.timestamp, frame.image, received)
+                            self.spans.record(received - frame.timestamp, received)
+                            self.condition.notify_all()  #Wakes wait_for_frame()
+                    source_sequence = frame.sequence
+                    if published is not None:
+                        self.bus.publish(published)  #Only blocks for subscribers with the 'block' policy
+            except Exception as e:
+                print(f"Error in camera thread: {e}")
+                time.sleep(self.WAIT_TIMEOUT)  #Don't hammer a stream that is failing
+
+        if self.stream_on:
+            try:
+                with self.command_lock:
+                    self.drone.streamoff()
+            except Exception as e:
+                print(f"Error turning off camera stream: {e}")
+            self.stream_on = False
+
+    def get_frame(self):
+        return self.frame
+
+    def wait_for_frame(self, last_sequence, timeout=None):
+        """Block until a frame other than last_sequence is published, like a frame source does.
+        Returns None on timeout or once the thread is stopped."""
+        with self.condition:
+            self.condition.wait_for(lambda: not self.running or (self.frame is not None
+                                                                 and self.frame.sequence != last_sequence), timeout)
+            frame = self.frame
+        if frame is None or frame.sequence == last_sequence:
+            return None
+        return frame
+
+    def stop(self):
+        """Shut the worker down and turn off the stream. Safe to call more than once."""
+        with self.condition:
+            self.running = False
+            self.streaming = False
+            self.condition.notify_all()
+        if self.thread.ident is not None:
+            self.thread.join()
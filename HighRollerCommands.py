@@ -0,0 +1,60 @@
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+#Latest state of a discrete command: state is 'running', 'ok' or 'failed'
+CommandStatus = namedtuple('CommandStatus', ['name', 'state', 'message', 'timestamp'])
+
+
+class CommandExecutor:
+    """Runs blocking drone commands (takeoff, land, flips) on one dedicated worker thread.
+
+    submit() returns a Future right away so the pygame loop keeps rendering while the Tello
+    takes seconds to answer "ok". Commands run one at a time in submission order, and a command
+    is rejected while one with the same name is still queued or running. `status` always holds
+    the CommandStatus of the most recent command for the HUD.
+
+    Each command runs holding command_lock. djitellopy matches a reply to whichever command asks
+    for one first, so every thread that sends the drone a command and waits for its reply
+    (connecting, streamon/streamoff) must take the same lock, or replies get swapped.
+    """
+
+    def __init__(self, command_lock=None):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='drone-command')
+        self.command_lock = command_lock or threading.Lock()
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.status = None
+
+    def submit(self, name, function, *args):
+        """Queue function(*args) under name. Returns a Future, or None if name is already in flight."""
+        with self.lock:
+            if name in self.pending:
+                print(f"{name} already in progress, ignoring.")
+                return None
+            self.pending.add(name)
+        return self.executor.submit(self.run, name, function, args)
+
+    def is_pending(self, name):
+        return name in self.pending
+
+    def run(self, name, function, args):
+        self.status = CommandStatus(name, 'running', "", time.monotonic())
+        try:
+            with self.command_lock:
+                result = function(*args)
+        except Exception as e:
+            print(f"Error during {name}: {e}")
+            self.status = CommandStatus(name, 'failed', str(e), time.monotonic())
+            raise
+        else:
+            self.status = CommandStatus(name, 'ok', "", time.monotonic())
+            return result
+        finally:
+            with self.lock:
+                self.pending.discard(name)
+
+    def stop(self, wait=True):
+        """Stop accepting commands. With wait, blocks until everything queued has run."""
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import namedtuple
+
+from djitellopy import TelloException
+
+#Where the connection stands: state is 'connecting', 'retrying' or 'connected'. retry_at is the
+#monotonic time of the next attempt while retrying, otherwise None.
+ConnectionStatus = namedtuple('ConnectionStatus', ['state', 'attempt', 'message', 'retry_at'])
+
+
+class DroneConnection:
+    """Puts the drone into SDK mode on a background thread, so the window never waits for it.
+
+    Each attempt sends "command" once and waits up to attempt_timeout whole seconds for the reply
+    and the first state packet, like Tello.connect(). Failed attempts are retried with exponential
+    backoff from initial_backoff up to max_backoff seconds, for as long as it takes: the drone is
+    often switched on after the controller. `status` always holds the current ConnectionStatus
+    for the HUD and `connected` is set once the drone answers. on_connect, if given, runs on this
+    thread before that, e.g. to turn the video stream on. "command" and the battery query are sent
+    holding command_lock, see CommandExecutor.
+    """
+
+    def __init__(self, drone, on_connect=None, attempt_timeout=3, initial_backoff=0.5, max_backoff=8.0,
+                 command_lock=None):
+        self.drone = drone
+        self.command_lock = command_lock or threading.Lock()
+        self.on_connect = on_connect
+        self.attempt_timeout = attempt_timeout
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.status = ConnectionStatus('connecting', 1, "", None)
+        self.battery = None  #Reported once on connecting, the HUD has live telemetry after that
+        self.connected = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.update, daemon=True)
+        self.thread.start()
+
+    def is_connected(self):
+        return self.connected.is_set()
+
+    def attempt(self):
+        """One try at entering SDK mode. Raises on failure."""
+        retry_count = self.drone.retry_count
+        self.drone.retry_count = 1  #Retrying is this thread's job, with backoff in between
+        try:
+            with self.command_lock:
+                self.drone.send_control_command('command', self.attempt_timeout)
+        finally:
+            self.drone.retry_count = retry_count
+
+        deadline = time.monotonic() + self.attempt_timeout
+        while not self.drone.get_current_state():
+            if time.monotonic() > deadline:
+                raise TelloException('Did not receive a state packet from the Tello')
+            time.sleep(0.05)
+        with self.command_lock:
+            return self.drone.get_battery()
+
+    def update(self):
+        backoff = self.initial_backoff
+        attempt = 1
+        while not self.stopping.is_set():
+            self.status = ConnectionStatus('connecting', attempt, "", None)
+            try:
+                self.battery = self.attempt()
+            except Exception as e:
+                print(f"Could not connect to the drone (attempt {attempt}), retrying in {backoff:.1f}s: {e}")
+                self.status = ConnectionStatus('retrying', attempt, str(e), time.monotonic() + backoff)
+                self.stopping.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                attempt += 1
+                continue
+
+            print(f"Battery life: {self.battery}")
+            if self.on_connect is not None:
+                try:
+                    self.on_connect()
+                except Exception as e:
+                    print(f"Error after connecting: {e}")
+            self.status = ConnectionStatus('connected', attempt, "", None)
+            self.connected.set()
+            return
+
+    def stop(self):
+        #An attempt in flight can take attempt_timeout to give up; the thread is a daemon, so
+        #shutting down doesn't wait for more than a moment
+        self.stopping.set()
+        self.thread.join(0.1)
@@ -0,0 +1,224 @@
+"""Decodes the Tello video stream in a separate process and hands frames back through shared memory.
+
+djitellopy decodes with PyAV on a thread of the controller process, and converting each frame
+then competes with pygame for the GIL. DecoderProcess runs that work in a child process instead:
+the child decodes, resizes straight into a slot of a SharedFrameRing and pings the parent over a
+loopback UDP socket. The parent reads the slot in place, so a display-sized frame reaches the
+screen without being copied (see FramePipeline.convert).
+
+The child is started as its own interpreter (python HighRollerDecoder.py ...) rather than through
+multiprocessing, which would re-run the controller script in the child on spawn platforms. It
+exits when the parent closes its stdin, which also happens if the parent dies.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import av
+import numpy as np
+from djitellopy import Tello
+
+from HighRollerCamera import CameraFrame
+
+
+class SharedFrameRing:
+    """A few display-ready RGB frames in one shared memory block, one writer and one reader.
+
+    The header holds the slot published last, a bitmask of the slots the reader holds and a
+    sequence number and timestamp per slot. The reader holds the last `held` slots it took, so a
+    frame stays intact while newer ones are written around it even after the reader has moved
+    on: the display may still be drawing the previous frame when the camera thread takes the
+    next one. The writer never fills the latest or a held slot, which takes at least held + 2
+    slots. Pass name to attach to a ring created by another process.
+    """
+
+    def __init__(self, width, height, slots=4, name=None, held=2):
+        if held < 1 or slots < held + 2:
+            raise ValueError(f"a ring holding {held} slots needs at least {held + 2} slots")
+        self.width = width
+        self.height = height
+        self.slots = slots
+        header = 8 * (2 + 2 * slots)
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=header + slots * height * width * 3)
+        else:
+            self.memory = shared_memory.SharedMemory(name)
+        buffer = self.memory.buf
+        self.control = np.ndarray((2,), np.int64, buffer)  #latest slot (-1 for none), held slots bitmask
+        self.sequences = np.ndarray((slots,), np.int64, buffer, 16)
+        self.timestamps = np.ndarray((slots,), np.float64, buffer, 16 + 8 * slots)
+        self.images = np.ndarray((slots, height, width, 3), np.uint8, buffer, header)
+        if name is None:
+            self.control[:] = (-1, 0)
+            self.sequences[:] = 0
+
+        #Read-only views handed out to the reader, made once
+        self.views = [self.images[slot] for slot in range(slots)]
+        for view in self.views:
+            view.flags.writeable = False
+        self.next_slot = 0
+        self.held = held
+        self.handed = ()  #Reader side: slots taken last, oldest first
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def writable_slot(self):
+        latest, held = self.control
+        while True:
+            slot = self.next_slot
+            self.next_slot = (slot + 1) % self.slots
+            if slot != latest and not held >> slot & 1:
+                return slot
+
+    def publish(self, slot, sequence, timestamp):
+        self.sequences[slot] = sequence
+        self.timestamps[slot] = timestamp
+        self.control[0] = slot  #Last, so the slot is complete before the reader can pick it
+
+    def latest(self):
+        """Hold the newest slot and return it as a CameraFrame, or None if nothing was published.
+
+        The image is a read-only view into shared memory that stays valid until `held` other
+        frames have been taken after it.
+        """
+        while True:
+            slot = int(self.control[0])
+            if slot < 0:
+                return None
+            if self.handed and self.handed[-1] == slot:
+                break  #Held already
+            handed = self.handed[max(0, len(self.handed) + 1 - self.held):] + (slot,)
+            self.control[1] = sum(1 << held for held in handed)
+            if self.control[0] == slot:  #Otherwise the writer moved on while we took it, retry
+                self.handed = handed
+                break
+        return CameraFrame(int(self.sequences[slot]), float(self.timestamps[slot]), self.views[slot])
+
+    def close(self, unlink=False):
+        try:
+            self.memory.close()
+        except BufferError:
+            pass  #Frames are still being shown from it, the mapping goes away with the process
+        if unlink:
+            self.memory.unlink()
+
+
+class DecoderProcess:
+    """Frame source for CameraThread that decodes in a child process.
+
+    Frames come out resized to width x height, so the display can draw them as they are. The
+    child is started by the first wait_for_frame(), i.e. once CameraThread has sent streamon.
+    """
+
+    def __init__(self, address, width, height, slots=4, interpolation=None):
+        self.address = address
+        self.interpolation = interpolation
+        self.ring = SharedFrameRing(width, height, slots)
+        self.notify = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.notify.bind(('127.0.0.1', 0))
+        self.process = None
+
+    def start(self):
+        if self.process is not None:
+            return
+        arguments = [sys.executable, os.path.abspath(__file__), '--ring', self.ring.name,
+                     '--width', str(self.ring.width), '--height', str(self.ring.height), '--slots', str(self.ring.slots),
+                     '--address', self.address, '--notify-port', str(self.notify.getsockname()[1])]
+        if self.interpolation is not None:
+            arguments += ['--interpolation', str(self.interpolation)]
+        self.process = subprocess.Popen(arguments, stdin=subprocess.PIPE)
+
+    def wait_for_frame(self, last_sequence, timeout=None):
+        """Block until a frame newer than last_sequence exists. Returns None on timeout."""
+        self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            frame = self.ring.latest()
+            if frame is not None and frame.sequence != last_sequence:
+                return frame
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            self.notify.settimeout(remaining)
+            try:
+                self.notify.recv(16)
+            except socket.timeout:
+                return None
+
+    def stop(self):
+        if self.process is not None:
+            self.process.stdin.close()  #The child exits on EOF
+            try:
+                self.process.wait(2)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+        self.notify.close()
+        self.ring.close(unlink=True)
+
+
+def run_decoder(ring, address, notify_port, interpolation):
+    """Child process: decode the stream into the ring until the process is ended."""
+    import cv2  #Only the child resizes, so the controller doesn't load cv2 for it
+    if interpolation is None:
+        interpolation = cv2.INTER_LINEAR
+    notify = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sequence = 0
+    while True:
+        try:
+            container = av.open(address, timeout=(Tello.FRAME_GRAB_TIMEOUT, None))
+        except av.error.ExitError:
+            continue  #No stream yet
+        except Exception as e:
+            print(f"Error opening video stream in decoder process: {e}")
+            time.sleep(0.5)
+            continue
+        try:
+            for decoded in container.decode(video=0):
+                image = decoded.to_ndarray(format='rgb24')
+                timestamp = time.monotonic()
+                slot = ring.writable_slot()
+                cv2.resize(image, (ring.width, ring.height), dst=ring.images[slot], interpolation=interpolation)
+                sequence += 1
+                ring.publish(slot, sequence, timestamp)
+                notify.sendto(b'\0', ('127.0.0.1', notify_port))
+        except Exception as e:
+            print(f"Error in decoder process: {e}")
+            time.sleep(0.5)
+        finally:
+            container.close()
+
+
+def exit_on_eof():
+    sys.stdin.read()
+    os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decoder process started by DecoderProcess.")
+    parser.add_argument('--ring', required=True, help="name of the shared memory block")
+    parser.add_argument('--width', type=int, required=True)
+    parser.add_argument('--height', type=int, required=True)
+    parser.add_argument('--slots', type=int, required=True)
+    parser.add_argument('--address', required=True, help="video stream URL")
+    parser.add_argument('--notify-port', type=int, required=True)
+    parser.add_argument('--interpolation', type=int, help="cv2 interpolation flag, linear by default")
+    args = parser.parse_args()
+
+    ring = SharedFrameRing(args.width, args.height, args.slots, name=args.ring)
+    if os.name == 'posix':
+        #The parent owns the block; otherwise this process's resource tracker unlinks it on exit
+        resource_tracker.unregister(ring.memory._name, 'shared_memory')
+    threading.Thread(target=exit_on_eof, daemon=True).start()
+    run_decoder(ring, args.address, args.notify_port, args.interpolation)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+import time
+from collections import OrderedDict, deque, namedtuple
+
+import numpy as np
+import pygame
+
+#Same values as cv2.INTER_NEAREST and cv2.INTER_LINEAR. cv2 itself is only imported once a frame
+#has to be resized, so loading it doesn't hold up the window at startup.
+INTER_NEAREST = 0
+INTER_LINEAR = 1
+
+
+class FramePipeline:
+    """Turns camera frames into a screen sized pygame surface without allocating per frame.
+
+    The camera hands us frames as (height, width, 3) RGB arrays. A single cv2.resize writes
+    straight into a preallocated buffer that a long-lived surface shares through
+    pygame.image.frombuffer, so the old flip -> make_surface -> rotate -> scale chain (four
+    full-frame copies) becomes one resize and the final blit.
+
+    With a scale below 1 the frame is resized into a smaller buffer instead, and draw() stretches
+    it to width x height with pygame.transform.scale straight into the screen, which is much
+    cheaper than resizing to full size with cv2.
+
+    Frames that already have the render size and layout (e.g. from HighRollerDecoder's shared
+    ring) aren't copied at all: they are drawn through a surface that wraps their own memory.
+    """
+
+    def __init__(self, width, height, interpolation=INTER_LINEAR, scale=1.0):
+        self.width = width
+        self.height = height
+        self.interpolation = interpolation
+        self.scale = scale
+        self.render_width = max(1, round(width * scale))
+        self.render_height = max(1, round(height * scale))
+
+        #Row-major buffer matches the (height, width) layout cv2 and frombuffer both expect
+        self.buffer = np.zeros((self.render_height, self.render_width, 3), dtype=np.uint8)
+        self.surface = pygame.image.frombuffer(self.buffer, (self.render_width, self.render_height), 'RGB')
+        self.staging = None  #Copy of surface in the screen's pixel format, transform.scale needs matching formats
+        self.target = None  #Screen area the staging surface is stretched into
+        self.shown = self.surface  #Surface holding the current frame, self.surface or a borrowed one
+        self.borrowed = {}  #Address of a frame's memory -> surface wrapping it
+        self.sequence = None  #Sequence number of the frame currently in the buffer
+        self.dropped = 0  #Published frames that were replaced before they could be shown
+
+    def convert(self, frame, sequence=None):
+        """Copy a camera frame into the shared buffer and return the display surface.
+
+        When a sequence number is given and matches the frame already in the buffer, the copy is
+        skipped and the surface is returned as is.
+        """
+        if sequence is not None and sequence == self.sequence:
+            return self.shown
+        if sequence is not None and self.sequence is not None:
+            self.dropped += max(0, sequence - self.sequence - 1)
+        self.sequence = sequence
+        if frame.shape[0] == self.render_height and frame.shape[1] == self.render_width:
+            if frame.flags.c_contiguous:
+                self.shown = self.borrow(frame)
+                return self.shown
+            np.copyto(self.buffer, frame)
+        else:
+            import cv2  #First needed here, when the video feed is turned on
+            cv2.resize(frame, (self.render_width, self.render_height), dst=self.buffer,
+                       interpolation=self.interpolation)
+        self.shown = self.surface
+        return self.surface
+
+    def borrow(self, frame):
+        """Surface drawing straight from frame's memory, cached for frames that reuse the same memory."""
+        address = frame.ctypes.data
+        surface = self.borrowed.get(address)
+        if surface is None:
+            if len(self.borrowed) >= 8:
+                self.borrowed.clear()  #Not reused, e.g. freshly allocated frames
+            surface = pygame.image.frombuffer(frame, (self.render_width, self.render_height), 'RGB')
+            self.borrowed[address] = surface
+        return surface
+
+    def reset(self):
+        """Forget the last frame, e.g. after the feed was hidden, so the gap isn't counted as drops."""
+        self.sequence = None
+
+    def draw(self, screen, position=(0, 0)):
+        """Draw the current frame (our buffer or a borrowed one) at width x height."""
+        if self.scale == 1.0:
+            return screen.blit(self.shown, position)
+        if self.staging is None or self.target is None or self.target.get_parent() is not screen \
+                or self.target.get_offset() != tuple(position):
+            self.staging = pygame.Surface((self.render_width, self.render_height), 0, screen)
+            self.target = screen.subsurface(pygame.Rect(position, (self.width, self.height)))
+        self.staging.blit(self.shown, (0, 0))
+        pygame.transform.scale(self.staging, (self.width, self.height), self.target)
+        return self.target.get_rect(topleft=position)
+
+    def blit(self, screen, frame, sequence=None, position=(0, 0)):
+        self.convert(frame, sequence)
+        return self.draw(screen, position)
+
+
+#How the video layer is drawn, from best looking to cheapest. scale is the internal render
+#resolution relative to the window and frame_step converts only every nth camera frame.
+QualityLevel = namedtuple('QualityLevel', ['name', 'interpolation', 'scale', 'frame_step'])
+QUALITY_LEVELS = (
+    QualityLevel('full', INTER_LINEAR, 1.0, 1),
+    QualityLevel('nearest', INTER_NEAREST, 1.0, 1),
+    QualityLevel('half', INTER_NEAREST, 0.5, 1),
+    QualityLevel('half-skip', INTER_NEAREST, 0.5, 2),
+)
+
+
+class AdaptiveQuality:
+    """Steps the video quality down when frames run over budget and back up when there is headroom.
+
+    update() takes how long the loop was busy this frame (everything but the FPS sleep) and keeps a
+    moving average of it. Once the average has been above degrade_at of the budget for
+    degrade_after frames in a row the next cheaper level is used; once it has been below
+    recover_at for recover_after frames the next better one is. Recovering is deliberately slow
+    so the level doesn't flap. Every change is printed and kept in `decisions`.
+    """
+
+    def __init__(self, budget, levels=QUALITY_LEVELS, degrade_at=0.85, recover_at=0.5,
+                 degrade_after=15, recover_after=90, smoothing=0.1, enabled=True):
+        self.budget = budget  #Seconds per frame, 1 / FPS
+        self.levels = levels
+        self.degrade_at = degrade_at
+        self.recover_at = recover_at
+        self.degrade_after = degrade_after
+        self.recover_after = recover_after
+        self.smoothing = smoothing
+        self.enabled = enabled
+        self.index = 0
+        self.frame_time = 0.0  #Moving average of the busy time in seconds
+        self.over = 0  #Frames in a row above degrade_at
+        self.under = 0  #Frames in a row below recover_at
+        self.decisions = deque(maxlen=256)  #(monotonic time, old level, new level, frame time)
+
+    @property
+    def level(self):
+        return self.levels[self.index]
+
+    def update(self, busy_seconds):
+        if not self.enabled:
+            return self.level
+        self.frame_time += (busy_seconds - self.frame_time) * self.smoothing
+        load = self.frame_time / self.budget
+        if load > self.degrade_at:
+            self.over += 1
+            self.under = 0
+        elif load < self.recover_at:
+            self.under += 1
+            self.over = 0
+        else:
+            self.over = 0
+            self.under = 0
+
+        if self.over >= self.degrade_after and self.index < len(self.levels) - 1:
+            self.change(self.index + 1)
+        elif self.under >= self.recover_after and self.index > 0:
+            self.change(self.index - 1)
+        return self.level
+
+    def change(self, index):
+        old = self.level
+        self.index = index
+        self.over = 0
+        self.under = 0
+        self.decisions.append((time.monotonic(), old.name, self.level.name, self.frame_time))
+        print(f"Video quality {old.name} -> {self.level.name}: "
+              f"frame time {self.frame_time * 1000:.1f}ms of {self.budget * 1000:.1f}ms budget")
+
+
+class AdaptiveFramePipeline:
+    """FramePipeline that draws at whatever level an AdaptiveQuality currently picks.
+
+    Keeps one FramePipeline per render scale. At a level with a frame_step above 1, newer camera
+    frames are skipped until frame_step of them have arrived; skipped frames count as dropped.
+    """
+
+    def __init__(self, width, height, quality):
+        self.width = width
+        self.height = height
+        self.quality = quality
+        self.pipelines = {}  #Render scale -> FramePipeline
+        self.current = None  #Pipeline holding the frame on screen
+        self.sequence = None
+        self.dropped = 0
+
+    def pipeline(self, level):
+        pipeline = self.pipelines.get(level.scale)
+        if pipeline is None:
+            pipeline = FramePipeline(self.width, self.height, level.interpolation, level.scale)
+            self.pipelines[level.scale] = pipeline
+        pipeline.interpolation = level.interpolation
+        return pipeline
+
+    def reset(self):
+        """Forget the last frame, e.g. after the feed was hidden, so the gap isn't counted as drops."""
+        self.sequence = None
+        self.current = None
+
+    def blit(self, screen, frame, sequence=None, position=(0, 0)):
+        level = self.quality.level
+        pipeline = self.pipeline(level)
+        if pipeline is self.current and sequence is not None and self.sequence is not None \
+                and sequence - self.sequence < level.frame_step:
+            return pipeline.draw(screen, position)  #Already shown, or too soon to take a new one
+
+        if sequence is not None and self.sequence is not None:
+            self.dropped += max(0, sequence - self.sequence - 1)
+        self.sequence = sequence
+        self.current = pipeline
+        pipeline.convert(frame)
+        return pipeline.draw(screen, position)
+
+
+class TextCache:
+    """LRU cache of rendered text surfaces keyed by (text, color, font).
+
+    Labels that never change are rendered once and stay hot; telemetry values are only
+    re-rendered when the text actually changes, and stale values fall out the back.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color):
+        key = (text, color, font)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+class DirtyRectTracker:
+    """Collects the screen regions touched this frame so only those are pushed to the display.
+
+    Drawing code reports what it touched with add() (screen.blit and pygame.draw both return
+    the affected Rect). Over a static background, restore() repaints the background under last
+    frame's regions so old text is erased, and those regions are pushed too. While the whole
+    screen changes anyway, e.g. live video, invalidate() makes present() do a full flip.
+    """
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.drawn = []
+        self.restored = []
+        self.previous = []
+        self.full = True  #Nothing is on the display yet
+
+    def add(self, rect):
+        self.drawn.append(pygame.Rect(rect))
+        return rect
+
+    def invalidate(self):
+        self.full = True
+
+    def restore(self, background, position=(0, 0)):
+        """Repaint the background under everything drawn last frame."""
+        for rect in self.previous:
+            self.screen.blit(background, rect, rect.move(-position[0], -position[1]))
+            self.restored.append(rect)
+
+    def present(self):
+        if self.full:
+            pygame.display.flip()
+        elif self.drawn or self.restored:
+            pygame.display.update(self.restored + self.drawn)
+        self.previous = self.drawn
+        self.drawn = []
+        self.restored = []
+        self.full = False
@@ -1,6 +1,4 @@
-import cv2
 import pygame
-from djitellopy import Tello
 import logging
 
 
@@ -20,31 +18,53 @@ logo_surface = pygame.image.load('HighRollerLogo.jpg')
 logo_rect = logo_surface.get_rect()
 logo_rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
 
-#Initialize the Tello drone
-print("Initializing Tello drone...")
+#Show the logo right away, the drone modules load and the drone connects after this
+screen.blit(logo_surface, logo_rect)
+pygame.display.flip()
+pygame.event.pump()
 
-drone = Tello()
-drone.connect()
-drone.streamon()  #Enable video streaming
-print(f"Battery life: {drone.get_battery()}")
+from djitellopy import Tello
+from HighRollerSimulator import create_drone
+from HighRollerConnection import DroneConnection
+from HighRollerDisplay import FramePipeline
+from HighRollerHud import CONNECTION_COLORS, connection_line
+from HighRollerInput import ControlInput
 
 #Set logging level for djitellopy to WARNING and above to prevent console clutter
 Tello.LOGGER.setLevel(logging.ERROR)
 
+#Initialize the Tello drone
+print("Initializing Tello drone...")
+
+drone = create_drone()  #Real Tello, or the local simulator with HIGHROLLER_DRONE=sim
+
+#Once connected, enable video streaming and start decoding it, all in the background
+def start_video():
+    drone.streamon()
+    drone.get_frame_read()
+
+drone_connection = DroneConnection(drone, on_connect=start_video)
+
 #Game loop variables
 clock = pygame.time.Clock()
 show_logo = True
 show_hud = True
 show_controls = False
 hasTakenOff = False
-velocity_x = 0
-velocity_y = 0
-velocity_z = 0
-rotation_velocity = 0
 
 FPS = 30  #Frame rate for the game loop
+INPUT_DEADZONE = 0.1  #Fraction of gamepad stick travel around the centre that is ignored
+INPUT_EXPO = 0.3  #0 is linear, 1 fully cubic for finer stick control around the centre
+INPUT_RAMP_UP = 4.0  #Full scale per second an axis may speed up by
+INPUT_RAMP_DOWN = 8.0  #Full scale per second an axis may slow down or reverse by
 
 
+#Keyboard and gamepad input, shaped into one RC vector per frame
+control_input = ControlInput(INPUT_DEADZONE, INPUT_EXPO, INPUT_RAMP_UP, INPUT_RAMP_DOWN)
+
+#Reusable buffer and surface the video feed is drawn through
+frame_pipeline = FramePipeline(SCREEN_WIDTH, SCREEN_HEIGHT)
+
 #Create a font for text dashboard
 font = pygame.font.Font(None, 25)  #Use a default font, or specify your own
 
@@ -182,7 +202,11 @@ def render_hud():
         barometer_text = "Barometer: NA"
     barometer_surface = font.render(barometer_text, True, (255, 255, 255))
     screen.blit(barometer_surface, (SCREEN_WIDTH - 200, 140))
-     
+
+    connection = drone_connection.status
+    connection_surface = font.render(connection_line(connection), True, CONNECTION_COLORS[connection.state])
+    screen.blit(connection_surface, (SCREEN_WIDTH - 200, 20))
+
     
     last_flight_time = 0  #Stores the last valid flight time
     try:
@@ -205,6 +229,8 @@ try:
     while running:
     
         for event in pygame.event.get():
+            control_input.handle_event(event)  #Gamepads plugged in or removed
+
             #User clicked the X to close the program
             if event.type == pygame.QUIT:
                 if hasTakenOff == True:
@@ -232,7 +258,9 @@ try:
 
                         
                 #Takeoff on space
-                if event.key == pygame.K_SPACE and hasTakenOff == False:
+                if event.key == pygame.K_SPACE and hasTakenOff == False and not drone_connection.is_connected():
+                    print("Not connected to the drone yet.")
+                elif event.key == pygame.K_SPACE and hasTakenOff == False:
                     try:
                         drone.takeoff()
                         hasTakenOff = True
@@ -275,82 +303,19 @@ try:
     #End of Events
     ################################################################################
     #Check for key holds
-        keys = pygame.key.get_pressed()
-        #
-        #Forward / Backward
-        if keys[pygame.K_w] and keys[pygame.K_s]:
-            key_states[pygame.K_w] = True
-            key_states[pygame.K_s] = True
-            velocity_y = 0
-        elif keys[pygame.K_w]:
-            key_states[pygame.K_w] = True
-            velocity_y = 100
-        elif keys[pygame.K_s]:
-            key_states[pygame.K_s] = True
-            velocity_y = -100
-        else:
-            velocity_y = 0
-            key_states[pygame.K_w] = False
-            key_states[pygame.K_s] = False
-            
-        #Left / Right
-        if keys[pygame.K_a] and keys[pygame.K_d]:
-            key_states[pygame.K_a] = True
-            key_states[pygame.K_d] = True
-            velocity_x = 0
-        elif keys[pygame.K_d]:
-            key_states[pygame.K_d] = True
-            velocity_x = 100
-        elif keys[pygame.K_a]:
-            key_states[pygame.K_a] = True
-            velocity_x = -100
-        else:
-            velocity_x = 0
-            key_states[pygame.K_a] = False
-            key_states[pygame.K_d] = False
-            
-        #Up / Down
-        if keys[pygame.K_SPACE] and keys[pygame.K_LCTRL]:
-            key_states[pygame.K_SPACE] = True
-            key_states[pygame.K_LCTRL] = True
-            velocity_z = 0
-        elif keys[pygame.K_SPACE]:
-            key_states[pygame.K_SPACE] = True
-            velocity_z = 100
-        elif keys[pygame.K_LCTRL]:
-            key_states[pygame.K_LCTRL] = True
-            velocity_z = -100
-        else:
-            key_states[pygame.K_SPACE] = False
-            key_states[pygame.K_LCTRL] = False
-            velocity_z = 0
-            
-        #Rotation
-        if keys[pygame.K_q] and keys[pygame.K_e]:
-            key_states[pygame.K_q] = True
-            key_states[pygame.K_e] = True
-            rotation_velocity = 0
-        elif keys[pygame.K_q]:
-            key_states[pygame.K_q] = True
-            rotation_velocity = -100
-        elif keys[pygame.K_e]:
-            key_states[pygame.K_e] = True
-            rotation_velocity = 100
-        else:
-            key_states[pygame.K_q] = False
-            key_states[pygame.K_e] = False
-            rotation_velocity = 0
+        velocity = control_input.update(pygame.key.get_pressed())
+        key_states.update(control_input.key_states)
         
         #Send command to drone
         try:
-            drone.send_rc_control(velocity_x, velocity_y, velocity_z, rotation_velocity)
+            drone.send_rc_control(*velocity)
         except Exception as e:
             print(f"Error sending RC control: {e}")
                 
     ###############################################################################
     
-        #Display either the logo or the drone's video feed
-        if show_logo:
+        #Display either the logo or the drone's video feed, which needs the drone connected
+        if show_logo or not drone_connection.is_connected():
             #Adjust logo position and scaling to fit above the dashboard
             adjusted_logo_rect = logo_surface.get_rect()
             adjusted_logo_rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
@@ -361,17 +326,9 @@ try:
             if frame is None: 
                 print("Error: Unable to read frame from Tello camera.")
                 continue
-            
-            #Flip frame about yaxis
-            frame = cv2.flip(frame, 1)
-    
-            #Create a Pygame surface from the frame
-            drone_surface = pygame.surfarray.make_surface(frame)
-    
-            #Rotate and scale the drone surface to fit the screen minus the dashboard
-            drone_surface = pygame.transform.rotate(drone_surface, -90)
-            drone_surface = pygame.transform.scale(drone_surface, (SCREEN_WIDTH, SCREEN_HEIGHT))
-            screen.blit(drone_surface, (0, 0))
+
+            #Resize the frame straight into the shared display surface and draw it
+            frame_pipeline.blit(screen, frame)
             
         #Show Hud if toggled
         if show_hud:
@@ -398,9 +355,11 @@ except KeyboardInterrupt:
     
 finally:
     #Shut down the Tello and Pygame
+    drone_connection.stop()
     drone.send_rc_control(0, 0, 0, 0)
-    drone.streamoff()
-    print("Turning off camera stream...")
+    if drone_connection.is_connected():
+        drone.streamoff()
+        print("Turning off camera stream...")
     drone.end()
     print("Terminating drone connection...")
     pygame.quit()
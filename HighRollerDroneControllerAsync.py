@@ -0,0 +1,289 @@
+"""Single drone controller on asyncio instead of one thread per concern.
+
+Commands, state, RC and video all go through a SwarmTransport with one drone on a single event
+loop. Datagram protocols take the state packets and command replies, one scheduled task sends
+RC, and video decodes on a small pool and is awaited with next_frame(). The pygame loop is a task
+on the same loop: it draws a new frame as soon as one is decoded and otherwise redraws every
+1 / FPS. Takeoff, landing and flips run as tasks, so the loop keeps rendering. Shutdown cancels
+everything in one place, except a takeoff, which it lets finish and then lands.
+
+    python HighRollerDroneControllerAsync.py
+    HIGHROLLER_DRONE=sim python HighRollerDroneControllerAsync.py
+"""
+import asyncio
+import os
+import time
+
+import pygame
+
+from HighRollerCommands import CommandStatus
+from HighRollerConnection import ConnectionStatus
+from HighRollerDisplay import DirtyRectTracker, FramePipeline
+from HighRollerHud import Hud
+from HighRollerInput import ControlInput
+from HighRollerSwarm import SwarmDrone, SwarmTransport
+
+#Pygame setup for important variables and environment
+SCREEN_WIDTH = 1280
+SCREEN_HEIGHT = 720
+FPS = 30  #Frame rate for the game loop
+CAMERA_GRACE_PERIOD = 10  #Seconds the video stream stays on after the feed is hidden
+TELLO_HOST = '192.168.10.1'  #The Tello's address on its own WiFi network
+COMMAND_TIMEOUT = 20  #Seconds takeoff, land and flips get to answer
+CONNECT_TIMEOUT = 3  #Seconds each connection attempt waits for an answer
+CONNECT_BACKOFF = (0.5, 8.0)  #First and longest wait between connection attempts
+INPUT_DEADZONE = 0.1  #Fraction of gamepad stick travel around the centre that is ignored
+INPUT_EXPO = 0.3  #0 is linear, 1 fully cubic for finer stick control around the centre
+INPUT_RAMP_UP = 4.0  #Full scale per second an axis may speed up by
+INPUT_RAMP_DOWN = 8.0  #Full scale per second an axis may slow down or reverse by
+
+#Flips by arrow key
+FLIPS = {
+    pygame.K_UP: ("Flip Forward", 'flip f'),
+    pygame.K_DOWN: ("Flip Backward", 'flip b'),
+    pygame.K_LEFT: ("Flip Left", 'flip l'),
+    pygame.K_RIGHT: ("Flip Right", 'flip r'),
+}
+
+
+class Controller:
+    """State of the game loop and the drone commands it has in flight."""
+
+    def __init__(self, transport, drone):
+        self.transport = transport
+        self.drone = drone
+        self.has_taken_off = False
+        self.takeoff_sent = False  #Set before the drone answers, so shutdown lands a drone still taking off
+        self.commands = {}  #Name -> task, one of each at a time
+        self.command_status = None
+        self.connection = ConnectionStatus('connecting', 1, "", None)
+        self.video_wanted = False  #Feed shown before the drone was connected, started on connecting
+        self.streamoff_timer = None  #Handle of the pending streamoff after the feed was hidden
+
+    def is_connected(self):
+        return self.connection.state == 'connected'
+
+    async def connect(self):
+        """Enter SDK mode, retrying with exponential backoff until the drone answers."""
+        backoff, max_backoff = CONNECT_BACKOFF
+        attempt = 1
+        while True:
+            self.connection = ConnectionStatus('connecting', attempt, "", None)
+            response = await self.transport.command(self.drone, 'command', CONNECT_TIMEOUT)
+            if 'ok' in response.lower():
+                break
+            print(f"Could not connect to the drone (attempt {attempt}), retrying in {backoff:.1f}s: {response}")
+            self.connection = ConnectionStatus('retrying', attempt, response, time.monotonic() + backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, max_backoff)
+            attempt += 1
+        print(f"Battery life: {await self.transport.command(self.drone, 'battery?')}")
+        self.connection = ConnectionStatus('connected', attempt, "", None)
+        if self.video_wanted:
+            self.show_video()
+
+    def submit(self, name, command):
+        """Run a command as a task. Returns False if one with the same name is still running."""
+        if name in self.commands:
+            print(f"{name} already in progress, ignoring.")
+            return False
+        task = asyncio.create_task(self.run(name, command))
+        self.commands[name] = task
+        task.add_done_callback(lambda task: self.commands.pop(name, None))
+        return True
+
+    async def run(self, name, command):
+        self.command_status = CommandStatus(name, 'running', "", time.monotonic())
+        if command == 'takeoff':
+            self.takeoff_sent = True
+        elif command == 'land':
+            self.takeoff_sent = False
+        response = await self.transport.command(self.drone, command, COMMAND_TIMEOUT)
+        if 'ok' in response.lower():
+            self.command_status = CommandStatus(name, 'ok', "", time.monotonic())
+            if command == 'takeoff':
+                self.has_taken_off = True
+        else:
+            print(f"Error during {name}: {response}")
+            self.command_status = CommandStatus(name, 'failed', response, time.monotonic())
+
+    def battery_allows_flip(self):
+        #Flips need at least half a battery. Unknown battery counts as too low.
+        battery = self.drone.snapshot.battery
+        return battery is not None and battery >= 50
+
+    def show_video(self):
+        self.video_wanted = True
+        if not self.is_connected():
+            return
+        if self.streamoff_timer is not None:
+            self.streamoff_timer.cancel()  #Stream is still on, the decoder stays warm
+            self.streamoff_timer = None
+        else:
+            self.submit("Stream On", 'streamon')
+
+    def hide_video(self):
+        self.video_wanted = False
+        if not self.is_connected():
+            return
+
+        def streamoff():
+            self.streamoff_timer = None
+            self.submit("Stream Off", 'streamoff')
+        self.streamoff_timer = asyncio.get_running_loop().call_later(CAMERA_GRACE_PERIOD, streamoff)
+
+
+async def game_loop(controller, screen):
+    """The pygame loop, as a task on the transport's event loop."""
+    transport = controller.transport
+    drone = controller.drone
+
+    #Create a surface from the logo
+    logo_surface = pygame.image.load('HighRollerLogo.jpg')
+    logo_rect = logo_surface.get_rect()
+    logo_rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+
+    font = pygame.font.Font(None, 25)
+    dirty_rects = DirtyRectTracker(screen)
+    hud = Hud(screen, font, dirty=dirty_rects)
+    frame_pipeline = FramePipeline(SCREEN_WIDTH, SCREEN_HEIGHT)
+    control_input = ControlInput(INPUT_DEADZONE, INPUT_EXPO, INPUT_RAMP_UP, INPUT_RAMP_DOWN)
+
+    show_logo = True
+    show_hud = True
+    show_controls = False
+    running = True
+    while running:
+        frame_started = time.monotonic()
+        for event in pygame.event.get():
+            control_input.handle_event(event)  #Gamepads plugged in or removed
+
+            #User clicked the X to close the program
+            if event.type == pygame.QUIT:
+                running = False
+
+            if event.type == pygame.KEYDOWN:
+                #Toggle between logo and drone feed with tab
+                if event.key == pygame.K_TAB:
+                    show_logo = not show_logo
+                    dirty_rects.invalidate()  #Whole screen changes between logo and video
+                    if show_logo:
+                        print("Turning Camera Off...")
+                        controller.hide_video()  #Stream stays warm for CAMERA_GRACE_PERIOD seconds
+                    else:
+                        print("Turning Camera On...")
+                        frame_pipeline.reset()
+                        controller.show_video()
+
+                #Toggle hud.
+                if event.key == pygame.K_h:
+                    show_hud = not show_hud
+
+                #Toggle controls.
+                if event.key == pygame.K_c:
+                    show_controls = not show_controls
+
+                #Takeoff on space
+                if event.key == pygame.K_SPACE and not controller.has_taken_off:
+                    if not controller.is_connected():
+                        print("Not connected to the drone yet.")
+                    elif controller.submit("Takeoff", 'takeoff'):
+                        print("Taking Off...")
+
+                #Land on l
+                if event.key == pygame.K_l and controller.has_taken_off:
+                    controller.has_taken_off = False
+                    controller.submit("Land", 'land')
+
+                #Flips on the arrow keys
+                if event.key in FLIPS and controller.has_taken_off:
+                    if not controller.battery_allows_flip():
+                        print("Battery too low to perform a flip.")
+                    else:
+                        controller.submit(*FLIPS[event.key])
+
+        #Shaped keyboard and gamepad input, sent by the transport's RC task when it changes
+        transport.set_rc(drone, *control_input.update(pygame.key.get_pressed()))
+
+        #Display either the logo or the drone's video feed
+        if show_logo:
+            #The logo never changes, so only repaint it where the HUD was drawn last frame
+            if dirty_rects.full:
+                screen.blit(logo_surface, logo_rect)
+            else:
+                dirty_rects.restore(logo_surface, logo_rect.topleft)
+        else:
+            dirty_rects.invalidate()  #Live video changes every pixel, flip the whole screen
+            frame = drone.frame
+            if frame is not None:
+                frame_pipeline.blit(screen, frame.image, frame.sequence)
+
+        #Show Hud if toggled
+        if show_hud:
+            hud.render_hud(control_input.key_states, drone.snapshot, controller.command_status, controller.connection)
+
+        #Show controls
+        if show_controls:
+            hud.render_controls()
+
+        dirty_rects.present()
+
+        #Wait for the next decoded frame, but no longer than one frame at the target FPS
+        remaining = max(0.0, frame_started + 1 / FPS - time.monotonic())
+        if show_logo:
+            await asyncio.sleep(remaining)
+        else:
+            await transport.next_frame(drone, frame_pipeline.sequence, remaining)
+
+
+async def main():
+    #Initialize the Tello drone, or the local simulator with HIGHROLLER_DRONE=sim
+    print("Initializing Tello drone...")
+    simulator = None
+    backend = os.environ.get('HIGHROLLER_DRONE', 'tello')
+    if backend == 'sim':
+        from HighRollerSimulator import TelloSimulator
+        simulator = TelloSimulator().start()
+        drone = SwarmDrone('sim', '127.0.0.1')
+    elif backend == 'tello':
+        drone = SwarmDrone('tello', TELLO_HOST)
+    else:
+        raise ValueError(f"The asyncio controller flies a Tello or the simulator, not {backend}")
+
+    transport = await SwarmTransport([drone], (SCREEN_WIDTH, SCREEN_HEIGHT)).start()
+    controller = Controller(transport, drone)
+    connecting = asyncio.create_task(controller.connect())  #The window doesn't wait for the drone
+    try:
+        pygame.init()
+        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        await game_loop(controller, screen)
+    finally:
+        #Cancel whatever is still in flight, then stop and land the drone before closing the transport.
+        #A takeoff is let finish instead: cancelling it wouldn't keep the drone on the ground, and its
+        #late "ok" could be taken for the answer to land.
+        takeoff = controller.commands.get("Takeoff")
+        tasks = [connecting] + [task for task in controller.commands.values() if task is not takeoff]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if takeoff is not None:
+            await asyncio.gather(takeoff, return_exceptions=True)
+        transport.set_rc(drone, 0, 0, 0, 0)
+        transport.send_rc_now(drone)  #Make sure the drone stops moving
+        if controller.has_taken_off or controller.takeoff_sent:
+            await transport.command(drone, 'land', COMMAND_TIMEOUT)
+        if controller.is_connected():
+            await transport.command(drone, 'streamoff')
+        print("Terminating drone connection...")
+        await transport.close()
+        if simulator is not None:
+            simulator.stop()
+        pygame.quit()
+        print("Quiting PyGame...")
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("Force Quiting Program due to interupt...")
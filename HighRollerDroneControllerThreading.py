@@ -1,9 +1,8 @@
-import cv2
 import pygame
-from djitellopy import Tello
 import logging
-import time
+import os
 import threading
+import time
 
 
 #Pygame setup for important variables and environment
@@ -22,92 +21,117 @@ logo_surface = pygame.image.load('HighRollerLogo.jpg')
 logo_rect = logo_surface.get_rect()
 logo_rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
 
-#Initialize the Tello drone
-print("Initializing Tello drone...")
+#Show the logo right away. The drone modules load after this (cv2 only once the feed is shown)
+#and the drone connects in the background, so the window never waits for either.
+screen.blit(logo_surface, logo_rect)
+pygame.display.flip()
+pygame.event.pump()
 
-drone = Tello()
-drone.connect()
-#drone.streamon()  #Enable video streaming
-print(f"Battery life: {drone.get_battery()}")
+from djitellopy import Tello
+from HighRollerSimulator import create_drone
+from HighRollerCamera import CameraThread
+from HighRollerCommands import CommandExecutor
+from HighRollerConnection import DroneConnection
+from HighRollerDecoder import DecoderProcess
+from HighRollerDisplay import AdaptiveFramePipeline, AdaptiveQuality, DirtyRectTracker
+from HighRollerFlightLog import ReplayTello
+from HighRollerHud import Hud, rc_key_states
+from HighRollerInput import ControlInput
+from HighRollerMovement import DroneMovementThread
+from HighRollerProfiling import FrameStats, GlassToGlassProbe, SpanRing, StageTimer
+from HighRollerRecorder import FlightRecorder
+from HighRollerTelemetry import TelemetryThread
 
 #Set logging level for djitellopy to WARNING and above to prevent console clutter
 Tello.LOGGER.setLevel(logging.ERROR)
 
+#Initialize the Tello drone
+print("Initializing Tello drone...")
+
+drone = create_drone()  #Real Tello, the local simulator with HIGHROLLER_DRONE=sim, or a replay
+replaying = isinstance(drone, ReplayTello)
+
+#Held by every thread while it sends a command and waits for the reply, djitellopy can't tell
+#whose reply is whose
+command_lock = threading.Lock()
+
+#Connect in the background, retrying until the drone answers. The HUD shows how it's going.
+drone_connection = DroneConnection(drone, command_lock=command_lock)
+
 #Game loop variables
 clock = pygame.time.Clock()
 show_logo = True
 show_hud = True
 show_controls = False
+show_timing = False
 hasTakenOff = False
-velocity_x = 0
-velocity_y = 0
-velocity_z = 0
-rotation_velocity = 0
+takeoff_future = None  #Pending takeoff command, hasTakenOff is set once it finishes
 
 FPS = 30  #Frame rate for the game loop
-
-class CameraThread:
-    def __init__(self, drone):
-        self.drone = drone
-        self.frame = None
-        self.running = False
-        self.thread = threading.Thread(target=self.update, daemon=True)
-
-    def start(self):
-        self.running = True
-        self.drone.streamon()
-        self.thread.start()
-
-    def update(self):
-        while self.running:
-            try:
-                frame = self.drone.get_frame_read().frame
-                if frame is not None:
-                    frame = cv2.flip(frame, 1)  #Flip to match screen orientation
-                    self.frame = frame
-            except Exception as e:
-                print(f"Error in camera thread: {e}")
-
-    def get_frame(self):
-        return self.frame
-
-    def stop(self):
-        self.running = False
-        self.drone.streamoff()
-        self.thread.join()
-        
-class DroneMovementThread:
-    def __init__(self, drone):
-        self.drone = drone
-        self.running = True
-        self.velocity_x = 0
-        self.velocity_y = 0
-        self.velocity_z = 0
-        self.rotation_velocity = 0
-        self.thread = threading.Thread(target=self.update, daemon=True)
-        self.thread.start()
-
-    def update(self):
-        """Continuously sends movement commands to the drone without blocking the main loop."""
-        while self.running:
-            try:
-                self.drone.send_rc_control(
-                    self.velocity_x, self.velocity_y, self.velocity_z, self.rotation_velocity
-                )
-                time.sleep(0.05)  # Prevent excessive CPU usage
-            except Exception as e:
-                print(f"Error in movement thread: {e}")
-
-    def stop(self):
-        self.running = False
-        self.thread.join()
+CAMERA_GRACE_PERIOD = 10  #Seconds the video stream stays on after the feed is hidden
+RC_MIN_INTERVAL = 0.02  #Seconds between RC packets when the velocities change
+RC_KEEPALIVE_INTERVAL = 0.5  #Seconds between repeated RC packets while nothing changes
+ADAPTIVE_QUALITY = True  #Lower the video quality while frames take longer than 1 / FPS
+RECORD_FLIGHTS = True  #Write the video feed, telemetry and RC commands to RECORDINGS_DIR
+RECORDINGS_DIR = 'recordings'
+REPLAY_SEEK = 10  #Seconds [ and ] move a replay by
+INPUT_DEADZONE = 0.1  #Fraction of gamepad stick travel around the centre that is ignored
+INPUT_EXPO = 0.3  #0 is linear, 1 fully cubic for finer stick control around the centre
+INPUT_RAMP_UP = 4.0  #Full scale per second an axis may speed up by
+INPUT_RAMP_DOWN = 8.0  #Full scale per second an axis may slow down or reverse by
+VISION_DETECTOR = 'markers'  #Detector V switches on, see HighRollerVision.DETECTORS
+VISION_WORKERS = 2  #Frames detected on at once
+VISION_WIDTH = 320  #Pixels wide the frames are scaled down to for detection
+AUTOPILOT_TRACKER = 'marker'  #What F follows, see HighRollerAutopilot.TRACKERS
+AUTOPILOT_RATE = 30  #Most control ticks per second
+AUTOPILOT_STALE_AFTER = 0.25  #Seconds old the video may get before the autopilot hovers
+AUTOPILOT_OVERRIDE_HOLD = 1.0  #Seconds the pilot keeps control after letting go of the sticks
+STREAM_FPS = 15  #Most frames per second sent to ground station viewers
+STREAM_WIDTH = 640  #Pixels wide the ground station video is scaled down to
+
+#Keyboard and gamepad input, shaped into one RC vector per frame
+control_input = ControlInput(INPUT_DEADZONE, INPUT_EXPO, INPUT_RAMP_UP, INPUT_RAMP_DOWN)
 
 # Initialize movement thread
-movement_thread = DroneMovementThread(drone)
-
-
-# Initialize camera thread
-camera_thread = CameraThread(drone)
+movement_thread = DroneMovementThread(drone, RC_MIN_INTERVAL, RC_KEEPALIVE_INTERVAL)
+
+
+# Initialize command worker for takeoff, landing and flips
+command_executor = CommandExecutor(command_lock)
+
+# Initialize telemetry thread
+telemetry_thread = TelemetryThread(drone)
+
+# Initialize camera thread. With HIGHROLLER_DECODER=process the video is decoded and scaled to the
+# window in a separate process and handed back through shared memory.
+frame_source = None
+if os.environ.get('HIGHROLLER_DECODER') == 'process' and not replaying:
+    frame_source = DecoderProcess(drone.get_udp_video_address(), SCREEN_WIDTH, SCREEN_HEIGHT)
+camera_thread = CameraThread(drone, frame_source=frame_source, grace_period=CAMERA_GRACE_PERIOD,
+                             command_lock=command_lock)
+
+# Initialize flight recorder, fed by the camera, telemetry and movement threads without blocking them
+flight_recorder = None
+if RECORD_FLIGHTS and not replaying:
+    flight_recorder = FlightRecorder(RECORDINGS_DIR, fps=FPS)
+    camera_thread.bus.add(flight_recorder.frames)
+    telemetry_thread.recorder = flight_recorder
+    movement_thread.recorder = flight_recorder
+
+# Remote viewing from another machine on the LAN with HIGHROLLER_STREAM=<port>, while the video feed is on
+ground_station = None
+if os.environ.get('HIGHROLLER_STREAM'):
+    from HighRollerStreaming import GroundStationServer  #Loads cv2, so only when streaming
+    ground_station = GroundStationServer(camera_thread.bus, telemetry_thread, movement_thread,
+                                         port=int(os.environ['HIGHROLLER_STREAM']), fps=STREAM_FPS, width=STREAM_WIDTH)
+    print(f"Ground station streaming on port {ground_station.port}")
+
+#Reusable buffers and surfaces the video feed is drawn through, at a quality that follows the frame time
+video_quality = AdaptiveQuality(1 / FPS, enabled=ADAPTIVE_QUALITY)
+frame_pipeline = AdaptiveFramePipeline(SCREEN_WIDTH, SCREEN_HEIGHT, video_quality)
+video_frame = None  #CameraFrame currently on screen
+vision_stage = None  #Object detection on the feed, made the first time V is pressed
+autopilot = None  #Follow-target mode, made the first time F is pressed
 
 
 #Create a font for text dashboard
@@ -125,141 +149,43 @@ key_states = {
     pygame.K_LCTRL: False,
     pygame.K_l: False,
 }
-    
-#Offsets to make it easier to move controls around
-x_offset = 30
-y_offset = 440
-
-#Function to render controls
-def render_controls():
-    box_width = 400
-    box_height = 450
-    box_x = (SCREEN_WIDTH - box_width) // 2
-    box_y = (SCREEN_HEIGHT - box_height) // 2
-    box_color = (0, 0, 0, 150)  #Black with 150 alpha (semi-transparent) *Thanks chatGPT for transparency help
-    border_color = (255, 255, 255)
-    text_color = (255, 255, 255)  #White text
-
-    #Create a surface with per-pixel alpha
-    controls_surface = pygame.Surface((box_width, box_height), pygame.SRCALPHA)
-    
-    #Draw semi-transparent black rectangle
-    pygame.draw.rect(controls_surface, box_color, (0, 0, box_width, box_height))
-    
-    #Draw white border
-    pygame.draw.rect(controls_surface, border_color, (0, 0, box_width, box_height), 2) 
-
-    #Control text list
-    controls = [
-        "W - Move Forward",
-        "S - Move Backward",
-        "A - Move Left",
-        "D - Move Right",
-        "Q - Rotate Left",
-        "E - Rotate Right",
-        "SPACE - Ascend",
-        "LCTRL - Descend",
-        "L - Land",
-        "UP - Flip Forward",
-        "DOWN - Flip Backward",
-        "LEFT - Flip Left",
-        "RIGHT - Flip Right",
-        "TAB - Toggle Camera",
-        "O - Toggle Controls",
-        "H - Toggle HUD"
-    ]
-
-    #Render control text on the transparent surface
-    line_spacing = 25
-    for i, control_text in enumerate(controls):
-        text_surface = font.render(control_text, True, text_color)
-        text_rect = text_surface.get_rect(center=(box_width // 2, 40 + i * line_spacing))
-        controls_surface.blit(text_surface, text_rect)
-
-    #Blit the transparent surface onto the main screen
-    screen.blit(controls_surface, (box_x, box_y))
-
-def render_hud():
-    # Define colors
-    default_color = (255, 255, 255)
-    active_color = (0, 255, 0)
-
-    #Key dimensions and spacing
-    key_width = 40
-    key_height = 40
-    
-    #Show control tips
-    toggle_hud_hint_text = "Toggle Hud - H"
-    toggle_hud_hint_surface = font.render(toggle_hud_hint_text, True, (255, 255, 255))
-    screen.blit(toggle_hud_hint_surface, (10, 20))
-    
-    toggle_hud_hint_text = "View Controls - C"
-    toggle_hud_hint_surface = font.render(toggle_hud_hint_text, True, (255, 255, 255))
-    screen.blit(toggle_hud_hint_surface, (10, 50))
-
-    #Function to draw a key
-    def draw_key(x, y, text, is_active, width=key_width):
-        color = active_color if is_active else default_color
-        pygame.draw.rect(screen, color, (x, y, width, key_height), 2)  #Draw key border
-        key_surface = font.render(text, True, color)
-        text_rect = key_surface.get_rect(center=(x + width // 2, y + key_height // 2))
-        screen.blit(key_surface, text_rect)
-
-    #Draw keys
-    draw_key(x_offset + 65, y_offset + 50, "Q", key_states[pygame.K_q])
-    draw_key(x_offset + 155, y_offset + 50, "E", key_states[pygame.K_e])
-    draw_key(x_offset + 110, y_offset + 90, "W", key_states[pygame.K_w])
-
-    draw_key(x_offset + 65, y_offset + 130, "A", key_states[pygame.K_a])
-    draw_key(x_offset + 155, y_offset +  130, "D", key_states[pygame.K_d])
-
-    draw_key(x_offset + 110, y_offset + 170, "S", key_states[pygame.K_s])
-
-    draw_key(x_offset + 160, y_offset + 210, "SPACE", key_states[pygame.K_SPACE], width=100)
-    draw_key(x_offset + 0, y_offset + 210, "LCTRL", key_states[pygame.K_LCTRL], width=100)
-
-    # draw_key(x_offset + 200, y_offset + 90, "L", key_states[pygame.K_l])
-
-    try:
-        battery_text = f"Battery: {drone.get_battery()}%"
-    except Exception:
-        battery_text = "Battery: NA"
-    battery_surface = font.render(battery_text, True, (255, 255, 255))
-    screen.blit(battery_surface, (SCREEN_WIDTH - 200, 50))
-    
-    try:
-        temperature_text = f"Temperature: {int(drone.get_temperature())}°F"
-    except Exception:
-        temperature_text = "Temperature: NA"
-    temperature_surface = font.render(temperature_text, True, (255, 255, 255))
-    screen.blit(temperature_surface, (SCREEN_WIDTH - 200, 80))
-    
-    try:
-        height_text = f"Height: {int(drone.get_height())}cm"
-    except Exception:
-        height_text = "Height: NA"
-    height_surface = font.render(height_text, True, (255, 255, 255))
-    screen.blit(height_surface, (SCREEN_WIDTH - 200, 110))
-    
-    try:
-        barometer_text = f"Barometer: {int(drone.get_barometer())}cm"
-    except Exception:
-        barometer_text = "Barometer: NA"
-    barometer_surface = font.render(barometer_text, True, (255, 255, 255))
-    screen.blit(barometer_surface, (SCREEN_WIDTH - 200, 140))
-     
-    
-    last_flight_time = 0  #Stores the last valid flight time
-    try:
-        current_flight_time = int(drone.get_flight_time())
-        last_flight_time = current_flight_time
-    except Exception:
-        current_flight_time = last_flight_time  #Display last known flight time if unable to get flight time from drone
-    
-    flight_time_text = f"Flight Time: {current_flight_time}s"
-    flight_time_surface = font.render(flight_time_text, True, (255, 255, 255))
-    screen.blit(flight_time_surface, (SCREEN_WIDTH - 200, 170))
 
+#Regions drawn each frame, so logo mode only pushes what changed to the display
+dirty_rects = DirtyRectTracker(screen)
+
+#HUD and controls overlay, with rendered text cached between frames
+hud = Hud(screen, font, dirty=dirty_rects)
+    
+#Flips need at least half a battery. Unknown battery counts as too low.
+def battery_allows_flip():
+    battery = telemetry_thread.snapshot.battery
+    return battery is not None and battery >= 50
+
+#Per-stage frame timings, recorded when HIGHROLLER_PROFILE=1 (see benchmarks/bench_game_loop.py)
+stage_timer = StageTimer(enabled=os.environ.get('HIGHROLLER_PROFILE') == '1')
+
+#Hot-path samples for the timing overlay, only recorded while it is shown
+render_spans = SpanRing()  #One sample per loop pass
+frame_ages = SpanRing()  #Seconds from decode to first draw of each frame
+timing_rings = (render_spans, frame_ages, camera_thread.spans, movement_thread.spans)
+timing_stats = None
+timing_stats_due = 0.0
+TIMING_REFRESH = 0.25  #Seconds between overlay updates, so the numbers stay readable
+
+#Glass-to-glass latency mode, toggled with G and written to CSV when it is switched off
+latency_probe = GlassToGlassProbe()
+LATENCY_MARKER = True  #Flash a marker in the corner for measuring with an external camera
+
+def save_latency_histograms():
+    path = time.strftime("glass_to_glass_%Y%m%d_%H%M%S.csv")
+    latency_probe.write_csv(path)
+    for name, stats in latency_probe.summary().items():
+        print(f"{name}: {stats['count']} frames, mean {stats['mean_ms']:.1f}ms, p95 {stats['p95_ms']:.0f}ms")
+    print(f"Latency histograms saved to {path}")
+
+def collect_timing_stats():
+    return FrameStats(render_spans.rate(), camera_thread.spans.rate(), frame_ages.mean() * 1000,
+                      movement_thread.spans.rate(), camera_thread.dropped + frame_pipeline.dropped)
 
 ################################################################################
 
@@ -268,25 +194,35 @@ def render_hud():
 running = True
 try:
     while running:
+        stage_timer.begin()
+        frame_started = time.perf_counter()
     
         for event in pygame.event.get():
+            control_input.handle_event(event)  #Gamepads plugged in or removed
+
             #User clicked the X to close the program
             if event.type == pygame.QUIT:
                 if hasTakenOff == True:
-                    drone.land()
+                    if autopilot is not None:
+                        autopilot.disengage()
+                    command_executor.submit("Land", drone.land)  #Runs before shutdown, see finally
                 running = False
     
             if event.type == pygame.KEYDOWN:
                 #Toggle between logo and drone feed with tab
                 if event.key == pygame.K_TAB:
                     show_logo = not show_logo
+                    dirty_rects.invalidate()  #Whole screen changes between logo and video
                 
                     if show_logo:  
                         print("Turning Camera Off...")
-                        camera_thread.stop()  # ✅ Proper way to stop the camera thread
+                        camera_thread.pause()  #Stream stays warm for CAMERA_GRACE_PERIOD seconds
+                        if ground_station is not None:
+                            ground_station.clear_video()
                     else:
                         print("Turning Camera On...")
-                        camera_thread.start()  # ✅ Proper way to start the camera thread
+                        frame_pipeline.reset()
+                        video_frame = None
 
                                 
                 #Toggle hud.
@@ -296,156 +232,203 @@ try:
                 #Toggle controls.
                 if event.key == pygame.K_c:
                     show_controls = not show_controls
+
+                #Toggle glass-to-glass latency measurement
+                if event.key == pygame.K_g:
+                    latency_probe.enabled = not latency_probe.enabled
+                    if latency_probe.enabled:
+                        print("Measuring glass-to-glass latency...")
+                    else:
+                        save_latency_histograms()
+
+                #Toggle object detection. It loads cv2 and the detector, so only once asked for.
+                if event.key == pygame.K_v:
+                    if vision_stage is None:
+                        from HighRollerVision import DETECTORS, VisionStage
+                        try:
+                            vision_stage = VisionStage(camera_thread, DETECTORS[VISION_DETECTOR],
+                                                       VISION_WORKERS, VISION_WIDTH)
+                        except RuntimeError as e:
+                            print(f"Object detection unavailable: {e}")
+                    if vision_stage is not None and vision_stage.is_active():
+                        print("Turning Detection Off...")
+                        vision_stage.pause()
+                    elif vision_stage is not None:
+                        print("Turning Detection On...")
+                        vision_stage.start()
+
+                #Toggle following a target. Needs the drone in the air and turns the video on.
+                if event.key == pygame.K_f:
+                    if autopilot is not None and autopilot.engaged:
+                        print("Autopilot Off...")
+                        autopilot.disengage()
+                    elif hasTakenOff == False:
+                        print("Take off before following a target.")
+                    else:
+                        if autopilot is None:
+                            from HighRollerAutopilot import TRACKERS, Autopilot
+                            autopilot = Autopilot(camera_thread, movement_thread, TRACKERS[AUTOPILOT_TRACKER],
+                                                  AUTOPILOT_RATE, stale_after=AUTOPILOT_STALE_AFTER,
+                                                  override_hold=AUTOPILOT_OVERRIDE_HOLD)
+                        if show_logo:
+                            show_logo = False
+                            dirty_rects.invalidate()
+                            frame_pipeline.reset()
+                            video_frame = None
+                        print("Following Target...")
+                        autopilot.engage()
+
+                #Scrub a replayed flight
+                if event.key == pygame.K_LEFTBRACKET and replaying:
+                    drone.seek(-REPLAY_SEEK)
+                if event.key == pygame.K_RIGHTBRACKET and replaying:
+                    drone.seek(REPLAY_SEEK)
+
+                #Toggle frame timing overlay, sampling only runs while it is shown
+                if event.key == pygame.K_p:
+                    show_timing = not show_timing
+                    timing_stats_due = 0.0
+                    for ring in timing_rings:
+                        ring.enabled = show_timing
                 
 
                         
-                #Takeoff on space
+                #Takeoff on space. Takeoff, landing and flips run on the command worker so the loop keeps rendering.
                 if event.key == pygame.K_SPACE and hasTakenOff == False:
-                    try:
-                        drone.takeoff()
-                        hasTakenOff = True
-                        print("Taking Off...")
-                    except Exception as e:
-                        print(f"Error during takeoff: {e}")
+                    if not drone_connection.is_connected():
+                        print("Not connected to the drone yet.")
+                    else:
+                        future = command_executor.submit("Takeoff", drone.takeoff)
+                        if future is not None:
+                            takeoff_future = future
+                            print("Taking Off...")
                         
                 #Land on l
                 if event.key == pygame.K_l and hasTakenOff == True:
                     hasTakenOff = False
-                    drone.land()
+                    if autopilot is not None:
+                        autopilot.disengage()
+                    command_executor.submit("Land", drone.land)
                 
                 #Flip forward
                 if event.key == pygame.K_UP and hasTakenOff == True:
-                    if drone.get_battery() < 50:
+                    if not battery_allows_flip():
                         print("Battery too low to perform a flip.")
                     else:
-                        drone.flip_forward()
+                        command_executor.submit("Flip Forward", drone.flip_forward)
                 #Flip backward
                 if event.key == pygame.K_DOWN and hasTakenOff == True:
-                    if drone.get_battery() < 50:
+                    if not battery_allows_flip():
                         print("Battery too low to perform a flip.")
                     else:
-                        drone.flip_back()
+                        command_executor.submit("Flip Backward", drone.flip_back)
                 #Flip left
                 if event.key == pygame.K_LEFT and hasTakenOff == True:
-                    if drone.get_battery() < 50:
+                    if not battery_allows_flip():
                         print("Battery too low to perform a flip.")
                     else:
-                        drone.flip_left()
+                        command_executor.submit("Flip Left", drone.flip_left)
                 #Flip right
                 if event.key == pygame.K_RIGHT and hasTakenOff == True:
-                    if drone.get_battery() < 50:
+                    if not battery_allows_flip():
                         print("Battery too low to perform a flip.")
                     else:
-                        drone.flip_right()
+                        command_executor.submit("Flip Right", drone.flip_right)
                     
                 
+        #Count as airborne only once the takeoff command has succeeded
+        if takeoff_future is not None and takeoff_future.done():
+            hasTakenOff = takeoff_future.exception() is None
+            takeoff_future = None
+
+        #The feed starts once the drone is connected, even if TAB was pressed before that
+        if not show_logo and not camera_thread.streaming and drone_connection.is_connected():
+            camera_thread.start()
+        stage_timer.mark('events')
             
     #End of Events
     ################################################################################
     #Check for key holds
-        keys = pygame.key.get_pressed()
-        #
-        #Forward / Backward
-        if keys[pygame.K_w] and keys[pygame.K_s]:
-            key_states[pygame.K_w] = True
-            key_states[pygame.K_s] = True
-            velocity_y = 0
-        elif keys[pygame.K_w]:
-            key_states[pygame.K_w] = True
-            velocity_y = 100
-        elif keys[pygame.K_s]:
-            key_states[pygame.K_s] = True
-            velocity_y = -100
-        else:
-            velocity_y = 0
-            key_states[pygame.K_w] = False
-            key_states[pygame.K_s] = False
-            
-        #Left / Right
-        if keys[pygame.K_a] and keys[pygame.K_d]:
-            key_states[pygame.K_a] = True
-            key_states[pygame.K_d] = True
-            velocity_x = 0
-        elif keys[pygame.K_d]:
-            key_states[pygame.K_d] = True
-            velocity_x = 100
-        elif keys[pygame.K_a]:
-            key_states[pygame.K_a] = True
-            velocity_x = -100
-        else:
-            velocity_x = 0
-            key_states[pygame.K_a] = False
-            key_states[pygame.K_d] = False
-            
-        #Up / Down
-        if keys[pygame.K_SPACE] and keys[pygame.K_LCTRL]:
-            key_states[pygame.K_SPACE] = True
-            key_states[pygame.K_LCTRL] = True
-            velocity_z = 0
-        elif keys[pygame.K_SPACE]:
-            key_states[pygame.K_SPACE] = True
-            velocity_z = 100
-        elif keys[pygame.K_LCTRL]:
-            key_states[pygame.K_LCTRL] = True
-            velocity_z = -100
-        else:
-            key_states[pygame.K_SPACE] = False
-            key_states[pygame.K_LCTRL] = False
-            velocity_z = 0
-            
-        #Rotation
-        if keys[pygame.K_q] and keys[pygame.K_e]:
-            key_states[pygame.K_q] = True
-            key_states[pygame.K_e] = True
-            rotation_velocity = 0
-        elif keys[pygame.K_q]:
-            key_states[pygame.K_q] = True
-            rotation_velocity = -100
-        elif keys[pygame.K_e]:
-            key_states[pygame.K_e] = True
-            rotation_velocity = 100
-        else:
-            key_states[pygame.K_q] = False
-            key_states[pygame.K_e] = False
-            rotation_velocity = 0
+        velocity = control_input.update(pygame.key.get_pressed())
+        key_states.update(control_input.key_states)
         
-        # Update movement thread values instead of sending commands directly
-        movement_thread.velocity_x = 100 if keys[pygame.K_d] else -100 if keys[pygame.K_a] else 0
-        movement_thread.velocity_y = 100 if keys[pygame.K_w] else -100 if keys[pygame.K_s] else 0
-        movement_thread.velocity_z = 100 if keys[pygame.K_SPACE] else -100 if keys[pygame.K_LCTRL] else 0
-        movement_thread.rotation_velocity = 100 if keys[pygame.K_e] else -100 if keys[pygame.K_q] else 0
+        # Update movement thread values instead of sending commands directly, it only sends when they change.
+        # While following a target the autopilot sends them, until the pilot touches the controls.
+        if autopilot is None or autopilot.pilot_input(velocity):
+            movement_thread.set_velocity(*velocity)
+
+        #A replay shows the recorded RC commands on the key widgets instead
+        if replaying:
+            replayed_command = drone.log.rc_at(drone.log_time())
+            if replayed_command is not None:
+                key_states.update(rc_key_states(replayed_command))
+        stage_timer.mark('keys')
 
                 
     ###############################################################################
     
         #Display either the logo or the drone's video feed
+        shown_frame = None
         if show_logo:
-            screen.blit(logo_surface, logo_rect)
+            #The logo never changes, so only repaint it where the HUD was drawn last frame
+            if dirty_rects.full:
+                screen.blit(logo_surface, logo_rect)
+            else:
+                dirty_rects.restore(logo_surface, logo_rect.topleft)
         else:
+            dirty_rects.invalidate()  #Live video changes every pixel, flip the whole screen
             frame = camera_thread.get_frame()
             if frame is not None:
-                #Create a Pygame surface from the frame
-                drone_surface = pygame.surfarray.make_surface(frame)
-        
-                #Rotate and scale the drone surface to fit the screen minus the dashboard
-                drone_surface = pygame.transform.rotate(drone_surface, -90)
-                drone_surface = pygame.transform.scale(drone_surface, (SCREEN_WIDTH, SCREEN_HEIGHT))
-                screen.blit(drone_surface, (0, 0))
+                #Resize the frame into the shared display surface (skipped if already shown or while
+                #the quality level skips frames) and draw it
+                shown_sequence = frame_pipeline.sequence
+                frame_pipeline.blit(screen, frame.image, frame.sequence)
+                if frame_pipeline.sequence != shown_sequence:
+                    frame_ages.record(time.monotonic() - frame.timestamp)
+                    video_frame = frame
+            shown_frame = video_frame
+
+            #Detection boxes, moved to where they should be on the frame on screen
+            if vision_stage is not None and vision_stage.is_active() and shown_frame is not None:
+                hud.render_detections(vision_stage.boxes_at(shown_frame.timestamp))
+        stage_timer.mark('frame')
             
         #Show Hud if toggled
         if show_hud:
-            render_hud()
+            hud.render_hud(key_states, telemetry_thread.snapshot, command_executor.status, drone_connection.status)
+            if autopilot is not None and autopilot.engaged:
+                hud.render_autopilot(autopilot.status)
+
+        #Show frame timing if toggled
+        if show_timing:
+            if time.monotonic() >= timing_stats_due:
+                timing_stats = collect_timing_stats()
+                timing_stats_due = time.monotonic() + TIMING_REFRESH
+            hud.render_timing(timing_stats)
+        stage_timer.mark('hud')
             
         #Show controls
         if show_controls:
-            render_controls()
+            hud.render_controls()
+
+        #Latency marker tied to the frame on screen
+        if latency_probe.enabled and LATENCY_MARKER and shown_frame is not None:
+            hud.render_latency_marker(shown_frame.sequence)
+        stage_timer.mark('controls')
             
     ###############################################################################
          
-        pygame.display.update()
+        dirty_rects.present()
+        latency_probe.displayed(shown_frame)
+        if not show_logo:
+            video_quality.update(time.perf_counter() - frame_started)  #Busy time, before the FPS sleep
+        stage_timer.mark('display')
     
         #Limit the frame rate
         clock.tick(FPS)
+        render_spans.record()
+        stage_timer.mark('idle')
+        stage_timer.end()
     
     #End of game loop
     ###############################################################################
@@ -457,12 +440,26 @@ except KeyboardInterrupt:
     
 finally:
     #Shut down the Tello and Pygame
-    drone.send_rc_control(0, 0, 0, 0)
-    camera_thread.stop()  # ✅ This safely stops the camera thread and the drone stream
-    movement_thread.stop()  # ✅ Stop movement thread
-    camera_thread.stop()  # ✅ Stop camera thread
+    if latency_probe.enabled:
+        save_latency_histograms()
+    drone_connection.stop()
+    if autopilot is not None:
+        autopilot.stop()  #Before the landing below, so it can't steer during it
+    command_executor.stop()  #Let a queued landing finish first
+    movement_thread.stop()  # ✅ Stop movement thread, so nothing overrides the stop below
     drone.send_rc_control(0, 0, 0, 0)  # ✅ Make sure the drone stops moving
-    drone.end()
+    if ground_station is not None:
+        ground_station.stop()  #Disconnects the viewers
+    if vision_stage is not None:
+        vision_stage.stop()  #Before the camera it waits on
+    camera_thread.stop()  # ✅ This safely stops the camera thread and the drone stream
+    telemetry_thread.stop()  #Stop telemetry thread before the drone's state goes away
+    if frame_source is not None:
+        frame_source.stop()  #Ends the decoder process
+    if flight_recorder is not None:
+        flight_recorder.stop()  #After its producers, so nothing is offered to a closed recorder
+    with command_lock:
+        drone.end()  #Lands if still flying. The connection thread may still be mid-attempt.
     print("Terminating drone connection...")
     pygame.quit()
     print("Quiting PyGame...")
@@ -0,0 +1,277 @@
+"""Flight log format written by FlightRecorder, and a reader that replays it through the controllers.
+
+A log is an append-only file: a 24 byte header followed by 32 byte little-endian records
+(kind, monotonic timestamp, five float32 values with NaN for unknown) in the order they were
+written. Because every record has the same size, the file can be memory-mapped as a NumPy
+structured array and nothing has to be parsed up front.
+
+Records arrive from several threads, so timestamps are only nearly sorted. The time index in the
+.hridx file next to the log stores the running maximum timestamp at every INDEX_STRIDE-th record,
+which is sorted, so finding a time is a binary search over the index plus a scan of one block.
+Entries the recorder didn't get to write (e.g. after a crash) are rebuilt from the tail of the log.
+
+Replay a flight through the controllers with:
+
+    HIGHROLLER_DRONE=replay HIGHROLLER_REPLAY=recordings/flight_20240101_120000.hrlog \\
+        python HighRollerDroneControllerThreading.py
+"""
+import math
+import os
+import struct
+import time
+
+import numpy as np
+from djitellopy import Tello
+
+from HighRollerCamera import CameraFrame
+from HighRollerMovement import RcCommand
+from HighRollerTelemetry import TelemetrySnapshot
+
+LOG_MAGIC = b'HRFLOG1\n'
+LOG_HEADER = struct.Struct('<8sdd')  #magic, wall clock and monotonic time when recording started
+LOG_RECORD = struct.Struct('<B3xd5f')  #kind, timestamp, up to five values with NaN for unknown
+LOG_DTYPE = np.dtype([('kind', 'u1'), ('pad', 'V3'), ('timestamp', '<f8'), ('values', '<f4', (5,))])
+
+RECORD_TELEMETRY = 1  #battery, temperature, height, barometer, flight_time
+RECORD_RC = 2  #velocity_x, velocity_y, velocity_z, rotation_velocity, generation
+RECORD_FRAME = 3  #camera sequence, index of the frame in the video file
+
+INDEX_STRIDE = 256  #Records per time index entry
+INDEX_ENTRY = struct.Struct('<dQ')  #running maximum timestamp, record number
+INDEX_DTYPE = np.dtype([('timestamp', '<f8'), ('record', '<u8')])
+
+
+def pack_record(kind, timestamp, *values):
+    values = [math.nan if value is None else value for value in values]
+    values += [math.nan] * (5 - len(values))
+    return LOG_RECORD.pack(kind, timestamp, *values)
+
+
+def index_path(log_path):
+    return os.path.splitext(log_path)[0] + '.hridx'
+
+
+def video_path(log_path):
+    return os.path.splitext(log_path)[0] + '.mp4'
+
+
+def optional(value, kind=float):
+    return None if math.isnan(value) else kind(value)
+
+
+class FlightLog:
+    """Read-only, memory-mapped view of a flight log.
+
+    Opening a log maps the file and loads the small time index; records are only paged in when
+    they are looked at, so multi-hour logs open instantly.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            magic, self.wall_time, self.start_time = LOG_HEADER.unpack(file.read(LOG_HEADER.size))
+        if magic != LOG_MAGIC:
+            raise ValueError(f"{path} is not a flight log")
+
+        #A record cut short by a crash is ignored
+        count = (os.path.getsize(path) - LOG_HEADER.size) // LOG_DTYPE.itemsize
+        if count:
+            self.records = np.memmap(path, LOG_DTYPE, 'r', offset=LOG_HEADER.size, shape=(count,))
+        else:
+            self.records = np.zeros(0, LOG_DTYPE)
+        self.index = self.load_index()
+        if count:
+            last_block = self.records['timestamp'][(len(self.index) - 1) * INDEX_STRIDE:]
+            self.end_time = max(float(self.index[-1]), float(last_block.max()))
+        else:
+            self.end_time = self.start_time
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def duration(self):
+        return self.end_time - self.start_time
+
+    def load_index(self):
+        """Running maximum timestamp at every INDEX_STRIDE-th record, as one small array."""
+        needed = -(-len(self.records) // INDEX_STRIDE)
+        index = np.zeros(0)
+        path = index_path(self.path)
+        if os.path.exists(path):
+            entries = np.fromfile(path, INDEX_DTYPE)[:needed]
+            index = entries['timestamp']
+        if len(index) == needed:
+            return index
+
+        #Rebuild the missing entries from the last indexed block onwards
+        start = max(len(index) - 1, 0) * INDEX_STRIDE
+        running = np.maximum.accumulate(self.records['timestamp'][start:])
+        if len(index):
+            running = np.maximum(running, index[-1])
+            return np.concatenate((index, running[INDEX_STRIDE::INDEX_STRIDE]))
+        return running[::INDEX_STRIDE].copy()
+
+    def seek(self, timestamp):
+        """Number of records written at or before timestamp: a binary search over the index,
+        then over the running maximum of one block."""
+        block = int(np.searchsorted(self.index, timestamp, 'right'))
+        if block == 0:
+            return 0
+        start = (block - 1) * INDEX_STRIDE
+        running = np.maximum.accumulate(self.records['timestamp'][start:start + INDEX_STRIDE])
+        return start + int(np.searchsorted(running, timestamp, 'right'))
+
+    def first(self, kind, limit=4096):
+        """The first record of a kind among the first limit records."""
+        records = self.records[:limit]
+        hits = np.flatnonzero(records['kind'] == kind)
+        return records[hits[0]] if hits.size else None
+
+    def latest(self, kind, timestamp, limit=4096):
+        """The last record of a kind at or before timestamp, looking back at most limit records."""
+        end = self.seek(timestamp)
+        start = max(0, end - limit)
+        records = self.records[start:end]
+        hits = np.flatnonzero((records['kind'] == kind) & (records['timestamp'] <= timestamp))
+        return records[hits[-1]] if hits.size else None
+
+    def telemetry_at(self, timestamp):
+        record = self.latest(RECORD_TELEMETRY, timestamp)
+        if record is None:
+            return None
+        battery, temperature, height, barometer, flight_time = record['values']
+        return TelemetrySnapshot(float(record['timestamp']), optional(battery, int), optional(temperature),
+                                 optional(height, int), optional(barometer), optional(flight_time, int))
+
+    def rc_at(self, timestamp):
+        record = self.latest(RECORD_RC, timestamp)
+        if record is None:
+            return None
+        values = [int(value) for value in record['values']]
+        return RcCommand(*values, float(record['timestamp']))
+
+    def frame_at(self, timestamp):
+        """(camera sequence, video frame index) of the last frame recorded by timestamp, or None."""
+        record = self.latest(RECORD_FRAME, timestamp)
+        if record is None:
+            return None
+        return int(record['values'][0]), int(record['values'][1])
+
+
+class ReplayFrameSource:
+    """Frame source for CameraThread that plays the recorded video in step with a replay clock.
+
+    Frames are read from the flight's .mp4 by the index in their log records; reading on from
+    the last frame is sequential, anything else seeks.
+    """
+
+    POLL_INTERVAL = 0.005
+
+    def __init__(self, log, clock):
+        self.log = log
+        self.clock = clock
+        self.capture = None  #Opened by the first read, so cv2 is only loaded once the feed is shown
+        self.opened = False
+        self.position = 0  #Index of the frame the capture reads next
+        self.latest = None  #(sequence, image) last read, for the frame property
+
+    def read(self, index):
+        import cv2
+        if not self.opened:
+            self.opened = True
+            path = video_path(self.log.path)
+            if os.path.exists(path):
+                self.capture = cv2.VideoCapture(path)
+        if self.capture is None:
+            return None
+        if index != self.position:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ok, image = self.capture.read()
+        if not ok:
+            self.position = -1
+            return None
+        self.position = index + 1
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    def wait_for_frame(self, last_sequence, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            found = self.log.frame_at(self.clock())
+            if found is not None and found[0] != last_sequence:
+                image = self.read(found[1])
+                if image is not None:
+                    self.latest = (found[0], image)
+                    return CameraFrame(found[0], time.monotonic(), image)
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.POLL_INTERVAL)
+
+    @property
+    def frame(self):
+        """Image at the replay clock without waiting, like BackgroundFrameRead.frame."""
+        last_sequence = self.latest[0] if self.latest is not None else None
+        self.wait_for_frame(last_sequence, 0)
+        return self.latest[1] if self.latest is not None else None
+
+
+class ReplayTello(Tello):
+    """Tello stand-in that plays a flight log back in real time.
+
+    State comes from the log's telemetry records and video from its .mp4, so the HUD and video
+    feed look like the recorded flight. Every command is answered "ok" and nothing is flown.
+    seek() scrubs the replay clock.
+    """
+
+    def __init__(self, path):
+        #Deliberately not calling Tello.__init__, which binds the shared port 8889 socket
+        self.log = FlightLog(path)
+        self.stream_on = False
+        self.is_flying = False
+        self.retry_count = 1
+        self.last_received_command_timestamp = time.time()
+        self.last_rc_control_timestamp = time.time()
+        self.background_frame_read = None
+        first = self.log.first(RECORD_TELEMETRY)  #Start where the HUD has something to show
+        start = self.log.start_time if first is None else float(first['timestamp'])
+        self.offset = start - time.monotonic()  #Log time minus now
+        self.state = {}
+        self.state_time = None  #Timestamp of the telemetry record self.state was made from
+        self.frame_source = ReplayFrameSource(self.log, self.log_time)
+        print(f"Replaying {path}: {len(self.log)} records, {self.log.duration:.0f}s")
+
+    def log_time(self):
+        return min(time.monotonic() + self.offset, self.log.end_time)
+
+    def seek(self, seconds):
+        """Move the replay clock by seconds, within the log."""
+        target = min(max(self.log_time() + seconds, self.log.start_time), self.log.end_time)
+        self.offset = target - time.monotonic()
+        print(f"Replay at {target - self.log.start_time:.0f}s of {self.log.duration:.0f}s")
+
+    def get_current_state(self):
+        #A new dict only when another telemetry record applies, like djitellopy's state receiver
+        snapshot = self.log.telemetry_at(self.log_time())
+        if snapshot is None:
+            return self.state
+        if snapshot.timestamp != self.state_time:
+            self.state_time = snapshot.timestamp
+            fields = {'bat': snapshot.battery, 'templ': snapshot.temperature, 'temph': snapshot.temperature,
+                      'h': snapshot.height, 'time': snapshot.flight_time,
+                      'baro': None if snapshot.barometer is None else snapshot.barometer / 100}
+            self.state = {key: value for key, value in fields.items() if value is not None}
+        return self.state
+
+    def get_frame_read(self, *args, **kwargs):
+        return self.frame_source
+
+    def send_command_with_return(self, command, timeout=Tello.RESPONSE_TIMEOUT):
+        self.last_received_command_timestamp = time.time()
+        return 'ok'
+
+    def send_command_without_return(self, command):
+        pass
+
+    def end(self):
+        if self.frame_source.capture is not None:
+            self.frame_source.capture.release()
@@ -0,0 +1,170 @@
+import threading
+import time
+
+#What a Subscription does with a new frame when its ring is full, see Subscription
+FRAME_POLICIES = ('latest', 'drop-oldest', 'drop-newest', 'block')
+
+
+class Subscription:
+    """One consumer's bounded ring of CameraFrames, filled by a FrameBus (or put() directly).
+
+    The ring holds up to capacity frames in preallocated slots. What happens to a new frame
+    depends on policy:
+    - 'latest': whatever is still queued is replaced, so get() always returns the newest frame,
+    - 'drop-oldest': when full, the oldest queued frame makes room,
+    - 'drop-newest': when full, the new frame is dropped and the queued ones are kept,
+    - 'block': when full, the publisher waits up to block_timeout seconds for room and then drops
+      the new frame. The publisher is the camera thread, so a slow blocking subscriber holds up
+      every other subscriber and the display too; meant for consumers that must see every frame
+      and normally keep up.
+
+    `dropped` counts the frames this subscriber never got, `delivered` the ones get() returned
+    and `blocked` the seconds the publisher spent waiting for it.
+    """
+
+    def __init__(self, name, capacity=1, policy='latest', block_timeout=0.1):
+        if policy not in FRAME_POLICIES:
+            raise ValueError(f"policy must be one of {FRAME_POLICIES}")
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.name = name
+        self.capacity = capacity
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.slots = [None] * capacity
+        self.read = 0  #Frames taken out of the ring or discarded, ever
+        self.written = 0  #Frames put into the ring, ever
+        self.closed = False
+        self.condition = threading.Condition()
+
+        #Counters
+        self.delivered = 0
+        self.dropped = 0
+        self.blocked = 0.0
+
+    def __len__(self):
+        return self.written - self.read
+
+    def discard(self, count):
+        """Drop the count oldest queued frames. Call with the condition held."""
+        for _ in range(count):
+            self.slots[self.read % self.capacity] = None
+            self.read += 1
+        self.dropped += count
+
+    def put(self, frame):
+        """Queue frame by policy. Returns False if this or an older frame was dropped for it."""
+        with self.condition:
+            if self.closed:
+                self.dropped += 1
+                return False
+            queued = len(self)
+            kept = True
+            if self.policy == 'latest' and queued:
+                self.discard(queued)
+                kept = False
+            elif queued == self.capacity:
+                if self.policy == 'drop-oldest':
+                    self.discard(1)
+                    kept = False
+                elif self.policy == 'drop-newest':
+                    self.dropped += 1
+                    return False
+                else:
+                    started = time.monotonic()
+                    self.condition.wait_for(lambda: self.closed or len(self) < self.capacity, self.block_timeout)
+                    self.blocked += time.monotonic() - started
+                    if self.closed or len(self) == self.capacity:
+                        self.dropped += 1
+                        return False
+            self.slots[self.written % self.capacity] = frame
+            self.written += 1
+            self.condition.notify_all()
+            return kept
+
+    def get(self, timeout=None):
+        """The oldest queued frame, waiting up to timeout seconds for one. Returns None on timeout,
+        or once the subscription is closed and everything queued before that has been taken."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.closed or len(self) > 0, timeout)
+            if not len(self):
+                return None
+            slot = self.read % self.capacity
+            frame = self.slots[slot]
+            self.slots[slot] = None  #Don't keep the image alive after the consumer is done with it
+            self.read += 1
+            self.delivered += 1
+            self.condition.notify_all()  #Room for a blocked publisher
+            return frame
+
+    def clear(self):
+        """Drop everything queued, e.g. frames that arrived before a pause."""
+        with self.condition:
+            self.discard(len(self))
+            self.condition.notify_all()
+
+    def close(self):
+        """No more frames: get() returns what is queued and then None, put() drops."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def stats(self):
+        return {'policy': self.policy, 'capacity': self.capacity, 'queued': len(self),
+                'delivered': self.delivered, 'dropped': self.dropped, 'blocked_s': self.blocked}
+
+
+class FrameBus:
+    """Hands each published CameraFrame to every subscriber's own bounded ring.
+
+    Subscribers share one image by reference instead of getting a copy each. The bus makes it
+    read-only first, so no consumer can change what the others see. A frame that is read-only
+    already is borrowed memory that its producer will reuse (HighRollerDecoder's shared ring),
+    so it is copied once for everyone instead. publish() never blocks unless a subscriber
+    uses the 'block' policy. A closed subscription is taken off the bus by the next publish(),
+    so frames are never frozen or copied for nobody.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()  #Only serialises subscribing, publish() reads the tuple as is
+        self.subscriptions = ()
+        self.published = 0
+        self.copied = 0  #Borrowed frames that had to be copied
+
+    def subscribe(self, name, capacity=1, policy='latest', block_timeout=0.1):
+        """A new Subscription that gets every frame published from now on."""
+        return self.add(Subscription(name, capacity, policy, block_timeout))
+
+    def add(self, subscription):
+        with self.lock:
+            self.subscriptions = self.subscriptions + (subscription,)
+        return subscription
+
+    def remove(self, subscription):
+        """Stop sending frames to subscription. What it has queued stays there."""
+        with self.lock:
+            self.subscriptions = tuple(s for s in self.subscriptions if s is not subscription)
+
+    def publish(self, frame):
+        subscriptions = self.subscriptions
+        if any(subscription.closed for subscription in subscriptions):
+            with self.lock:
+                self.subscriptions = tuple(s for s in self.subscriptions if not s.closed)
+            subscriptions = self.subscriptions
+        if not subscriptions:
+            return
+        image = frame.image
+        if image.flags.writeable:
+            image.flags.writeable = False
+        else:
+            image = image.copy()
+            image.flags.writeable = False
+            frame = frame._replace(image=image)
+            self.copied += 1
+        self.published += 1
+        for subscription in subscriptions:
+            subscription.put(frame)
+
+    def stats(self):
+        """Subscription.stats() of every subscriber by name."""
+        return {subscription.name: subscription.stats() for subscription in self.subscriptions}
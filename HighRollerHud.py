@@ -0,0 +1,232 @@
+import math
+import time
+
+import pygame
+
+from HighRollerDisplay import TextCache
+
+WHITE = (255, 255, 255)
+GREEN = (0, 255, 0)
+RED = (255, 0, 0)
+
+#Colors for the last takeoff/land/flip command shown on the HUD
+COMMAND_COLORS = {'running': WHITE, 'ok': GREEN, 'failed': RED}
+COMMAND_STATUS_TIME = 3  #Seconds a finished command stays on the HUD
+
+#Colors for the drone connection state, see HighRollerConnection
+CONNECTION_COLORS = {'connecting': WHITE, 'retrying': RED, 'connected': GREEN}
+
+#Autopilot states as shown on the HUD and their colors, see HighRollerAutopilot
+AUTOPILOT_STATES = {
+    'tracking': ("Following", GREEN),
+    'lost': ("Target lost", WHITE),
+    'searching': ("No target, hovering", RED),
+    'stale': ("No video, hovering", RED),
+    'override': ("Pilot override", WHITE),
+}
+
+#Control text list
+CONTROLS = [
+    "W - Move Forward",
+    "S - Move Backward",
+    "A - Move Left",
+    "D - Move Right",
+    "Q - Rotate Left",
+    "E - Rotate Right",
+    "SPACE - Ascend",
+    "LCTRL - Descend",
+    "Gamepad Sticks - Fly",
+    "L - Land",
+    "UP - Flip Forward",
+    "DOWN - Flip Backward",
+    "LEFT - Flip Left",
+    "RIGHT - Flip Right",
+    "TAB - Toggle Camera",
+    "O - Toggle Controls",
+    "H - Toggle HUD",
+    "P - Toggle Timing",
+    "G - Toggle Latency Mode",
+    "V - Toggle Detection",
+    "F - Toggle Follow Target",
+    "[ / ] - Scrub Replay"
+]
+
+
+class Hud:
+    """Draws the HUD (key widgets, telemetry) and the controls overlay onto the screen.
+
+    Text goes through a TextCache so unchanged labels are never re-rendered, and the controls
+    overlay is built once since nothing on it ever changes.
+    """
+
+    #Key dimensions and spacing
+    KEY_WIDTH = 40
+    KEY_HEIGHT = 40
+
+    def __init__(self, screen, font, text_cache=None, dirty=None):
+        self.screen = screen
+        self.font = font
+        self.text_cache = text_cache if text_cache is not None else TextCache()
+        self.dirty = dirty  #Optional DirtyRectTracker told about every region drawn
+        self.screen_width, self.screen_height = screen.get_size()
+
+        #Offsets to make it easier to move controls around
+        self.x_offset = 30
+        self.y_offset = 440
+
+        self.controls_surface = self.build_controls_surface()
+
+    def text(self, text, color=WHITE):
+        return self.text_cache.render(self.font, text, color)
+
+    def touched(self, rect):
+        if self.dirty is not None:
+            self.dirty.add(rect)
+
+    def blit(self, surface, position):
+        self.touched(self.screen.blit(surface, position))
+
+    def build_controls_surface(self):
+        box_width = 400
+        box_height = 595
+        box_color = (0, 0, 0, 150)  #Black with 150 alpha (semi-transparent) *Thanks chatGPT for transparency help
+        border_color = (255, 255, 255)
+        text_color = (255, 255, 255)  #White text
+
+        #Create a surface with per-pixel alpha
+        controls_surface = pygame.Surface((box_width, box_height), pygame.SRCALPHA)
+
+        #Draw semi-transparent black rectangle
+        pygame.draw.rect(controls_surface, box_color, (0, 0, box_width, box_height))
+
+        #Draw white border
+        pygame.draw.rect(controls_surface, border_color, (0, 0, box_width, box_height), 2)
+
+        #Render control text on the transparent surface
+        line_spacing = 25
+        for i, control_text in enumerate(CONTROLS):
+            text_surface = self.font.render(control_text, True, text_color)
+            text_rect = text_surface.get_rect(center=(box_width // 2, 40 + i * line_spacing))
+            controls_surface.blit(text_surface, text_rect)
+        return controls_surface
+
+    def render_controls(self):
+        box_x = (self.screen_width - self.controls_surface.get_width()) // 2
+        box_y = (self.screen_height - self.controls_surface.get_height()) // 2
+        self.blit(self.controls_surface, (box_x, box_y))
+
+    def draw_key(self, x, y, text, is_active, width=KEY_WIDTH):
+        color = GREEN if is_active else WHITE
+        self.touched(pygame.draw.rect(self.screen, color, (x, y, width, self.KEY_HEIGHT), 2))  #Draw key border
+        key_surface = self.text(text, color)
+        text_rect = key_surface.get_rect(center=(x + width // 2, y + self.KEY_HEIGHT // 2))
+        self.blit(key_surface, text_rect)
+
+    def render_hud(self, key_states, telemetry, command_status=None, connection=None):
+        x_offset = self.x_offset
+        y_offset = self.y_offset
+
+        #Show control tips
+        self.blit(self.text("Toggle Hud - H"), (10, 20))
+        self.blit(self.text("View Controls - C"), (10, 50))
+
+        #Draw keys
+        self.draw_key(x_offset + 65, y_offset + 50, "Q", key_states[pygame.K_q])
+        self.draw_key(x_offset + 155, y_offset + 50, "E", key_states[pygame.K_e])
+        self.draw_key(x_offset + 110, y_offset + 90, "W", key_states[pygame.K_w])
+
+        self.draw_key(x_offset + 65, y_offset + 130, "A", key_states[pygame.K_a])
+        self.draw_key(x_offset + 155, y_offset + 130, "D", key_states[pygame.K_d])
+
+        self.draw_key(x_offset + 110, y_offset + 170, "S", key_states[pygame.K_s])
+
+        self.draw_key(x_offset + 160, y_offset + 210, "SPACE", key_states[pygame.K_SPACE], width=100)
+        self.draw_key(x_offset + 0, y_offset + 210, "LCTRL", key_states[pygame.K_LCTRL], width=100)
+
+        #Telemetry comes from one immutable snapshot per state packet, so no drone calls here
+        telemetry_x = self.screen_width - 200
+        if connection is not None:
+            self.blit(self.text(connection_line(connection), CONNECTION_COLORS[connection.state]), (telemetry_x, 20))
+        for y, text in zip(range(50, 200, 30), telemetry_lines(telemetry)):
+            self.blit(self.text(text), (telemetry_x, y))
+
+        #Show the command in progress, or how the last one ended for a few seconds
+        if command_status is not None and (command_status.state == 'running'
+                                           or time.monotonic() - command_status.timestamp < COMMAND_STATUS_TIME):
+            status_text = f"{command_status.name}: {command_status.state}"
+            self.blit(self.text(status_text, COMMAND_COLORS[command_status.state]), (telemetry_x, 200))
+
+
+    def render_timing(self, stats):
+        """Frame-timing overlay under the control tips, from a FrameStats."""
+        lines = (
+            f"Render: {stats.render_fps:.1f} FPS",
+            f"Camera: {stats.camera_fps:.1f} FPS",
+            f"Frame Age: {stats.frame_age_ms:.0f}ms",
+            f"RC: {stats.rc_rate:.1f} pkt/s",
+            f"Dropped: {stats.dropped_frames}",
+        )
+        for y, text in zip(range(90, 240, 30), lines):
+            self.blit(self.text(text), (10, y))
+
+
+    def render_detections(self, detections, color=GREEN):
+        """Boxes and labels for Detections (see HighRollerVision) over the full-screen video feed."""
+        for detection in detections:
+            rect = pygame.Rect(round(detection.x * self.screen_width), round(detection.y * self.screen_height),
+                               round(detection.width * self.screen_width), round(detection.height * self.screen_height))
+            self.touched(pygame.draw.rect(self.screen, color, rect, 2))
+            self.blit(self.text(detection.label, color), (rect.x, max(0, rect.y - 20)))
+
+
+    def render_autopilot(self, status):
+        """Follow-target state under the telemetry and the tracked target's box, from an AutopilotStatus."""
+        if status.state not in AUTOPILOT_STATES:
+            return
+        text, color = AUTOPILOT_STATES[status.state]
+        self.blit(self.text(f"Autopilot: {text}", color), (self.screen_width - 200, 230))
+        if status.target is not None:
+            self.render_detections((status.target,), RED)
+
+
+    def render_latency_marker(self, sequence, period=30):
+        """Square in the bottom right that is white on every period-th frame and black otherwise,
+        with the frame number beside it, for timing the display with an external camera."""
+        color = WHITE if sequence % period == 0 else (0, 0, 0)
+        marker = pygame.Rect(self.screen_width - 60, self.screen_height - 60, 50, 50)
+        self.touched(self.screen.fill(color, marker))
+        self.blit(self.text(str(sequence)), (marker.x - 60, marker.y + 16))
+
+
+def connection_line(connection):
+    """HUD text for a ConnectionStatus."""
+    if connection.state == 'connected':
+        return "Drone: Connected"
+    if connection.state == 'retrying':
+        return f"Drone: Retrying in {max(0, math.ceil(connection.retry_at - time.monotonic()))}s"
+    return f"Drone: Connecting ({connection.attempt})"
+
+
+def telemetry_lines(telemetry):
+    """HUD text for a TelemetrySnapshot, "NA" for fields the drone has not reported."""
+    return (
+        f"Battery: {telemetry.battery}%" if telemetry.battery is not None else "Battery: NA",
+        f"Temperature: {int(telemetry.temperature)}°F" if telemetry.temperature is not None else "Temperature: NA",
+        f"Height: {int(telemetry.height)}cm" if telemetry.height is not None else "Height: NA",
+        f"Barometer: {int(telemetry.barometer)}cm" if telemetry.barometer is not None else "Barometer: NA",
+        f"Flight Time: {int(telemetry.flight_time or 0)}s",
+    )
+
+
+def rc_key_states(command):
+    """Key widget states that would have sent an RcCommand, for showing a replayed flight."""
+    return {
+        pygame.K_w: command.velocity_y > 0,
+        pygame.K_s: command.velocity_y < 0,
+        pygame.K_d: command.velocity_x > 0,
+        pygame.K_a: command.velocity_x < 0,
+        pygame.K_SPACE: command.velocity_z > 0,
+        pygame.K_LCTRL: command.velocity_z < 0,
+        pygame.K_e: command.rotation_velocity > 0,
+        pygame.K_q: command.rotation_velocity < 0,
+    }
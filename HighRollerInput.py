@@ -0,0 +1,108 @@
+import time
+
+import numpy as np
+import pygame
+
+#RC axes in the order send_rc_control takes them: left/right, forward/back, up/down, yaw
+RC_AXES = ('velocity_x', 'velocity_y', 'velocity_z', 'rotation_velocity')
+
+#Keys that push each axis positive and negative
+POSITIVE_KEYS = (pygame.K_d, pygame.K_w, pygame.K_SPACE, pygame.K_e)
+NEGATIVE_KEYS = (pygame.K_a, pygame.K_s, pygame.K_LCTRL, pygame.K_q)
+
+#Gamepad axis feeding each RC axis and its sign, mode 2 on an Xbox style pad under SDL 2:
+#right stick moves, left stick climbs and turns. Stick up reads negative, hence the -1s.
+JOYSTICK_AXES = (2, 3, 1, 0)
+JOYSTICK_SIGNS = (1, -1, -1, 1)
+
+
+def per_axis(value):
+    """A scalar or one value per RC axis, as a float array of four."""
+    return np.broadcast_to(np.asarray(value, dtype=float), (len(RC_AXES),)).copy()
+
+
+class ControlInput:
+    """Turns held keys and a gamepad's sticks into one RC vector per tick.
+
+    Keyboard and stick are added into a 4-axis vector in [-1, 1], then shaped in one vectorized
+    step each: a deadzone that swallows stick noise around the centre, an expo curve for finer
+    control near it, and a ramp that limits how fast each axis may speed up (ramp_up) or slow
+    down and reverse (ramp_down), in full scale per second. The result is scaled to max_speed and
+    rounded to resolution, so a resting or slightly noisy stick doesn't publish a new command
+    every tick. deadzone, expo and the ramps take a scalar or one value per axis.
+    """
+
+    def __init__(self, deadzone=0.1, expo=0.3, ramp_up=4.0, ramp_down=8.0, max_speed=100, resolution=5,
+                 joystick_axes=JOYSTICK_AXES, joystick_signs=JOYSTICK_SIGNS):
+        self.deadzone = np.minimum(per_axis(deadzone), 0.99)
+        self.expo = per_axis(expo)
+        self.ramp_up = per_axis(ramp_up)
+        self.ramp_down = per_axis(ramp_down)
+        self.max_speed = max_speed
+        self.resolution = resolution
+        self.joystick_axes = tuple(joystick_axes)
+        self.joystick_signs = np.asarray(joystick_signs, dtype=float)
+        self.joystick = None
+        self.current = np.zeros(len(RC_AXES))  #Ramped output, full scale is 1
+        self.last_update = None
+        self.key_states = {key: False for key in POSITIVE_KEYS + NEGATIVE_KEYS}
+
+    def handle_event(self, event):
+        """Open a gamepad when one is plugged in (SDL also reports those present at startup)
+        and let go of it when it is removed."""
+        if event.type == pygame.JOYDEVICEADDED and self.joystick is None:
+            self.joystick = pygame.joystick.Joystick(event.device_index)
+            print(f"Gamepad connected: {self.joystick.get_name()}")
+        elif event.type == pygame.JOYDEVICEREMOVED and self.joystick is not None \
+                and event.instance_id == self.joystick.get_instance_id():
+            print("Gamepad disconnected.")
+            self.joystick = None
+
+    def stick(self):
+        """Raw stick positions per RC axis, zero without a gamepad."""
+        if self.joystick is None:
+            return np.zeros(len(RC_AXES))
+        count = self.joystick.get_numaxes()
+        positions = np.fromiter((self.joystick.get_axis(axis) if axis < count else 0.0
+                                 for axis in self.joystick_axes), float, len(RC_AXES))
+        return positions * self.joystick_signs
+
+    def shape(self, raw):
+        """Deadzone, then expo, on a vector in [-1, 1]."""
+        magnitude = np.abs(raw)
+        scaled = np.maximum(magnitude - self.deadzone, 0.0) / (1.0 - self.deadzone)
+        return np.sign(raw) * ((1.0 - self.expo) * scaled + self.expo * scaled ** 3)
+
+    def ramp(self, target, elapsed):
+        """Move the output towards target by at most the ramp rate of each axis."""
+        current = self.current
+        speeding_up = (np.abs(target) > np.abs(current)) & (target * current >= 0)
+        step = np.where(speeding_up, self.ramp_up, self.ramp_down) * elapsed
+        self.current = current + np.clip(target - current, -step, step)
+        return self.current
+
+    def update(self, keys, now=None):
+        """The RC command for this tick, as four ints, from pygame.key.get_pressed() and the gamepad."""
+        now = time.monotonic() if now is None else now
+        #A long stall (e.g. a dragged window) shouldn't turn into one big jump
+        elapsed = 0.0 if self.last_update is None else min(now - self.last_update, 0.1)
+        self.last_update = now
+
+        held = np.fromiter((keys[key] for key in POSITIVE_KEYS + NEGATIVE_KEYS), bool, 2 * len(RC_AXES))
+        positive, negative = held[:len(RC_AXES)], held[len(RC_AXES):]
+        raw = np.clip(positive.astype(float) - negative + self.stick(), -1.0, 1.0)
+        target = self.shape(raw)
+        output = self.ramp(target, elapsed) if elapsed > 0 else self.current
+
+        #Key widgets light up for held keys and for stick deflections past the deadzone
+        positive |= target > 0
+        negative |= target < 0
+        self.key_states.update(zip(POSITIVE_KEYS + NEGATIVE_KEYS, np.concatenate((positive, negative)).tolist()))
+
+        steps = self.max_speed / self.resolution
+        return tuple((np.rint(output * steps) * self.resolution).astype(int).tolist())
+
+    def reset(self):
+        """Stop ramping from the current output, e.g. after the commands went to another drone."""
+        self.current = np.zeros(len(RC_AXES))
+        self.last_update = None
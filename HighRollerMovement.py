@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import namedtuple
+
+from HighRollerProfiling import SpanRing
+
+
+class RcCommand(namedtuple('RcCommand', ['velocity_x', 'velocity_y', 'velocity_z', 'rotation_velocity',
+                                         'generation', 'timestamp'])):
+    """One immutable RC vector. generation goes up by one for every published change and
+    timestamp is time.monotonic() when it was published."""
+
+    __slots__ = ()
+
+    @property
+    def velocity(self):
+        return (self.velocity_x, self.velocity_y, self.velocity_z, self.rotation_velocity)
+
+
+class DroneMovementThread:
+    """Sends RC commands when the velocities change instead of on a fixed 50 ms tick.
+
+    Producers publish a new RcCommand with a single reference swap, so the sender always
+    transmits a consistent vector and never takes a lock. A changed vector goes out as soon as
+    min_interval has passed since the previous packet; generations published faster than that
+    are coalesced into the newest. While nothing changes, the current command is repeated every
+    keepalive_interval so the Tello keeps receiving commands.
+    """
+
+    def __init__(self, drone, min_interval=0.02, keepalive_interval=0.5):
+        self.drone = drone
+        self.min_interval = min_interval
+        self.keepalive_interval = keepalive_interval
+        self.running = True
+        self.command = RcCommand(0, 0, 0, 0, 0, time.monotonic())
+        self.publish_lock = threading.Lock()  #Only serialises producers, the sender never takes it
+        self.changed = threading.Event()
+
+        #Counters
+        self.packets_sent = 0
+        self.keepalives_sent = 0
+        self.packets_coalesced = 0  #Generations replaced by a newer one before they were sent
+        self.latency_total = 0.0  #Seconds from publishing a command to sending it
+        self.latency_max = 0.0
+        self.latency_count = 0
+        self.spans = SpanRing()  #One sample per packet: seconds spent in send_rc_control
+        self.recorder = None  #Gets every packet sent through offer_rc(), see HighRollerRecorder
+
+        self.thread = threading.Thread(target=self.update, daemon=True)
+        self.thread.start()
+
+    def set_velocity(self, velocity_x, velocity_y, velocity_z, rotation_velocity):
+        """Publish new velocities. Wakes the sender only if something changed."""
+        velocity = (velocity_x, velocity_y, velocity_z, rotation_velocity)
+        with self.publish_lock:
+            current = self.command
+            if velocity == current.velocity:
+                return
+            self.command = RcCommand(*velocity, current.generation + 1, time.monotonic())
+        self.changed.set()
+
+    def average_latency(self):
+        return self.latency_total / self.latency_count if self.latency_count else 0.0
+
+    def update(self):
+        """Continuously sends movement commands to the drone without blocking the main loop."""
+        last_send = 0.0
+        sent_generation = -1
+        while self.running:
+            command = self.command
+            now = time.monotonic()
+            if command.generation != sent_generation:
+                wait = last_send + self.min_interval - now
+            else:
+                wait = last_send + self.keepalive_interval - now
+            if wait > 0:
+                self.changed.wait(wait)
+                self.changed.clear()  #The command is re-read at the top, so no change is lost
+                continue
+
+            try:
+                self.drone.send_rc_control(*command.velocity)
+            except Exception as e:
+                print(f"Error in movement thread: {e}")
+            last_send = time.monotonic()
+            self.spans.record(last_send - now, last_send)
+            if self.recorder is not None:
+                self.recorder.offer_rc(command, last_send)
+
+            self.packets_sent += 1
+            if command.generation == sent_generation:
+                self.keepalives_sent += 1
+            else:
+                if sent_generation >= 0:
+                    self.packets_coalesced += command.generation - sent_generation - 1
+                latency = last_send - command.timestamp
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+                self.latency_count += 1
+                sent_generation = command.generation
+
+    def stop(self):
+        self.running = False
+        self.changed.set()
+        self.thread.join()
@@ -0,0 +1,187 @@
+import csv
+import json
+import time
+from collections import namedtuple
+
+import numpy as np
+
+#Stages of one pass through the game loop, in the order they run
+LOOP_STAGES = ('events', 'keys', 'frame', 'hud', 'controls', 'display', 'idle')
+
+#What the timing overlay shows, averaged over the last second
+FrameStats = namedtuple('FrameStats', ['render_fps', 'camera_fps', 'frame_age_ms', 'rc_rate', 'dropped_frames'])
+
+
+class StageTimer:
+    """Records how long each stage of a frame took into a preallocated ring buffer.
+
+    Call begin() at the top of the frame, mark(stage) right after each stage and end() once the
+    frame is done; a mark measures the time since the previous one. Stages skipped in a frame
+    (e.g. the controls overlay while it is hidden) count as zero. When disabled every call
+    returns straight away, so the marks can stay in the loop.
+    """
+
+    def __init__(self, stages=LOOP_STAGES, capacity=4096, enabled=True):
+        self.stages = tuple(stages)
+        self.index = {stage: i for i, stage in enumerate(self.stages)}
+        self.capacity = capacity
+        self.samples = np.zeros((len(self.stages), capacity))  #Seconds, one column per frame
+        self.frames = 0
+        self.slot = 0
+        self.last = 0.0
+        self.enabled = enabled
+
+    def begin(self):
+        if not self.enabled:
+            return
+        self.slot = self.frames % self.capacity
+        self.samples[:, self.slot] = 0.0
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.samples[self.index[stage], self.slot] += now - self.last
+        self.last = now
+
+    def end(self):
+        if self.enabled:
+            self.frames += 1
+
+    def recorded(self):
+        """Samples of the frames still in the buffer, oldest first."""
+        count = min(self.frames, self.capacity)
+        if self.frames <= self.capacity:
+            return self.samples[:, :count]
+        start = self.frames % self.capacity
+        return np.concatenate((self.samples[:, start:], self.samples[:, :start]), axis=1)
+
+    def summary(self, percentiles=(50, 95, 99)):
+        """{stage: {'mean_ms', 'p50_ms', ...}} over the recorded frames, plus a 'busy' total
+        of every stage except idle."""
+        samples = self.recorded() * 1000
+        result = {}
+        if samples.shape[1] == 0:
+            return result
+        rows = list(zip(self.stages, samples))
+        if 'idle' in self.index:
+            rows.append(('busy', np.delete(samples, self.index['idle'], axis=0).sum(axis=0)))
+        else:
+            rows.append(('busy', samples.sum(axis=0)))
+        for stage, row in rows:
+            stats = {'mean_ms': float(row.mean())}
+            for p, value in zip(percentiles, np.percentile(row, percentiles)):
+                stats[f'p{p}_ms'] = float(value)
+            result[stage] = stats
+        return result
+
+    def write_json(self, path, **metadata):
+        with open(path, 'w') as file:
+            json.dump({'frames': min(self.frames, self.capacity), **metadata, 'stages': self.summary()},
+                      file, indent=2)
+
+
+class SpanRing:
+    """Fixed-size ring of (monotonic timestamp, value) samples for one hot path.
+
+    The arrays are allocated up front, so record() never allocates. Each ring has a single
+    writer thread; readers may see a sample being written, which only nudges the statistics.
+    While disabled, record() is a single attribute check.
+    """
+
+    def __init__(self, capacity=512, enabled=False):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity)
+        self.values = np.zeros(capacity)
+        self.count = 0
+        self.enabled = enabled
+
+    def record(self, value=0.0, timestamp=None):
+        if not self.enabled:
+            return
+        i = self.count % self.capacity
+        self.timestamps[i] = time.monotonic() if timestamp is None else timestamp
+        self.values[i] = value
+        self.count += 1
+
+    def recent(self, seconds=1.0):
+        """Mask of the samples recorded in the last `seconds`."""
+        return self.timestamps > time.monotonic() - seconds
+
+    def rate(self, seconds=1.0):
+        """Samples per second over the last `seconds`."""
+        return int(np.count_nonzero(self.recent(seconds))) / seconds
+
+    def mean(self, seconds=1.0):
+        """Mean value of the samples in the last `seconds`, 0 if there are none."""
+        recent = self.recent(seconds)
+        return float(self.values[recent].mean()) if recent.any() else 0.0
+
+
+class LatencyHistogram:
+    """Counts latencies in 1 ms bins up to max_ms; anything slower lands in the last bin."""
+
+    def __init__(self, max_ms=1000):
+        self.max_ms = max_ms
+        self.counts = np.zeros(max_ms + 1, dtype=np.int64)
+        self.total = 0.0
+
+    def add(self, seconds):
+        ms = seconds * 1000
+        self.counts[min(max(int(ms), 0), self.max_ms)] += 1
+        self.total += ms
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        """Upper edge in ms of the bin holding the p-th percentile."""
+        if not self.count:
+            return 0.0
+        return float(np.searchsorted(np.cumsum(self.counts), self.count * p / 100) + 1)
+
+
+class GlassToGlassProbe:
+    """Latency-measurement mode: histograms of how stale each displayed frame was.
+
+    decode_to_receive is the decoder storing a frame until CameraThread picks it up,
+    receive_to_display is from there until pygame.display.update() returned with the frame on
+    screen, and decode_to_display is the sum. Each frame is counted once, on its first display.
+    """
+
+    SERIES = ('decode_to_receive', 'receive_to_display', 'decode_to_display')
+
+    def __init__(self, max_ms=1000):
+        self.enabled = False
+        self.histograms = {name: LatencyHistogram(max_ms) for name in self.SERIES}
+        self.last_sequence = None
+
+    def displayed(self, frame, now=None):
+        """Call right after the display update that first showed frame."""
+        if not self.enabled or frame is None or frame.received is None or frame.sequence == self.last_sequence:
+            return
+        now = time.monotonic() if now is None else now
+        self.last_sequence = frame.sequence
+        self.histograms['decode_to_receive'].add(frame.received - frame.timestamp)
+        self.histograms['receive_to_display'].add(now - frame.received)
+        self.histograms['decode_to_display'].add(now - frame.timestamp)
+
+    def summary(self):
+        return {name: {'count': h.count, 'mean_ms': h.mean(), 'p50_ms': h.percentile(50),
+                       'p95_ms': h.percentile(95), 'p99_ms': h.percentile(99)}
+                for name, h in self.histograms.items()}
+
+    def write_csv(self, path):
+        """One row per 1 ms bin that has samples in any series."""
+        counts = np.stack([self.histograms[name].counts for name in self.SERIES])
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['bin_start_ms', 'bin_end_ms', *self.SERIES])
+            for ms in np.flatnonzero(counts.sum(axis=0)):
+                end = '' if ms == counts.shape[1] - 1 else ms + 1  #Last bin is open ended
+                writer.writerow([ms, end, *counts[:, ms]])
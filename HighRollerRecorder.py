@@ -0,0 +1,174 @@
+import os
+import queue
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from HighRollerFlightLog import (INDEX_ENTRY, INDEX_STRIDE, LOG_HEADER, LOG_MAGIC, LOG_RECORD, RECORD_FRAME,
+                                 RECORD_RC, RECORD_TELEMETRY, index_path, pack_record, video_path)
+from HighRollerFrameBus import Subscription
+
+FRAME_POLICIES = ('drop-oldest', 'drop-newest')
+
+
+class FlightRecorder:
+    """Writes the camera feed to a video file and telemetry plus RC commands to a binary log.
+
+    Producers only ever do a non-blocking put: frames arrive through `frames`, a Subscription to
+    add to CameraThread's FrameBus (or fed with offer_frame()), and TelemetryThread and
+    DroneMovementThread hand over their records through offer_telemetry() and offer_rc(). Encoding and disk writes happen on two background threads,
+    one for video and one for the log, so a slow encoder can't hold up the log either. The log
+    format and its time index are described in HighRollerFlightLog.
+
+    When the frame queue is full (the encoder or the disk can't keep up) frames are dropped by
+    frame_policy: 'drop-oldest' keeps the newest frames, 'drop-newest' keeps what is already
+    queued. Once the disk has less than min_free_bytes left no more video is written, but the
+    much smaller log keeps going. Every frame that made it into the video also gets a log record,
+    so the video can be lined up with the telemetry afterwards.
+    """
+
+    def __init__(self, directory='recordings', fps=30, frame_queue_size=30, frame_policy='drop-oldest',
+                 min_free_bytes=500 * 1024 * 1024, codec='mp4v'):
+        if frame_policy not in FRAME_POLICIES:
+            raise ValueError(f"frame_policy must be one of {FRAME_POLICIES}")
+        self.fps = fps
+        self.frame_policy = frame_policy
+        self.min_free_bytes = min_free_bytes
+        self.codec = codec
+
+        os.makedirs(directory, exist_ok=True)
+        self.log_path = os.path.join(directory, time.strftime("flight_%Y%m%d_%H%M%S.hrlog"))
+        self.video_path = video_path(self.log_path)
+        self.log = open(self.log_path, 'wb')
+        self.log.write(LOG_HEADER.pack(LOG_MAGIC, time.time(), time.monotonic()))
+        self.index = open(index_path(self.log_path), 'wb')
+        self.max_timestamp = float('-inf')  #Running maximum the time index is built from
+
+        self.frames = Subscription('recorder', frame_queue_size, frame_policy)
+        self.records = queue.Queue(4096)
+        self.writer = None
+        self.video_full = False  #Set once the disk ran low, no more video after that
+
+        #Counters, frames dropped are counted by self.frames
+        self.frames_written = 0
+        self.records_written = 0
+        self.records_dropped = 0
+
+        self.running = True
+        self.video_thread = threading.Thread(target=self.write_video, daemon=True)
+        self.log_thread = threading.Thread(target=self.write_log, daemon=True)
+        self.video_thread.start()
+        self.log_thread.start()
+
+    @property
+    def frames_dropped(self):
+        return self.frames.dropped
+
+    def offer_frame(self, frame):
+        """Queue a CameraFrame for the video without a FrameBus. Never blocks; returns False if a
+        frame was dropped."""
+        if not frame.image.flags.writeable:
+            #Borrowed from HighRollerDecoder's shared ring, which reuses the memory for later frames
+            frame = frame._replace(image=frame.image.copy())
+        return self.frames.put(frame)
+
+    def offer_record(self, record):
+        if self.running:
+            self.put_record(record)
+
+    def put_record(self, record):
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            self.records_dropped += 1
+
+    def offer_telemetry(self, snapshot):
+        self.offer_record(pack_record(RECORD_TELEMETRY, snapshot.timestamp, snapshot.battery,
+                                      snapshot.temperature, snapshot.height, snapshot.barometer,
+                                      snapshot.flight_time))
+
+    def offer_rc(self, command, sent):
+        """command is the RcCommand that went out at monotonic time sent."""
+        self.offer_record(pack_record(RECORD_RC, sent, *command.velocity, command.generation))
+
+    def disk_is_full(self):
+        try:
+            return shutil.disk_usage(os.path.dirname(os.path.abspath(self.video_path))).free < self.min_free_bytes
+        except OSError:
+            return False
+
+    def write_video(self):
+        bgr = None
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            import cv2  #Only loaded once there is video to write, not at startup
+            try:
+                if self.frames_written % self.fps == 0 and self.disk_is_full():
+                    print(f"Recorder: less than {self.min_free_bytes // (1024 * 1024)}MB free, video stopped")
+                    self.video_full = True
+                    self.frames.close()
+                    break
+                height, width = frame.image.shape[:2]
+                if self.writer is None:
+                    self.writer = cv2.VideoWriter(self.video_path, cv2.VideoWriter_fourcc(*self.codec),
+                                                  self.fps, (width, height))
+                    bgr = np.empty((height, width, 3), dtype=np.uint8)
+                if bgr.shape[:2] != (height, width):
+                    continue  #VideoWriter is fixed to the first frame's size
+                cv2.cvtColor(frame.image, cv2.COLOR_RGB2BGR, dst=bgr)
+                self.writer.write(bgr)
+                self.put_record(pack_record(RECORD_FRAME, frame.timestamp, frame.sequence, self.frames_written))
+                self.frames_written += 1
+            except Exception as e:
+                print(f"Error in recorder video thread: {e}")
+
+        #Anything still queued after a full disk is not written
+        self.frames.clear()
+
+    def write_log(self):
+        running = True
+        while running:
+            batch = [self.records.get()]
+            #Write everything that is already waiting in one go
+            while True:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = [record for record in batch if record is not None]
+            try:
+                entries = []
+                for record in batch:
+                    self.max_timestamp = max(self.max_timestamp, LOG_RECORD.unpack_from(record)[1])
+                    if self.records_written % INDEX_STRIDE == 0:
+                        entries.append(INDEX_ENTRY.pack(self.max_timestamp, self.records_written))
+                    self.records_written += 1
+                self.log.write(b''.join(batch))
+                self.log.flush()  #A crash should lose as little of the flight as possible
+                if entries:
+                    self.index.write(b''.join(entries))
+                    self.index.flush()
+            except Exception as e:
+                print(f"Error in recorder log thread: {e}")
+
+    def stop(self):
+        """Finish writing what is queued and close both files. Safe to call more than once."""
+        if not self.running:
+            return
+        self.running = False
+        self.frames.close()  #The video thread writes what is queued, then finishes
+        self.video_thread.join()
+        self.records.put(None)  #After the video thread, so its last frame records make it in
+        self.log_thread.join()
+        if self.writer is not None:
+            self.writer.release()
+        self.log.close()
+        self.index.close()
+        print(f"Recorded {self.frames_written} frames to {self.video_path} ({self.frames_dropped} dropped), "
+              f"{self.records_written} log records to {self.log_path}")
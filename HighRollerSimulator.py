@@ -0,0 +1,498 @@
+"""Headless stand-in for a Tello, for running the controllers and benchmarks without a drone.
+
+TelloSimulator speaks the Tello SDK over UDP: text commands and "ok" replies on the command
+port, state strings pushed to the state port and an H.264 stream of synthetic 960x720 frames
+pushed to the video port. The frames show an ArUco marker that sways from side to side in
+front of the drone and moves in the picture as the drone turns, climbs and flies towards it, so
+the vision stage and autopilot have something to find. Outgoing and incoming datagrams can be delayed and dropped to
+emulate a poor link.
+
+SimulatedTello is a djitellopy Tello that talks to it from the same host. djitellopy binds
+port 8889 for every Tello() in the process, so the real class cannot sit next to a simulator
+that listens on 8889 itself; SimulatedTello keeps all of Tello's commands and getters and only
+replaces the socket handling.
+
+Pick the backend for the controllers with the HIGHROLLER_DRONE environment variable
+("tello", "sim", or "replay" to play back the flight log named by HIGHROLLER_REPLAY), or run the simulator on its own for a Tello() on another machine:
+
+    python HighRollerSimulator.py --fps 30 --latency 0.02 --loss 0.01
+"""
+import argparse
+import heapq
+import math
+import os
+import queue
+import random
+import socket
+import threading
+import time
+from fractions import Fraction
+
+import numpy as np
+from djitellopy import Tello
+
+SIM_HOST = '127.0.0.1'
+VIDEO_CHUNK_SIZE = 1460  #The Tello splits its H.264 stream into datagrams of this size
+
+#The target marker in the synthetic video
+TARGET_MARKER_ID = 0  #In the 4x4_50 ArUco dictionary
+TARGET_SIZE = 40  #Side of the printed marker in cm
+TARGET_SWAY = 20  #Degrees the marker sways to either side of straight ahead
+TARGET_PERIOD = 16  #Seconds per sway
+CAMERA_FOV = 70  #Horizontal field of view of the camera in degrees
+
+
+class LossyLink:
+    """Sends datagrams after a fixed latency (plus jitter) and drops a fraction of them.
+
+    Drops are drawn from a seeded random generator so a run can be repeated.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, loss=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.pending = []
+        self.order = 0
+        self.sent = 0
+        self.dropped = 0
+        self.running = True
+        self.thread = None
+        if latency > 0 or jitter > 0:
+            self.thread = threading.Thread(target=self.update, daemon=True)
+            self.thread.start()
+
+    def lost(self):
+        """Decide whether the next datagram in either direction is dropped."""
+        with self.lock:
+            if self.loss > 0 and self.random.random() < self.loss:
+                self.dropped += 1
+                return True
+            return False
+
+    def send(self, sock, data, address):
+        if self.lost():
+            return
+        if self.thread is None:
+            self.transmit(sock, data, address)
+            return
+        with self.condition:
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+            self.order += 1
+            heapq.heappush(self.pending, (time.monotonic() + delay, self.order, sock, data, address))
+            self.condition.notify()
+
+    def transmit(self, sock, data, address):
+        try:
+            sock.sendto(data, address)
+            self.sent += 1
+        except OSError:
+            pass  #Receiver not up yet, same as a datagram lost on the air
+
+    def update(self):
+        while True:
+            with self.condition:
+                while self.running and (not self.pending or self.pending[0][0] > time.monotonic()):
+                    self.condition.wait(self.pending[0][0] - time.monotonic() if self.pending else None)
+                if not self.running:
+                    return
+                _, _, sock, data, address = heapq.heappop(self.pending)
+            self.transmit(sock, data, address)
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+
+
+class TelloSimulator:
+    """A fake Tello on local UDP ports with simple flight physics and a synthetic camera."""
+
+    def __init__(self, host=SIM_HOST, command_port=Tello.CONTROL_UDP_PORT, state_port=Tello.STATE_UDP_PORT,
+                 video_port=Tello.VS_UDP_PORT, fps=30, width=960, height=720, state_rate=10,
+                 latency=0.0, jitter=0.0, loss=0.0, seed=0, maneuver_time=1.0, target=True):
+        self.host = host
+        self.state_port = state_port
+        self.video_port = video_port
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.state_rate = state_rate
+        self.maneuver_time = maneuver_time  #Seconds takeoff, land and flips take before "ok"
+        self.link = LossyLink(latency, jitter, loss, seed)
+
+        self.command_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.command_socket.bind((host, command_port))
+        self.command_socket.settimeout(0.2)
+        self.send_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        #Simulated drone
+        self.lock = threading.Lock()
+        self.client_ip = None  #State and video go to whoever sent "command"
+        self.flying = False
+        self.streaming = False
+        self.rc = (0, 0, 0, 0)
+        self.height_cm = 0.0
+        self.yaw = 0.0
+        self.battery = 100.0
+        self.temperature = 60.0
+        self.flight_time = 0.0
+        self.target = target  #Whether the video shows the target marker
+        self.target_distance = 300.0  #cm from the drone
+        self.target_height = 100.0  #cm above the ground
+        self.marker = None  #Marker bitmap, made when the video starts
+        self.started_at = time.monotonic()
+        self.frames_sent = 0
+        self.commands_received = 0
+        self.rc_received = 0
+
+        self.running = True
+        self.threads = [threading.Thread(target=target, daemon=True)
+                        for target in (self.serve_commands, self.send_state, self.send_video)]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        for thread in self.threads:
+            thread.join()
+        self.link.stop()
+        self.command_socket.close()
+        self.send_socket.close()
+
+    def reply(self, text, address, delay=0.0):
+        if delay > 0:
+            threading.Timer(delay, self.reply, (text, address)).start()
+        else:
+            self.link.send(self.command_socket, text.encode('utf-8'), address)
+
+    def serve_commands(self):
+        while self.running:
+            try:
+                data, address = self.command_socket.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if self.link.lost():
+                continue
+            self.handle_command(data.decode('utf-8', 'replace').strip(), address)
+
+    def handle_command(self, command, address):
+        words = command.split()
+        if not words:
+            return
+        name = words[0]
+
+        with self.lock:
+            if name == 'rc':
+                #rc is fire and forget, the Tello never answers it
+                self.rc_received += 1
+                try:
+                    self.rc = tuple(max(-100, min(100, int(value))) for value in words[1:5])
+                except ValueError:
+                    pass
+                return
+
+            self.commands_received += 1
+            if name == 'command':
+                self.client_ip = address[0]
+                response, delay = 'ok', 0.0
+            elif name == 'takeoff':
+                self.flying = True
+                self.height_cm = max(self.height_cm, 80.0)
+                response, delay = 'ok', self.maneuver_time
+            elif name == 'land':
+                response, delay = ('ok', self.maneuver_time) if self.flying else ('error Not flying', 0.0)
+                self.flying = False
+                self.height_cm = 0.0
+                self.rc = (0, 0, 0, 0)
+            elif name == 'flip':
+                response, delay = ('ok', self.maneuver_time) if self.flying else ('error Not flying', 0.0)
+            elif name == 'streamon':
+                self.streaming = True
+                response, delay = 'ok', 0.0
+            elif name == 'streamoff':
+                self.streaming = False
+                response, delay = 'ok', 0.0
+            elif name == 'emergency':
+                self.flying = False
+                self.height_cm = 0.0
+                response, delay = 'ok', 0.0
+            elif name.endswith('?'):
+                response, delay = self.query(name), 0.0
+            else:
+                #keepalive, speed, moves, video settings...
+                response, delay = 'ok', 0.0
+        self.reply(response, address, delay)
+
+    def query(self, name):
+        values = {
+            'battery?': int(self.battery),
+            'height?': f"{int(self.height_cm / 10)}dm",
+            'time?': f"{int(self.flight_time)}s",
+            'temp?': f"{int(self.temperature)}~{int(self.temperature) + 2}C",
+            'baro?': round(self.height_cm / 100, 2),
+            'speed?': 100.0,
+            'wifi?': 90,
+            'sdk?': 30,
+            'sn?': 'SIMULATED0000',
+        }
+        return str(values.get(name, 'error'))
+
+    def state_string(self):
+        vx, vy, vz, yaw_rate = self.rc
+        temperature = int(self.temperature)
+        return (f"mid:-1;x:0;y:0;z:0;mpry:0,0,0;pitch:{vy // 10};roll:{vx // 10};yaw:{int(self.yaw)};"
+                f"vgx:{vy // 10};vgy:{vx // 10};vgz:{-vz // 10};templ:{temperature};temph:{temperature + 2};"
+                f"tof:{int(self.height_cm) + 10};h:{int(self.height_cm)};bat:{int(self.battery)};"
+                f"baro:{100 + self.height_cm / 100:.2f};time:{int(self.flight_time)};"
+                f"agx:0.00;agy:0.00;agz:-1000.00;\r\n")
+
+    def send_state(self):
+        interval = 1.0 / self.state_rate
+        next_time = time.monotonic()
+        while self.running:
+            next_time += interval
+            time.sleep(max(0.0, next_time - time.monotonic()))
+            with self.lock:
+                if self.flying:
+                    self.height_cm = max(20.0, self.height_cm + self.rc[2] * 0.5 * interval)
+                    self.yaw = (self.yaw + self.rc[3] * 0.9 * interval + 180) % 360 - 180
+                    self.target_distance = min(max(self.target_distance - self.rc[1] * 0.5 * interval, 50.0), 1000.0)
+                    self.flight_time += interval
+                    self.battery = max(0.0, self.battery - 0.1 * interval)
+                    self.temperature = min(90.0, self.temperature + 0.05 * interval)
+                else:
+                    self.battery = max(0.0, self.battery - 0.01 * interval)
+                client_ip = self.client_ip
+                state = self.state_string()
+            if client_ip is not None:
+                self.link.send(self.send_socket, state.encode('ASCII'), (client_ip, self.state_port))
+
+    def target_view(self, now=None):
+        """Where the target marker appears in the frame: centre x, y and side in pixels, or None
+        while it is behind the camera. Call with the lock held."""
+        now = time.monotonic() if now is None else now
+        bearing = TARGET_SWAY * math.sin(2 * math.pi * (now - self.started_at) / TARGET_PERIOD)
+        offset = (bearing - self.yaw + 180) % 360 - 180  #Degrees right of where the drone faces
+        if abs(offset) >= 80:
+            return None
+        focal = self.width / 2 / math.tan(math.radians(CAMERA_FOV / 2))
+        x = self.width / 2 + focal * math.tan(math.radians(offset))
+        y = self.height / 2 - focal * (self.target_height - self.height_cm) / self.target_distance
+        return x, y, focal * TARGET_SIZE / self.target_distance
+
+    def synthetic_frame(self, index, target=None):
+        """A moving gradient with a bright bar sweeping across, cheap to make and to encode, and
+        the marker at target (from target_view) if given."""
+        frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        frame[:, :, 0] = (np.arange(self.width, dtype=np.uint16) + index * 4).astype(np.uint8)
+        frame[:, :, 1] = (np.arange(self.height, dtype=np.uint16)[:, None] // 3).astype(np.uint8)
+        frame[:, :, 2] = 96
+        bar = (index * 8) % self.width
+        frame[:, bar:bar + 24] = 255
+        if target is not None and self.marker is not None:
+            x, y, size = target
+            #Nearest-neighbour scaled marker, with a white margin of a quarter of its size
+            side = max(int(size * 1.5), 1)
+            cells = (np.arange(side) * self.marker.shape[0] / side).astype(int)
+            patch = self.marker[cells[:, None], cells]
+            top, left = int(y - side / 2), int(x - side / 2)
+            rows = slice(max(top, 0), min(top + side, self.height))
+            cols = slice(max(left, 0), min(left + side, self.width))
+            if rows.start < rows.stop and cols.start < cols.stop:
+                frame[rows, cols] = patch[rows.start - top:rows.stop - top, cols.start - left:cols.stop - left, None]
+        return frame
+
+    def send_video(self):
+        import av  #Only needed once something asks for video
+
+        encoder = None
+        interval = 1.0 / self.fps
+        next_time = time.monotonic()
+        index = 0
+        while self.running:
+            next_time += interval
+            time.sleep(max(0.0, next_time - time.monotonic()))
+            with self.lock:
+                streaming = self.streaming
+                client_ip = self.client_ip
+            if not streaming or client_ip is None:
+                encoder = None  #Start with a fresh keyframe on the next streamon
+                next_time = time.monotonic()
+                continue
+
+            if self.target and self.marker is None:
+                import cv2  #Only to draw the marker
+
+                dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50)
+                marker = cv2.aruco.generateImageMarker(dictionary, TARGET_MARKER_ID, 96)
+                self.marker = np.pad(marker, 24, constant_values=255)
+
+            if encoder is None:
+                encoder = av.CodecContext.create('libx264', 'w')
+                encoder.width = self.width
+                encoder.height = self.height
+                encoder.pix_fmt = 'yuv420p'
+                encoder.time_base = Fraction(1, self.fps)
+                encoder.framerate = Fraction(self.fps, 1)
+                encoder.gop_size = self.fps
+                encoder.options = {'preset': 'ultrafast', 'tune': 'zerolatency'}
+
+            with self.lock:
+                target = self.target_view() if self.target else None
+            frame = av.VideoFrame.from_ndarray(self.synthetic_frame(index, target), format='rgb24')
+            frame.pts = index
+            index += 1
+            for packet in encoder.encode(frame):
+                data = bytes(packet)
+                for start in range(0, len(data), VIDEO_CHUNK_SIZE):
+                    self.link.send(self.send_socket, data[start:start + VIDEO_CHUNK_SIZE],
+                                   (client_ip, self.video_port))
+            self.frames_sent += 1
+
+
+class SimulatedTello(Tello):
+    """djitellopy Tello that talks to a TelloSimulator on this host over its own sockets."""
+
+    def __init__(self, host=SIM_HOST, command_port=Tello.CONTROL_UDP_PORT, state_port=Tello.STATE_UDP_PORT,
+                 retry_count=Tello.RETRY_COUNT, vs_udp=Tello.VS_UDP_PORT):
+        #Deliberately not calling Tello.__init__, which binds the shared port 8889 socket
+        self.address = (host, command_port)
+        self.stream_on = False
+        self.is_flying = False
+        self.retry_count = retry_count
+        self.last_received_command_timestamp = time.time()
+        self.last_rc_control_timestamp = time.time()
+        self.vs_udp_port = vs_udp
+        self.background_frame_read = None
+        self.state = {}
+        self.responses = queue.Queue()
+
+        self.command_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.command_socket.bind(('', 0))
+        self.command_socket.settimeout(0.2)
+        self.state_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.state_socket.bind(('', state_port))
+        self.state_socket.settimeout(0.2)
+
+        self.running = True
+        self.threads = [threading.Thread(target=self.receive_responses, daemon=True),
+                        threading.Thread(target=self.receive_state, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def receive_responses(self):
+        while self.running:
+            try:
+                data, _ = self.command_socket.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.responses.put(data)
+
+    def receive_state(self):
+        while self.running:
+            try:
+                data, _ = self.state_socket.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.state = Tello.parse_state(data.decode('ASCII'))  #New dict per packet, like Tello
+
+    def get_current_state(self):
+        return self.state
+
+    def send_command_with_return(self, command, timeout=Tello.RESPONSE_TIMEOUT):
+        #Drop replies that arrived after an earlier command gave up on them
+        while not self.responses.empty():
+            self.responses.get_nowait()
+
+        self.command_socket.sendto(command.encode('utf-8'), self.address)
+        try:
+            response = self.responses.get(timeout=timeout)
+        except queue.Empty:
+            return f"Aborting command '{command}'. Did not receive a response after {timeout} seconds"
+        self.last_received_command_timestamp = time.time()
+        return response.decode('utf-8', 'replace').rstrip("\r\n")
+
+    def send_command_without_return(self, command):
+        self.command_socket.sendto(command.encode('utf-8'), self.address)
+
+    def end(self):
+        if not getattr(self, 'running', False):
+            return
+        try:
+            if self.is_flying:
+                self.land()
+            if self.stream_on:
+                self.streamoff()
+        except Exception:
+            pass
+        if self.background_frame_read is not None:
+            self.background_frame_read.stop()
+        self.running = False
+        for thread in self.threads:
+            thread.join()
+        self.command_socket.close()
+        self.state_socket.close()
+
+
+def create_drone(backend=None, **simulator_options):
+    """Make the drone the controllers fly: a real Tello, a SimulatedTello with its own simulator,
+    or a ReplayTello playing back a recorded flight.
+
+    backend defaults to the HIGHROLLER_DRONE environment variable, then "tello". The simulator
+    is reachable as drone.simulator so it can be stopped or inspected. The replay backend reads
+    the log path from HIGHROLLER_REPLAY.
+    """
+    backend = backend or os.environ.get('HIGHROLLER_DRONE', 'tello')
+    if backend == 'tello':
+        return Tello()
+    if backend == 'sim':
+        simulator = TelloSimulator(**simulator_options).start()
+        drone = SimulatedTello()
+        drone.simulator = simulator
+        return drone
+    if backend == 'replay':
+        from HighRollerFlightLog import ReplayTello  #Imports the controller modules, so only when asked for
+        return ReplayTello(os.environ['HIGHROLLER_REPLAY'])
+    raise ValueError(f"Unknown drone backend: {backend}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a simulated Tello on local UDP ports.")
+    parser.add_argument('--host', default='0.0.0.0', help="address to take commands on")
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--state-rate', type=int, default=10, help="state packets per second")
+    parser.add_argument('--latency', type=float, default=0.0, help="one-way delay in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="extra random delay in seconds")
+    parser.add_argument('--loss', type=float, default=0.0, help="fraction of datagrams dropped")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    simulator = TelloSimulator(args.host, fps=args.fps, state_rate=args.state_rate, latency=args.latency,
+                               jitter=args.jitter, loss=args.loss, seed=args.seed).start()
+    print(f"Simulated Tello listening on {args.host}:{Tello.CONTROL_UDP_PORT}, Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,448 @@
+"""Ground-station streaming: watch the video and telemetry from another machine on the LAN.
+
+GroundStationServer serves, over plain HTTP:
+- /            a page showing the video, for a browser,
+- /video.mjpg  the camera feed as MJPEG (multipart/x-mixed-replace),
+- /telemetry   a binary stream of the telemetry the HUD shows plus the RC command.
+
+Each frame is scaled down and JPEG encoded once, and every viewer is sent the same bytes.
+Viewers never slow the controller down. A viewer that can't keep up skips to the newest frame,
+and when nobody is watching nothing is encoded at all.
+
+The telemetry stream is a sequence of messages: TELEMETRY_HEADER (a mask of the fields that
+follow, milliseconds since the server started), then one float32 per field in the mask, in
+TELEMETRY_FIELDS order, NaN for unknown. A viewer first gets every field, then only the fields
+that changed. Start the controller with HIGHROLLER_STREAM=<port> to serve, and check from any
+machine with the loopback client:
+
+    python HighRollerStreaming.py --connect 192.168.1.20:8090 --seconds 10
+"""
+import argparse
+import http.client
+import select
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from HighRollerFrameBus import Subscription
+from HighRollerVision import downscale
+
+TELEMETRY_FIELDS = ('battery', 'temperature', 'height', 'barometer', 'flight_time',
+                    'velocity_x', 'velocity_y', 'velocity_z', 'rotation_velocity')
+TELEMETRY_HEADER = struct.Struct('<HI')  #Field mask, milliseconds since the server started
+ALL_FIELDS = (1 << len(TELEMETRY_FIELDS)) - 1
+MJPEG_BOUNDARY = b'highroller-frame'
+
+PAGE = b"""<!DOCTYPE html>
+<html><head><title>HighRoller Ground Station</title></head>
+<body style="margin:0;background:#000"><img src="/video.mjpg" style="width:100%"></body></html>
+"""
+
+
+def pack_telemetry(mask, milliseconds, values):
+    """One telemetry message with the fields in mask, taken from values (all fields, in order)."""
+    chosen = [value for i, value in enumerate(values) if mask >> i & 1]
+    return TELEMETRY_HEADER.pack(mask, milliseconds) + struct.pack(f'<{len(chosen)}f', *chosen)
+
+
+class TelemetryDecoder:
+    """Client side of the telemetry stream: feed() it bytes as they arrive, read `values`."""
+
+    def __init__(self):
+        self.values = dict.fromkeys(TELEMETRY_FIELDS)
+        self.milliseconds = None
+        self.messages = 0
+        self.buffer = b''
+
+    def feed(self, data):
+        """Apply every complete message in data plus what was left over. Returns how many there were."""
+        buffer = self.buffer + data
+        offset = 0
+        count = 0
+        while len(buffer) - offset >= TELEMETRY_HEADER.size:
+            mask, milliseconds = TELEMETRY_HEADER.unpack_from(buffer, offset)
+            fields = [name for i, name in enumerate(TELEMETRY_FIELDS) if mask >> i & 1]
+            end = offset + TELEMETRY_HEADER.size + 4 * len(fields)
+            if len(buffer) < end:
+                break
+            values = struct.unpack_from(f'<{len(fields)}f', buffer, offset + TELEMETRY_HEADER.size)
+            self.values.update((name, None if np.isnan(value) else value) for name, value in zip(fields, values))
+            self.milliseconds = milliseconds
+            offset = end
+            count += 1
+        self.buffer = buffer[offset:]
+        self.messages += count
+        return count
+
+
+def viewer_gone(connection):
+    """Whether the viewer closed its end. Viewers send nothing after the request, so a socket with
+    something to read has reached EOF."""
+    readable, _, _ = select.select([connection], [], [], 0)
+    if not readable:
+        return False
+    try:
+        return not connection.recv(1, socket.MSG_PEEK)
+    except OSError:
+        return True
+
+
+class GroundStationHandler(BaseHTTPRequestHandler):
+    """One viewer connection. self.server.station is the GroundStationServer."""
+
+    def do_GET(self):
+        station = self.server.station
+        if self.path == '/':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(PAGE)))
+            self.end_headers()
+            self.wfile.write(PAGE)
+        elif self.path == '/video.mjpg':
+            self.send_response(200)
+            self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY.decode()}')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            self.connection.settimeout(station.VIEWER_TIMEOUT)
+            station.serve_video(self.wfile, self.connection)
+        elif self.path == '/telemetry':
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            self.connection.settimeout(station.VIEWER_TIMEOUT)
+            station.serve_telemetry(self.wfile)
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        pass  #A line per request would flood the controller's console
+
+
+class GroundStationServer:
+    """Serves the camera feed and telemetry to viewers on the LAN, see the module docstring.
+
+    bus is CameraThread's FrameBus. telemetry has a `snapshot` (TelemetryThread) and movement,
+    if given, a `command` (DroneMovementThread). While at least one video viewer is connected, a
+    latest-only subscription feeds the encoder thread. It encodes at most fps frames a second,
+    scaled to width pixels wide at JPEG quality. Telemetry is sampled telemetry_rate times a
+    second. Each viewer has its own thread from the HTTP server and only ever reads the shared
+    encoded frame and messages, so viewers can come and go at any time. A viewer that stops
+    reading is dropped after VIEWER_TIMEOUT seconds. port 0 picks a free port, see `port`.
+    Call clear_video() when the camera feed is paused, so nobody is shown the frame from before.
+    """
+
+    WAIT_TIMEOUT = 0.5  #Seconds between checks of the server state while nothing happens
+    VIEWER_TIMEOUT = 5.0  #Seconds a send to a viewer may block before the viewer is dropped
+    TELEMETRY_BACKLOG = 64  #Messages kept for viewers that fall behind, older ones get a full update
+
+    def __init__(self, bus, telemetry, movement=None, host='0.0.0.0', port=8090, fps=15, width=640,
+                 quality=70, telemetry_rate=10):
+        self.bus = bus
+        self.telemetry = telemetry
+        self.movement = movement
+        self.period = 1.0 / fps
+        self.width = width
+        self.quality = quality
+        self.telemetry_period = 1.0 / telemetry_rate
+        self.started = time.monotonic()
+
+        self.frames = Subscription('ground-station', 1, 'latest')  #On the bus while anyone watches
+        self.condition = threading.Condition()
+        self.jpeg = (None, b'')  #Sequence and bytes of the newest encoded frame
+        self.generation = 0  #Bumped whenever jpeg is cleared, so a frame encoded from before is dropped
+        self.telemetry_values = [float('nan')] * len(TELEMETRY_FIELDS)
+        self.telemetry_sequence = 0  #Messages sampled so far
+        self.telemetry_messages = deque(maxlen=self.TELEMETRY_BACKLOG)  #(sequence, message)
+
+        #Counters
+        self.video_viewers = 0
+        self.telemetry_viewers = 0
+        self.encoded = 0
+        self.video_bytes_sent = 0
+        self.telemetry_bytes_sent = 0
+
+        self.running = True
+        self.httpd = ThreadingHTTPServer((host, port), GroundStationHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.station = self
+        self.threads = [threading.Thread(target=target, daemon=True)
+                        for target in (self.httpd.serve_forever, self.encode, self.sample_telemetry)]
+        for thread in self.threads:
+            thread.start()
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def encode(self):
+        next_time = time.monotonic()
+        while self.running:
+            generation = self.generation
+            frame = self.frames.get(self.WAIT_TIMEOUT)
+            if frame is None:
+                continue
+            try:
+                image = cv2.cvtColor(downscale(frame.image, self.width), cv2.COLOR_RGB2BGR)
+                ok, data = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                if ok:
+                    with self.condition:
+                        if generation == self.generation:  #Otherwise it is from before the feed paused or everyone left
+                            self.jpeg = (frame.sequence, data.tobytes())
+                            self.condition.notify_all()
+                    self.encoded += 1
+            except Exception as e:
+                print(f"Error in ground station encoder: {e}")
+            #Sleeping here rather than before get() means the next frame is the newest one then
+            next_time = max(next_time + self.period, time.monotonic())
+            time.sleep(max(0.0, next_time - time.monotonic()))
+
+    def current_values(self):
+        snapshot = self.telemetry.snapshot
+        values = [snapshot.battery, snapshot.temperature, snapshot.height, snapshot.barometer, snapshot.flight_time]
+        values += list(self.movement.command.velocity) if self.movement is not None else [None] * 4
+        #Rounded to float32 here, so a value that didn't change never compares as changed
+        return np.array([float('nan') if value is None else value for value in values], dtype=np.float32)
+
+    def sample_telemetry(self):
+        last = np.full(len(TELEMETRY_FIELDS), np.nan, dtype=np.float32)
+        while self.running:
+            time.sleep(self.telemetry_period)
+            try:
+                values = self.current_values()
+                changed = ~((values == last) | (np.isnan(values) & np.isnan(last)))
+                if not changed.any():
+                    continue
+                mask = int(np.dot(changed, 1 << np.arange(len(TELEMETRY_FIELDS))))
+                message = pack_telemetry(mask, self.milliseconds(), values.tolist())
+                last = values
+                with self.condition:
+                    self.telemetry_values = values.tolist()
+                    self.telemetry_sequence += 1
+                    self.telemetry_messages.append((self.telemetry_sequence, message))
+                    self.condition.notify_all()
+            except Exception as e:
+                print(f"Error in ground station telemetry: {e}")
+
+    def milliseconds(self):
+        return int((time.monotonic() - self.started) * 1000) & 0xFFFFFFFF
+
+    def viewer_joined(self):
+        with self.condition:
+            self.video_viewers += 1
+            if self.video_viewers == 1:
+                self.bus.add(self.frames)
+            print(f"Ground station: video viewer connected ({self.video_viewers} watching)")
+
+    def viewer_left(self):
+        with self.condition:
+            self.video_viewers -= 1
+            if self.video_viewers == 0:
+                self.bus.remove(self.frames)
+                self.clear_video()  #Next viewer waits for a fresh frame
+            print(f"Ground station: video viewer disconnected ({self.video_viewers} watching)")
+
+    def clear_video(self):
+        """Forget the last encoded frame and any queued one, e.g. when the camera feed pauses.
+        Viewers get nothing until the next frame is encoded."""
+        with self.condition:
+            self.frames.clear()
+            self.jpeg = (None, b'')
+            self.generation += 1
+            self.condition.notify_all()
+
+    def serve_video(self, output, connection=None):
+        """Runs on the viewer's HTTP thread until it disconnects or the server stops. connection is
+        the viewer's socket, checked for a disconnect while there is nothing new to send."""
+        self.viewer_joined()
+        try:
+            sequence = None
+            while self.running:
+                with self.condition:
+                    self.condition.wait_for(lambda: not self.running or self.jpeg[0] != sequence, self.WAIT_TIMEOUT)
+                    fresh = self.jpeg[0] != sequence
+                    if fresh:
+                        sequence, data = self.jpeg
+                if not fresh:
+                    #Never send the same frame twice. Without writes a viewer that left goes unnoticed, so look.
+                    if connection is not None and viewer_gone(connection):
+                        break
+                    continue
+                if not self.running or sequence is None:
+                    continue
+                part = (b'--' + MJPEG_BOUNDARY + b'\r\nContent-Type: image/jpeg\r\nContent-Length: '
+                        + str(len(data)).encode() + b'\r\n\r\n')
+                output.write(part)
+                output.write(data)
+                output.write(b'\r\n')
+                self.video_bytes_sent += len(part) + len(data) + 2
+        except OSError:
+            pass  #Viewer went away or stopped reading
+        finally:
+            self.viewer_left()
+
+    def serve_telemetry(self, output):
+        """Runs on the viewer's HTTP thread: every field once, then the changes as they come."""
+        with self.condition:
+            self.telemetry_viewers += 1
+        try:
+            sent = None  #Sequence of the last message sent
+            while self.running:
+                with self.condition:
+                    if sent is not None:
+                        self.condition.wait_for(lambda: not self.running or self.telemetry_sequence != sent,
+                                                self.WAIT_TIMEOUT)
+                    oldest = self.telemetry_messages[0][0] if self.telemetry_messages else None
+                    if sent is None or oldest is None or oldest > sent + 1:
+                        #New viewer, or one that fell behind the backlog: everything as it is now
+                        messages = [pack_telemetry(ALL_FIELDS, self.milliseconds(), self.telemetry_values)]
+                    else:
+                        messages = [message for sequence, message in self.telemetry_messages if sequence > sent]
+                    sent = self.telemetry_sequence
+                if messages:
+                    data = b''.join(messages)
+                    output.write(data)
+                    self.telemetry_bytes_sent += len(data)
+        except OSError:
+            pass
+        finally:
+            with self.condition:
+                self.telemetry_viewers -= 1
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        self.bus.remove(self.frames)
+        self.frames.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for thread in self.threads:
+            thread.join()
+
+
+class GroundStationClient:
+    """Loopback or LAN viewer: reads both streams of a GroundStationServer on two threads.
+
+    `frames` counts the JPEG frames received and `jpeg` holds the newest one. `telemetry` is a
+    TelemetryDecoder with the newest values.
+    """
+
+    def __init__(self, host, port, video=True, telemetry=True, timeout=5.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.frames = 0
+        self.jpeg = None
+        self.video_bytes = 0
+        self.telemetry_bytes = 0
+        self.telemetry = TelemetryDecoder()
+        self.running = True
+        self.sockets = []
+        self.threads = []
+        if video:
+            self.threads.append(threading.Thread(target=self.read_video, daemon=True))
+        if telemetry:
+            self.threads.append(threading.Thread(target=self.read_telemetry, daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def open(self, path):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        connection.request('GET', path)
+        self.sockets.append(connection.sock)  #The response takes it over, see close()
+        response = connection.getresponse()
+        if response.status != 200:
+            raise ConnectionError(f"{path}: HTTP {response.status}")
+        return response
+
+    def read_video(self):
+        try:
+            response = self.open('/video.mjpg')
+            while self.running:
+                boundary = response.readline()
+                if not boundary:
+                    break
+                if boundary.strip() != b'--' + MJPEG_BOUNDARY:
+                    continue
+                length = 0
+                while True:
+                    line = response.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    name, _, value = line.partition(b':')
+                    if name.strip().lower() == b'content-length':
+                        length = int(value)
+                self.jpeg = response.read(length)
+                self.video_bytes += len(boundary) + length
+                self.frames += 1
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            if self.running:
+                print(f"Video stream ended: {e}")
+
+    def read_telemetry(self):
+        try:
+            response = self.open('/telemetry')
+            while self.running:
+                data = response.read1(4096)
+                if not data:
+                    break
+                self.telemetry_bytes += len(data)
+                self.telemetry.feed(data)
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            if self.running:
+                print(f"Telemetry stream ended: {e}")
+
+    def image(self):
+        """The newest frame decoded to RGB, or None."""
+        if self.jpeg is None:
+            return None
+        image = cv2.imdecode(np.frombuffer(self.jpeg, np.uint8), cv2.IMREAD_COLOR)
+        return None if image is None else cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    def close(self):
+        self.running = False
+        for connection_socket in self.sockets:
+            try:
+                #Shut down rather than closed: the reader threads' responses still hold the socket,
+                #so closing it wouldn't tell the server, or wake them, until their reads time out
+                connection_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for thread in self.threads:
+            thread.join(1.0)
+        for connection_socket in self.sockets:
+            connection_socket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch a HighRoller ground station stream and print what arrives.")
+    parser.add_argument('--connect', default='127.0.0.1:8090', help="host:port of the controller")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args()
+
+    host, _, port = args.connect.rpartition(':')
+    client = GroundStationClient(host, int(port))
+    try:
+        for _ in range(int(args.seconds)):
+            time.sleep(1)
+            image = client.image()
+            size = f"{image.shape[1]}x{image.shape[0]}" if image is not None else "no video"
+            values = ', '.join(f"{name} {value:g}" for name, value in client.telemetry.values.items()
+                               if value is not None)
+            print(f"{client.frames} frames ({size}), {client.video_bytes // 1024} kB video, "
+                  f"{client.telemetry_bytes} B telemetry: {values}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
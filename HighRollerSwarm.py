@@ -0,0 +1,389 @@
+"""Swarm mode: flies several Tellos from one process over a single asyncio UDP transport.
+
+One command socket talks to every drone and replies are routed back by the address they came
+from. State packets and video arrive on one socket per local port and are routed by the drone's
+IP. Tellos in station mode all send to ports 8890 and 11111 of the host that sent them
+"command", so a real swarm shares those ports. Drones on the same IP, like local simulators,
+need ports of their own. Everything runs on one event loop. Video is decoded on a thread pool
+the size of the machine, not one thread per drone, and straight to the size of its tile.
+
+The keys and gamepad work as in the single drone controller. Number keys pick the drone the keys fly,
+and 0 flies all of them together:
+
+    python HighRollerSwarm.py 192.168.10.21 192.168.10.22 192.168.10.23
+    python HighRollerSwarm.py --sim 4
+"""
+import argparse
+import asyncio
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import av
+import pygame
+from djitellopy import Tello
+
+from HighRollerCamera import CameraFrame
+from HighRollerDisplay import FramePipeline, TextCache
+from HighRollerHud import GREEN, WHITE
+from HighRollerInput import ControlInput
+from HighRollerTelemetry import EMPTY_SNAPSHOT, TelemetrySnapshot
+
+SCREEN_WIDTH = 1280
+SCREEN_HEIGHT = 720
+FPS = 30
+
+
+class SwarmDrone:
+    """One drone of a swarm: where to reach it, and the latest snapshot, frame and RC vector."""
+
+    def __init__(self, name, host, command_port=Tello.CONTROL_UDP_PORT, state_port=Tello.STATE_UDP_PORT,
+                 video_port=Tello.VS_UDP_PORT):
+        self.name = name
+        self.address = (host, command_port)
+        self.state_port = state_port
+        self.video_port = video_port
+        self.snapshot = EMPTY_SNAPSHOT
+        self.frame = None  #Newest CameraFrame, already tile sized
+        self.frame_ready = None  #asyncio.Condition notified for every new frame
+        self.flying = False
+        self.rc = (0, 0, 0, 0)
+        self.rc_sent = None
+        self.rc_time = 0.0
+        self.reply = None  #Future for the reply to the command in flight
+        self.lock = None  #asyncio.Lock serialising commands, made on the transport's loop
+        self.codec = None
+        self.chunks = []  #Video datagrams not decoded yet
+        self.video_ready = None  #asyncio.Event set when chunks arrive
+
+        #Counters
+        self.states_received = 0
+        self.frames_decoded = 0
+        self.rc_packets = 0
+
+
+class DatagramRouter(asyncio.DatagramProtocol):
+    """Hands every datagram on one local port to the drone that sent it.
+
+    Drones are matched by (ip, port), then by ip; if only one drone uses the port it gets
+    everything, whatever the source port of its datagrams.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.by_address = {}
+        self.by_host = {}
+        self.drones = []
+
+    def add(self, drone):
+        self.by_address[drone.address] = drone
+        self.by_host[drone.address[0]] = drone
+        self.drones.append(drone)
+
+    def datagram_received(self, data, address):
+        drone = self.by_address.get(address) or self.by_host.get(address[0])
+        if drone is None and len(self.drones) == 1:
+            drone = self.drones[0]
+        if drone is not None:
+            self.handler(drone, data)
+
+
+class SwarmTransport:
+    """Commands, state, RC and video for a list of SwarmDrones, on the running event loop.
+
+    RC vectors set with set_rc() go out from one scheduled task: right away (within rc_interval)
+    when they change, and every keepalive_interval otherwise, like DroneMovementThread.
+    """
+
+    def __init__(self, drones, tile_size=(320, 240), rc_interval=0.02, keepalive_interval=0.5, decode_workers=None):
+        self.drones = drones
+        self.tile_size = tile_size
+        self.rc_interval = rc_interval
+        self.keepalive_interval = keepalive_interval
+        self.executor = ThreadPoolExecutor(decode_workers or min(len(drones), os.cpu_count() or 1))
+        self.command_transport = None
+        self.transports = []
+        self.tasks = []
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        commands = DatagramRouter(self.on_reply)
+        self.command_transport, _ = await loop.create_datagram_endpoint(lambda: commands, local_addr=('0.0.0.0', 0))
+        self.transports.append(self.command_transport)
+
+        routers = {}
+        for drone in self.drones:
+            drone.lock = asyncio.Lock()
+            drone.video_ready = asyncio.Event()
+            drone.frame_ready = asyncio.Condition()
+            commands.add(drone)
+            for port, handler in ((drone.state_port, self.on_state), (drone.video_port, self.on_video)):
+                if port not in routers:
+                    routers[port] = DatagramRouter(handler)
+                routers[port].add(drone)
+        for port, router in routers.items():
+            transport, _ = await loop.create_datagram_endpoint(lambda router=router: router, local_addr=('0.0.0.0', port))
+            self.transports.append(transport)
+
+        self.tasks.append(asyncio.create_task(self.send_rc()))
+        self.tasks.extend(asyncio.create_task(self.decode_video(drone)) for drone in self.drones)
+        return self
+
+    def on_reply(self, drone, data):
+        if drone.reply is not None and not drone.reply.done():
+            drone.reply.set_result(data.decode('utf-8', 'replace').rstrip("\r\n"))
+
+    def on_state(self, drone, data):
+        state = Tello.parse_state(data.decode('ASCII', 'replace'))
+        drone.snapshot = TelemetrySnapshot.from_state(state, time.monotonic())
+        drone.states_received += 1
+
+    def on_video(self, drone, data):
+        drone.chunks.append(data)
+        drone.video_ready.set()
+
+    async def command(self, drone, command, timeout=Tello.RESPONSE_TIMEOUT):
+        """Send a command and wait for its reply. Commands to the same drone go one at a time."""
+        async with drone.lock:
+            drone.reply = asyncio.get_running_loop().create_future()
+            self.command_transport.sendto(command.encode('utf-8'), drone.address)
+            try:
+                return await asyncio.wait_for(drone.reply, timeout)
+            except asyncio.TimeoutError:
+                return f"Aborting command '{command}'. Did not receive a response after {timeout} seconds"
+            finally:
+                drone.reply = None
+
+    async def broadcast(self, command, timeout=Tello.RESPONSE_TIMEOUT, drones=None):
+        """Send a command to every drone (or the given ones) at once and return their replies."""
+        drones = self.drones if drones is None else drones
+        return await asyncio.gather(*(self.command(drone, command, timeout) for drone in drones))
+
+    def set_rc(self, drone, velocity_x, velocity_y, velocity_z, rotation_velocity):
+        drone.rc = (velocity_x, velocity_y, velocity_z, rotation_velocity)
+
+    def send_rc_now(self, drone):
+        """Send the drone's RC vector right away instead of on the next tick, e.g. a final stop."""
+        self.command_transport.sendto(('rc %d %d %d %d' % drone.rc).encode('utf-8'), drone.address)
+        drone.rc_sent = drone.rc
+        drone.rc_time = time.monotonic()
+        drone.rc_packets += 1
+
+    async def send_rc(self):
+        while True:
+            now = time.monotonic()
+            for drone in self.drones:
+                if drone.rc != drone.rc_sent or now - drone.rc_time >= self.keepalive_interval:
+                    self.send_rc_now(drone)
+            await asyncio.sleep(self.rc_interval)
+
+    async def next_frame(self, drone, last_sequence=None, timeout=None):
+        """Wait for a frame other than last_sequence and return it, or None after timeout seconds."""
+        async with drone.frame_ready:
+            try:
+                await asyncio.wait_for(drone.frame_ready.wait_for(
+                    lambda: drone.frame is not None and drone.frame.sequence != last_sequence), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return drone.frame
+
+    async def decode_video(self, drone):
+        loop = asyncio.get_running_loop()
+        sequence = 0
+        while True:
+            await drone.video_ready.wait()
+            drone.video_ready.clear()
+            data = b''.join(drone.chunks)
+            drone.chunks.clear()
+            decoded = await loop.run_in_executor(self.executor, self.decode, drone, data)
+            if decoded is not None:
+                sequence += 1
+                drone.frame = CameraFrame(sequence, decoded[0], decoded[1])
+                async with drone.frame_ready:
+                    drone.frame_ready.notify_all()
+
+    def decode(self, drone, data):
+        """On the decode pool: feed the drone's decoder and convert only the newest frame it produced."""
+        if drone.codec is None:
+            drone.codec = av.CodecContext.create('h264', 'r')
+        latest = None
+        for packet in drone.codec.parse(data):
+            try:
+                frames = drone.codec.decode(packet)
+            except av.error.FFmpegError:
+                continue  #Nothing decodes until the first keyframe
+            drone.frames_decoded += len(frames)
+            if frames:
+                latest = frames[-1]
+        if latest is None:
+            return None
+        timestamp = time.monotonic()
+        return timestamp, latest.to_ndarray(width=self.tile_size[0], height=self.tile_size[1], format='rgb24')
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        for transport in self.transports:
+            transport.close()
+        self.executor.shutdown(wait=True)
+
+
+def tile_grid(count, screen_size):
+    """(columns, rows, tile size) of the most square grid that fits count tiles on the screen."""
+    columns = math.ceil(math.sqrt(count))
+    rows = math.ceil(count / columns)
+    return columns, rows, (screen_size[0] // columns, screen_size[1] // rows)
+
+
+class SwarmView:
+    """Draws every drone's video as one tile of a grid, with its name and telemetry on top."""
+
+    def __init__(self, screen, drones, font, text_cache=None):
+        self.screen = screen
+        self.drones = drones
+        self.font = font
+        self.text_cache = text_cache if text_cache is not None else TextCache()
+        self.columns, self.rows, self.tile_size = tile_grid(len(drones), screen.get_size())
+        self.pipelines = [FramePipeline(*self.tile_size) for _ in drones]
+
+    def tile_rect(self, index):
+        width, height = self.tile_size
+        return pygame.Rect((index % self.columns) * width, (index // self.columns) * height, width, height)
+
+    def text(self, text, color=WHITE):
+        return self.text_cache.render(self.font, text, color)
+
+    def draw(self, selected=None):
+        """selected is the index of the drone the keys fly, or None for all of them."""
+        for index, (drone, pipeline) in enumerate(zip(self.drones, self.pipelines)):
+            rect = self.tile_rect(index)
+            frame = drone.frame
+            if frame is not None:
+                pipeline.blit(self.screen, frame.image, frame.sequence, rect.topleft)
+            else:
+                self.screen.fill((0, 0, 0), rect)
+
+            snapshot = drone.snapshot
+            battery = "NA" if snapshot.battery is None else f"{snapshot.battery}%"
+            height = "NA" if snapshot.height is None else f"{snapshot.height}cm"
+            active = selected is None or selected == index
+            color = GREEN if active else WHITE
+            self.screen.blit(self.text(f"{index + 1} {drone.name}", color), (rect.x + 8, rect.y + 8))
+            self.screen.blit(self.text(f"Battery: {battery}  Height: {height}"), (rect.x + 8, rect.y + 30))
+            pygame.draw.rect(self.screen, color, rect, 2 if active else 1)
+
+
+def simulator_ports(index):
+    """Ports of the index-th local simulator; they all share 127.0.0.1, so each needs its own."""
+    return dict(command_port=20000 + index, state_port=21000 + index, video_port=22000 + index)
+
+
+def simulator_drones(count):
+    return [SwarmDrone(f"sim{i + 1}", '127.0.0.1', **simulator_ports(i)) for i in range(count)]
+
+
+def start_simulators(count, width=480, height=360):
+    """count TelloSimulators on 127.0.0.1 at simulator_ports(). Smaller than a Tello's 960x720 by
+    default so encoding several streams doesn't take over the machine."""
+    from HighRollerSimulator import TelloSimulator
+
+    return [TelloSimulator(width=width, height=height, **simulator_ports(i)).start() for i in range(count)]
+
+
+async def fly(drones):
+    """The swarm controller: the pygame loop runs as a task on the transport's event loop."""
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("HighRoller Swarm")
+    view = SwarmView(screen, drones, pygame.font.Font(None, 25))
+    transport = await SwarmTransport(drones, view.tile_size).start()
+    commands = set()  #Takeoff and landing tasks, so the loop keeps rendering while they run
+    control_input = ControlInput()
+
+    def submit(command, drone, timeout=20):
+        async def run():
+            response = await transport.command(drone, command, timeout)
+            if 'ok' not in response.lower():
+                print(f"{drone.name}: {command} failed: {response}")
+                return
+            drone.flying = command == 'takeoff'
+        task = asyncio.create_task(run())
+        commands.add(task)
+        task.add_done_callback(commands.discard)
+
+    try:
+        for drone, response in zip(drones, await transport.broadcast('command')):
+            print(f"{drone.name}: {response}")
+        await transport.broadcast('streamon')
+
+        selected = None
+        next_frame = time.monotonic()
+        running = True
+        while running:
+            for event in pygame.event.get():
+                control_input.handle_event(event)
+                if event.type == pygame.QUIT:
+                    running = False
+                if event.type == pygame.KEYDOWN:
+                    if pygame.K_1 <= event.key <= pygame.K_9 and event.key - pygame.K_1 < len(drones):
+                        selected = event.key - pygame.K_1
+                        control_input.reset()  #The newly picked drone starts from hovering
+                    if event.key == pygame.K_0:
+                        selected = None
+                        control_input.reset()
+                    targets = drones if selected is None else [drones[selected]]
+                    if event.key == pygame.K_SPACE:
+                        for drone in targets:
+                            if not drone.flying:
+                                submit('takeoff', drone)
+                    if event.key == pygame.K_l:
+                        for drone in targets:
+                            if drone.flying:
+                                submit('land', drone)
+
+            velocity = control_input.update(pygame.key.get_pressed())
+            for index, drone in enumerate(drones):
+                transport.set_rc(drone, *(velocity if selected in (None, index) else (0, 0, 0, 0)))
+
+            view.draw(selected)
+            pygame.display.flip()
+
+            next_frame = max(next_frame + 1 / FPS, time.monotonic())
+            await asyncio.sleep(next_frame - time.monotonic())
+    finally:
+        for drone in drones:
+            transport.set_rc(drone, 0, 0, 0, 0)
+        await asyncio.gather(*commands, return_exceptions=True)
+        await transport.broadcast('land', 20, [drone for drone in drones if drone.flying])
+        await transport.broadcast('streamoff')
+        await transport.close()
+        pygame.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fly several Tellos from one window.")
+    parser.add_argument('hosts', nargs='*', help="IP addresses of Tellos in station mode")
+    parser.add_argument('--sim', type=int, default=0, help="fly this many local simulators instead")
+    args = parser.parse_args()
+
+    simulators = []
+    if args.sim:
+        simulators = start_simulators(args.sim)
+        drones = simulator_drones(args.sim)
+    else:
+        drones = [SwarmDrone(host, host) for host in args.hosts]
+    if not drones:
+        parser.error("give the Tellos' addresses or --sim N")
+    try:
+        asyncio.run(fly(drones))
+    except KeyboardInterrupt:
+        print("Force Quiting Program due to interupt...")
+    finally:
+        for simulator in simulators:
+            simulator.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import namedtuple
+
+
+class TelemetrySnapshot(namedtuple('TelemetrySnapshot',
+                                   ['timestamp', 'battery', 'temperature', 'height', 'barometer', 'flight_time'])):
+    """Immutable copy of one Tello state packet, in the units the HUD shows.
+
+    Fields the packet did not contain are None. timestamp is time.monotonic() when the packet
+    was picked up.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_state(cls, state, timestamp):
+        #Same conversions djitellopy's get_temperature() and get_barometer() apply
+        if 'templ' in state and 'temph' in state:
+            temperature = (state['templ'] + state['temph']) / 2
+        else:
+            temperature = None
+        barometer = state['baro'] * 100 if 'baro' in state else None
+        return cls(timestamp, state.get('bat'), temperature, state.get('h'), barometer, state.get('time'))
+
+
+#What the HUD shows before the first state packet arrives
+EMPTY_SNAPSHOT = TelemetrySnapshot(0.0, None, None, None, None, None)
+
+
+class TelemetryThread:
+    """Turns each Tello state packet into one TelemetrySnapshot.
+
+    djitellopy's state receiver replaces the drone's state dict wholesale for every packet, so a
+    change of dict identity means a new packet. Readers just take `self.snapshot`; it is swapped
+    as a single reference and never modified.
+    """
+
+    POLL_INTERVAL = 0.02  #Seconds, the Tello sends state packets roughly every 100 ms
+
+    def __init__(self, drone):
+        self.drone = drone
+        self.snapshot = EMPTY_SNAPSHOT
+        self.recorder = None  #Gets every snapshot through offer_telemetry(), see HighRollerRecorder
+        self.running = True
+        self.thread = threading.Thread(target=self.update, daemon=True)
+        self.thread.start()
+
+    def update(self):
+        last_state = None
+        while self.running:
+            try:
+                state = self.drone.get_current_state()
+                if state and state is not last_state:
+                    last_state = state
+                    self.snapshot = TelemetrySnapshot.from_state(state, time.monotonic())
+                    if self.recorder is not None:
+                        self.recorder.offer_telemetry(self.snapshot)
+            except Exception as e:
+                print(f"Error in telemetry thread: {e}")
+            time.sleep(self.POLL_INTERVAL)
+
+    def get_snapshot(self):
+        return self.snapshot
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
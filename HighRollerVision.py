@@ -0,0 +1,232 @@
+"""Object detection on the video feed, off the render thread.
+
+A VisionStage runs a detector over the newest CameraFrame on a small worker pool and publishes
+Detections tagged with the frame they came from; the renderer asks boxes_at() for the frame it
+is showing. A detector is any callable that takes a downscaled RGB image and returns Detections
+with coordinates in fractions of the image, so they fit the video at any size. Two come with it:
+
+- "markers": ArUco markers from the 4x4_50 dictionary, the kind the simulator shows,
+- "faces": OpenCV's frontal face Haar cascade, on OpenCV builds that still ship it.
+"""
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from HighRollerFrameBus import Subscription
+from HighRollerProfiling import SpanRing
+
+#One detected object. x, y, width and height are fractions of the frame, score is in [0, 1].
+Detection = namedtuple('Detection', ['label', 'x', 'y', 'width', 'height', 'score'])
+
+#Detections for one CameraFrame: its sequence and decode timestamp, and seconds from decode to publish
+DetectionResult = namedtuple('DetectionResult', ['sequence', 'timestamp', 'detections', 'latency'])
+
+
+class MarkerDetector:
+    """ArUco markers, labelled "marker <id>"."""
+
+    def __init__(self, dictionary=cv2.aruco.DICT_4X4_50):
+        self.detector = cv2.aruco.ArucoDetector(cv2.aruco.getPredefinedDictionary(dictionary),
+                                                cv2.aruco.DetectorParameters())
+
+    def __call__(self, image):
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        corners, ids, _ = self.detector.detectMarkers(gray)
+        if ids is None:
+            return []
+        height, width = gray.shape
+        detections = []
+        for quad, marker_id in zip(corners, ids.ravel().tolist()):
+            (left, top), (right, bottom) = quad[0].min(axis=0), quad[0].max(axis=0)
+            detections.append(Detection(f"marker {marker_id}", float(left / width), float(top / height),
+                                        float((right - left) / width), float((bottom - top) / height), 1.0))
+        return detections
+
+
+class FaceDetector:
+    """Frontal faces with a Haar cascade. Raises RuntimeError if this OpenCV build has none."""
+
+    def __init__(self, cascade='haarcascade_frontalface_default.xml', min_neighbors=5):
+        data = getattr(cv2, 'data', None)
+        if not hasattr(cv2, 'CascadeClassifier') or data is None:
+            raise RuntimeError("this OpenCV build has no Haar cascades")
+        self.classifier = cv2.CascadeClassifier(os.path.join(data.haarcascades, cascade))
+        if self.classifier.empty():
+            raise RuntimeError(f"could not load {cascade}")
+        self.min_neighbors = min_neighbors
+
+    def __call__(self, image):
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        height, width = gray.shape
+        faces = self.classifier.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=self.min_neighbors)
+        return [Detection("face", x / width, y / height, w / width, h / height, 1.0)
+                for x, y, w, h in np.asarray(faces).reshape(-1, 4).tolist()]
+
+
+#Detectors by name, for picking one in the controllers
+DETECTORS = {
+    'markers': MarkerDetector,
+    'faces': FaceDetector,
+}
+
+
+def downscale(image, width):
+    """image scaled down to at most width pixels wide for detecting on, always as a copy, so it
+    may come from a decoder ring slot that gets reused. Narrower images are copied as they are."""
+    height, image_width = image.shape[:2]
+    if image_width <= width:
+        return image.copy()
+    size = (width, max(1, round(height * width / image_width)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def box_overlaps(a, b):
+    """Intersection over union of every box in a (n, 4) with every box in b (m, 4), as an
+    (n, m) array. Boxes are x, y, width, height."""
+    left = np.maximum(a[:, None, 0], b[None, :, 0])
+    top = np.maximum(a[:, None, 1], b[None, :, 1])
+    right = np.minimum(a[:, None, 0] + a[:, None, 2], b[None, :, 0] + b[None, :, 2])
+    bottom = np.minimum(a[:, None, 1] + a[:, None, 3], b[None, :, 1] + b[None, :, 3])
+    intersection = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - intersection
+    return intersection / np.maximum(union, 1e-9)
+
+
+class VisionStage:
+    """Runs a detector over the newest camera frame on a worker pool, so the render loop never waits.
+
+    A dispatcher thread takes a free worker, then the newest frame from a latest-only subscription
+    to the camera's FrameBus and hands it over. Frames that arrive while every worker is busy are
+    skipped, never queued, so a result is at most one detector run behind the feed. Workers see a copy downscaled to `width`
+    pixels wide and each has its own detector, made by calling `detector` (a Detector class or
+    any factory) up front so a detector that can't run fails here and not on a worker.
+
+    `results` holds the two newest DetectionResults by frame sequence. boxes_at() moves the newest
+    boxes along the way they moved between those two, for the frame on screen. start() and
+    pause() switch detection on and off, stop() ends the threads.
+    """
+
+    WAIT_TIMEOUT = 0.5  #Seconds between checks of the stage state while no frames arrive
+    MATCH_OVERLAP = 0.1  #Least intersection over union for a box to count as the same object
+    MAX_EXTRAPOLATION = 2.0  #Result intervals boxes_at() may project ahead of the newest result
+    MAX_AGE = 1.0  #Seconds after which a result is too old to draw
+
+    def __init__(self, camera, detector=MarkerDetector, workers=2, width=320):
+        self.camera = camera
+        self.width = width
+        self.detectors = queue.SimpleQueue()
+        for _ in range(workers):
+            self.detectors.put(detector())
+        self.slots = threading.Semaphore(workers)
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='vision')
+        self.lock = threading.Lock()
+        self.results = (None, None)  #Previous and newest DetectionResult
+        self.frames = Subscription('vision', 1, 'latest')  #On the camera's bus while active
+        self.processed = 0
+        self.spans = SpanRing()  #One sample per result: seconds from decode to publish
+        self.active = threading.Event()
+        self.running = True
+        self.thread = threading.Thread(target=self.update, daemon=True)
+
+    @property
+    def skipped(self):
+        """Camera frames that went by while every worker was busy."""
+        return self.frames.dropped
+
+    def is_active(self):
+        return self.active.is_set()
+
+    def start(self):
+        self.camera.bus.add(self.frames)
+        self.active.set()
+        if self.thread.ident is None:
+            self.thread.start()
+
+    def pause(self):
+        self.active.clear()
+        self.camera.bus.remove(self.frames)
+        self.frames.clear()
+        with self.lock:
+            self.results = (None, None)  #Boxes from before the pause would be stale on resume
+
+    def update(self):
+        while self.running:
+            if not self.active.wait(self.WAIT_TIMEOUT) or not self.slots.acquire(timeout=self.WAIT_TIMEOUT):
+                continue
+            frame = self.frames.get(self.WAIT_TIMEOUT)
+            if frame is None or not self.active.is_set() or not self.running:
+                self.slots.release()
+                continue
+            self.executor.submit(self.detect, frame)
+
+    def detect(self, frame):
+        """Worker side: detect on a downscaled copy of frame and publish the result if it is the newest."""
+        detector = self.detectors.get()
+        try:
+            detections = tuple(detector(downscale(frame.image, self.width)))
+            published = time.monotonic()
+            result = DetectionResult(frame.sequence, frame.timestamp, detections, published - frame.timestamp)
+            with self.lock:
+                if self.active.is_set():
+                    previous, newest = self.results
+                    if newest is None:
+                        self.results = (None, result)
+                    elif result.sequence > newest.sequence:
+                        self.results = (newest, result)
+                    elif previous is None or result.sequence > previous.sequence:
+                        self.results = (result, newest)  #A slower worker finished an older frame
+                self.processed += 1
+                self.spans.record(result.latency, published)
+        except Exception as e:
+            print(f"Error in vision stage: {e}")
+        finally:
+            self.detectors.put(detector)
+            self.slots.release()
+
+    def latest(self):
+        """The newest DetectionResult, or None."""
+        return self.results[1]
+
+    def boxes_at(self, timestamp):
+        """Detections for the frame decoded at timestamp (monotonic seconds).
+
+        Each box of the newest result that overlaps a box with the same label in the previous
+        result is placed along the line between the two, by where timestamp falls relative to
+        their frames: between them for an older frame, ahead of the newest for a newer one, up
+        to MAX_EXTRAPOLATION intervals. Unmatched boxes stay where they were found.
+        """
+        previous, newest = self.results
+        if newest is None or timestamp - newest.timestamp > self.MAX_AGE:
+            return ()
+        if previous is None or not previous.detections or not newest.detections \
+                or newest.timestamp <= previous.timestamp:
+            return newest.detections
+
+        alpha = (timestamp - previous.timestamp) / (newest.timestamp - previous.timestamp)
+        alpha = min(max(alpha, 0.0), self.MAX_EXTRAPOLATION)
+        before = np.array([detection[1:5] for detection in previous.detections])
+        after = np.array([detection[1:5] for detection in newest.detections])
+        same_label = np.array([[a.label == b.label for b in previous.detections] for a in newest.detections])
+        overlaps = np.where(same_label, box_overlaps(after, before), 0.0)
+        match = overlaps.argmax(axis=1)
+        matched = overlaps[np.arange(len(after)), match] >= self.MATCH_OVERLAP
+        moved = before[match] + (after - before[match]) * alpha
+        boxes = np.where(matched[:, None], moved, after)
+        return tuple(detection._replace(x=x, y=y, width=w, height=h)
+                     for detection, (x, y, w, h) in zip(newest.detections, boxes.tolist()))
+
+    def stop(self):
+        """End the dispatcher and the workers. Safe to call more than once."""
+        self.running = False
+        self.active.clear()
+        self.camera.bus.remove(self.frames)
+        self.frames.close()
+        if self.thread.ident is not None:
+            self.thread.join()
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,141 @@
+"""How fast and how safely the follow-target autopilot closes the loop, on the simulator.
+
+Flies a simulated Tello with the autopilot following the swaying marker in its video, without
+the game loop. Phases:
+- follow: how far off centre the marker stays (fractions of the frame, from the simulator's
+  ground truth), and the frame-to-command latency: decode to command published by the
+  autopilot, then published to sent by DroneMovementThread,
+- watchdog: the simulator stops sending video, like a dropped video link; how long until the
+  drone is told to hover,
+- override: the pilot pushes forward for a second; whether any autopilot command got through.
+
+    python benchmarks/bench_autopilot.py --seconds 20 --output bench_autopilot.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from HighRollerAutopilot import Autopilot
+from HighRollerCamera import CameraThread
+from HighRollerMovement import DroneMovementThread
+from HighRollerSimulator import create_drone
+
+
+def offsets(drone):
+    """The marker's offset from the frame centre according to the simulator, or None."""
+    simulator = drone.simulator
+    with simulator.lock:
+        view = simulator.target_view()
+    if view is None:
+        return None
+    x, y, _ = view
+    return x / simulator.width - 0.5, y / simulator.height - 0.5
+
+
+def follow(drone, autopilot, seconds):
+    samples = []
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        time.sleep(0.1)
+        offset = offsets(drone)
+        samples.append((autopilot.status.state, offset))
+    settled = samples[len(samples) // 4:]  #Leave out the first quarter, while it turns onto the target
+    errors = np.array([np.hypot(*offset) if offset is not None else 0.5 for _, offset in settled])
+    tracking = sum(state == 'tracking' for state, _ in settled) / len(settled)
+    return {'tracking_fraction': tracking, 'error_mean': float(errors.mean()),
+            'error_p95': float(np.percentile(errors, 95))}
+
+
+def watchdog(drone, movement, autopilot):
+    simulator = drone.simulator
+    with simulator.lock:
+        simulator.streaming = False
+    stopped = time.monotonic()
+    reaction = None
+    while time.monotonic() - stopped < 5:
+        if movement.command.velocity == (0, 0, 0, 0) and autopilot.status.state == 'stale':
+            reaction = time.monotonic() - stopped
+            break
+        time.sleep(0.005)
+    with simulator.lock:
+        simulator.streaming = True
+    return reaction
+
+
+def override(movement, autopilot, seconds=1.0):
+    pilot = (0, 30, 0, 0)
+    leaked = 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        if autopilot.pilot_input(pilot):
+            movement.set_velocity(*pilot)
+        time.sleep(1 / 30)
+        leaked += movement.command.velocity != pilot
+    if autopilot.pilot_input((0, 0, 0, 0)):
+        movement.set_velocity(0, 0, 0, 0)
+    return leaked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=20.0, help="how long to follow the marker")
+    parser.add_argument('--rate', type=int, default=30, help="autopilot control rate")
+    parser.add_argument('--output', default='bench_autopilot.json', help="where to write the JSON results")
+    args = parser.parse_args()
+
+    drone = create_drone('sim')
+    drone.connect()
+    camera = CameraThread(drone)
+    movement = DroneMovementThread(drone)
+    autopilot = None
+    try:
+        camera.start()
+        drone.takeoff()
+        autopilot = Autopilot(camera, movement, rate=args.rate)
+        autopilot.engage()
+
+        results = {'follow': follow(drone, autopilot, args.seconds)}
+        latency = autopilot.latency
+        results['decode_to_publish_ms'] = {'count': latency.count, 'mean': latency.mean(),
+                                           'p50': latency.percentile(50), 'p95': latency.percentile(95),
+                                           'p99': latency.percentile(99)}
+        results['publish_to_send_ms'] = {'mean': movement.average_latency() * 1000,
+                                         'max': movement.latency_max * 1000}
+        reaction = watchdog(drone, movement, autopilot)
+        results['watchdog_reaction_ms'] = reaction * 1000 if reaction is not None else None
+        time.sleep(2)  #Let the video come back and the autopilot pick the target up again
+        results['override_leaked_frames'] = override(movement, autopilot)
+        results['watchdog_trips'] = autopilot.watchdog_trips
+    finally:
+        if autopilot is not None:
+            autopilot.stop()
+        movement.stop()
+        camera.stop()
+        drone.end()
+        drone.simulator.stop()
+
+    follow_results = results['follow']
+    print(f"follow:   tracking {follow_results['tracking_fraction']:.0%} of the time, off centre mean "
+          f"{follow_results['error_mean']:.3f} p95 {follow_results['error_p95']:.3f} of the frame")
+    stats = results['decode_to_publish_ms']
+    print(f"latency:  decode to publish mean {stats['mean']:.1f} ms, p50 {stats['p50']:.0f} ms, "
+          f"p95 {stats['p95']:.0f} ms, p99 {stats['p99']:.0f} ms over {stats['count']} commands; "
+          f"publish to send mean {results['publish_to_send_ms']['mean']:.1f} ms")
+    print(f"watchdog: hover {results['watchdog_reaction_ms']:.0f} ms after the video stopped"
+          if reaction is not None else "watchdog: never hovered")
+    print(f"override: {results['override_leaked_frames']} frames where an autopilot command replaced the pilot's")
+
+    output = os.path.abspath(args.output)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"wrote {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""CPU used by the camera thread while a synthetic decoder produces frames.
+
+Compares the old busy-spinning loop (read .frame + cv2.flip as fast as possible) against the
+event-driven CameraThread. Each case is measured as process CPU time over wall time, minus a
+run with only the synthetic decoder, so the number is what the consumer thread itself costs:
+
+    python benchmarks/bench_camera_cpu.py --seconds 3 --fps 30
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from HighRollerCamera import CameraFrame, CameraThread
+
+
+class SyntheticFrameSource:
+    """Stands in for the Tello decoder: stores a fresh 960x720 frame `fps` times a second."""
+
+    def __init__(self, fps, width=960, height=720):
+        self.interval = 1.0 / fps
+        self.images = [np.full((height, width, 3), i * 40, dtype=np.uint8) for i in range(4)]
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.timestamp = time.monotonic()
+        self.frame = self.images[0]
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.produce, daemon=True)
+        self.thread.start()
+
+    def produce(self):
+        next_time = time.monotonic()
+        while self.running:
+            next_time += self.interval
+            time.sleep(max(0.0, next_time - time.monotonic()))
+            with self.condition:
+                self.sequence += 1
+                self.frame = self.images[self.sequence % len(self.images)]
+                self.timestamp = time.monotonic()
+                self.condition.notify_all()
+
+    def wait_for_frame(self, last_sequence, timeout=None):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.sequence != last_sequence, timeout):
+                return None
+            return CameraFrame(self.sequence, self.timestamp, self.frame)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+
+class NoStreamDrone:
+    """The camera threads only need streamon/streamoff from the drone here."""
+
+    def streamon(self):
+        pass
+
+    def streamoff(self):
+        pass
+
+
+class BusySpinCameraThread:
+    """The CameraThread loop as it was before it waited for the decoder."""
+
+    def __init__(self, source):
+        self.source = source
+        self.frame = None
+        self.running = False
+        self.thread = threading.Thread(target=self.update, daemon=True)
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+
+    def update(self):
+        while self.running:
+            frame = self.source.frame
+            if frame is not None:
+                self.frame = cv2.flip(frame, 1)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+
+def measure(seconds, fps, make_consumer):
+    source = SyntheticFrameSource(fps)
+    source.start()
+    consumer = make_consumer(source) if make_consumer else None
+    if consumer:
+        consumer.start()
+
+    wall_start = time.monotonic()
+    cpu_start = time.process_time()
+    time.sleep(seconds)
+    cpu = time.process_time() - cpu_start
+    wall = time.monotonic() - wall_start
+
+    if consumer:
+        consumer.stop()
+    source.stop()
+    return 100.0 * cpu / wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--fps', type=int, default=30)
+    args = parser.parse_args()
+
+    baseline = measure(args.seconds, args.fps, None)
+    busy = measure(args.seconds, args.fps, BusySpinCameraThread)
+    waiting = measure(args.seconds, args.fps, lambda source: CameraThread(NoStreamDrone(), frame_source=source))
+
+    print(f"synthetic decoder at {args.fps} FPS for {args.seconds:.1f}s (CPU % of one core)")
+    print(f"decoder only      {baseline:6.1f}%")
+    print(f"busy-spin thread  {busy - baseline:6.1f}%")
+    print(f"CameraThread      {waiting - baseline:6.1f}%")
+
+
+if __name__ == '__main__':
+    main()
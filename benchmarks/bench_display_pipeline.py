@@ -0,0 +1,93 @@
+"""Per-frame cost of drawing a Tello frame to the 1280x720 window.
+
+Compares the old flip -> make_surface -> rotate -> scale chain against FramePipeline.
+Runs headless under the SDL dummy driver:
+
+    python benchmarks/bench_display_pipeline.py --frames 300
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+import pygame
+
+from HighRollerDisplay import FramePipeline
+
+SCREEN_WIDTH = 1280
+SCREEN_HEIGHT = 720
+
+
+def legacy_stages(screen, frame):
+    flipped = cv2.flip(frame, 1)
+    surface = pygame.surfarray.make_surface(flipped)
+    rotated = pygame.transform.rotate(surface, -90)
+    scaled = pygame.transform.scale(rotated, (SCREEN_WIDTH, SCREEN_HEIGHT))
+    screen.blit(scaled, (0, 0))
+    return (flipped, surface, rotated, scaled)
+
+
+def pipeline_stages(screen, frame, pipeline):
+    surface = pipeline.convert(frame)
+    screen.blit(surface, (0, 0))
+    return (pipeline.buffer, surface)
+
+
+def run(name, draw, frames, screen, source):
+    times = []
+    transient_bytes = []
+    new_objects = []
+    previous = None
+
+    tracemalloc.start()
+    for i in range(frames):
+        frame = source[i % len(source)]
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        stages = draw(screen, frame)
+        times.append(time.perf_counter() - start)
+        transient_bytes.append(tracemalloc.get_traced_memory()[1] - baseline)
+
+        #A stage output that is not the very object it produced last frame was freshly allocated.
+        #Holding on to the previous tuple keeps ids from being recycled between frames.
+        if previous is not None:
+            new_objects.append(sum(1 for now, before in zip(stages, previous) if now is not before))
+        previous = stages
+    tracemalloc.stop()
+
+    times_ms = sorted(t * 1000 for t in times)
+    print(f"{name:<10} mean {statistics.mean(times_ms):6.2f} ms"
+          f"  p95 {times_ms[int(len(times_ms) * 0.95) - 1]:6.2f} ms"
+          f"  full-frame allocations/frame {statistics.mean(new_objects):.1f}"
+          f"  traced bytes/frame {statistics.mean(transient_bytes) / 1024:8.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=960, help="camera frame width")
+    parser.add_argument('--height', type=int, default=720, help="camera frame height")
+    args = parser.parse_args()
+
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    rng = np.random.default_rng(0)
+    source = [rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8) for _ in range(4)]
+    pipeline = FramePipeline(SCREEN_WIDTH, SCREEN_HEIGHT)
+
+    print(f"{args.frames} frames of {args.width}x{args.height} -> {SCREEN_WIDTH}x{SCREEN_HEIGHT}")
+    run("before", legacy_stages, args.frames, screen, source)
+    run("after", lambda s, f: pipeline_stages(s, f, pipeline), args.frames, screen, source)
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
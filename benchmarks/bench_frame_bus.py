@@ -0,0 +1,135 @@
+"""Several consumers on one camera feed: polling CameraThread.frame versus FrameBus subscriptions.
+
+A publisher puts out 960x720 frames at 30 FPS for --seconds. Four consumers each take a fixed
+time per frame, like the real ones:
+- display: 5 ms, wants the newest frame ('latest'),
+- analysis: 80 ms, a detector slower than the feed ('latest'),
+- recorder: 45 ms, an encoder that falls behind now and then ('drop-oldest', 30 frames),
+- capture: 20 ms, must see every frame ('block', 8 frames).
+
+"poll" is how consumers read the feed before the bus: re-reading the one shared frame reference
+and skipping it if the sequence hasn't changed. Per consumer it reports frames seen, missed and
+(for poll) read again, and for the bus the drop count and how long the publisher was blocked,
+plus the publisher's time per frame and the bytes copied per frame:
+
+    python benchmarks/bench_frame_bus.py --seconds 10
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from HighRollerCamera import CameraFrame
+from HighRollerFrameBus import FrameBus
+
+FPS = 30
+CONSUMERS = (  #Name, seconds per frame, policy, capacity
+    ('display', 0.005, 'latest', 1),
+    ('analysis', 0.080, 'latest', 1),
+    ('recorder', 0.045, 'drop-oldest', 30),
+    ('capture', 0.020, 'block', 8),
+)
+
+
+class SharedReference:
+    """The feed as CameraThread.frame offers it: one reference, replaced by every new frame."""
+
+    def __init__(self):
+        self.frame = None
+        self.closed = False
+
+    def publish(self, frame):
+        self.frame = frame
+
+
+def poll_consumer(feed, work, counts):
+    last_sequence = None
+    while not feed.closed:
+        frame = feed.frame
+        if frame is None or frame.sequence == last_sequence:
+            counts['reread'] += frame is not None
+            time.sleep(0.002)
+            continue
+        if last_sequence is not None:
+            counts['missed'] += frame.sequence - last_sequence - 1
+        last_sequence = frame.sequence
+        counts['seen'] += 1
+        time.sleep(work)
+
+
+def bus_consumer(subscription, work, counts):
+    while True:
+        frame = subscription.get()
+        if frame is None:
+            break
+        counts['seen'] += 1
+        time.sleep(work)
+
+
+def publish(feed, frames, images):
+    timings = []
+    next_time = time.monotonic()
+    for sequence in range(1, frames + 1):
+        next_time += 1 / FPS
+        time.sleep(max(0.0, next_time - time.monotonic()))
+        #A fresh array per frame, like the decoder hands out
+        frame = CameraFrame(sequence, time.monotonic(), images[sequence % len(images)].copy())
+        start = time.perf_counter()
+        feed.publish(frame)
+        timings.append(time.perf_counter() - start)
+    return np.array(timings) * 1e6
+
+
+def run(mode, frames, images):
+    if mode == 'poll':
+        feed = SharedReference()
+        workers = {name: (poll_consumer, (feed, work)) for name, work, _, _ in CONSUMERS}
+    else:
+        feed = FrameBus()
+        workers = {name: (bus_consumer, (feed.subscribe(name, capacity, policy), work))
+                   for name, work, policy, capacity in CONSUMERS}
+    counts = {name: {'seen': 0, 'missed': 0, 'reread': 0} for name in workers}
+    threads = [threading.Thread(target=target, args=args + (counts[name],))
+               for name, (target, args) in workers.items()]
+    for thread in threads:
+        thread.start()
+    timings = publish(feed, frames, images)
+    if mode == 'poll':
+        feed.closed = True
+    else:
+        for subscription in feed.subscriptions:
+            subscription.close()
+    for thread in threads:
+        thread.join()
+
+    print(f"{mode}: publish p50 {np.percentile(timings, 50):.0f} us, p99 {np.percentile(timings, 99):.0f} us, "
+          f"{getattr(feed, 'copied', 0) * images[0].nbytes / frames / 1e6:.1f} MB copied per frame")
+    stats = feed.stats() if mode == 'bus' else {}
+    for name, count in counts.items():
+        line = f"  {name:<9} seen {count['seen']:5d}/{frames}"
+        if mode == 'poll':
+            line += f"  missed {count['missed']:5d}  read again {count['reread']:6d}"
+        else:
+            line += f"  dropped {stats[name]['dropped']:5d}  publisher blocked {stats[name]['blocked_s'] * 1000:6.0f} ms"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args()
+
+    frames = int(args.seconds * FPS)
+    random = np.random.default_rng(0)
+    images = [random.integers(0, 256, (720, 960, 3), dtype=np.uint8) for _ in range(4)]
+    for mode in ('poll', 'bus'):
+        run(mode, frames, images)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Where the 33 ms frame budget goes: runs the real game loop headless and times each stage.
+
+HighRollerDroneControllerThreading.py is executed as is under the SDL dummy video driver,
+flying the local simulator (HIGHROLLER_DRONE=sim) with stage timing on (HIGHROLLER_PROFILE=1).
+A scripted pilot turns the video on, takes off, flies around, opens the controls overlay and
+quits. Prints p50/p95/p99 per stage and writes them to a JSON file:
+
+    python benchmarks/bench_game_loop.py --frames 600 --output bench_game_loop.json
+"""
+import argparse
+import os
+import runpy
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ['HIGHROLLER_DRONE'] = 'sim'
+os.environ['HIGHROLLER_PROFILE'] = '1'
+
+import pygame
+
+
+class ScriptedKeys:
+    """Stands in for pygame.key.get_pressed(): the dummy driver has no keyboard to hold keys down."""
+
+    def __init__(self, held):
+        self.held = held
+
+    def __getitem__(self, key):
+        return key in self.held
+
+
+class ScriptedPilot:
+    """Feeds the game loop one frame's worth of key presses and held keys per pygame.event.get()."""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.frame = 0
+        self.presses = {
+            5: [pygame.K_TAB],  #Video on
+            45: [pygame.K_SPACE],  #Takeoff
+            frames // 2: [pygame.K_c],  #Controls overlay on
+            frames * 3 // 4: [pygame.K_UP],  #Flip forward
+        }
+        self.real_get = pygame.event.get
+
+    def held(self):
+        #Fly a box: forward, right, back, left while yawing, then hover
+        leg = (self.frame // 60) % 5
+        return {0: {pygame.K_w}, 1: {pygame.K_d, pygame.K_e}, 2: {pygame.K_s}, 3: {pygame.K_a, pygame.K_q}}.get(leg, set())
+
+    def get_events(self, *args, **kwargs):
+        for key in self.presses.get(self.frame, []):
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode='', scancode=0))
+        if self.frame >= self.frames:
+            pygame.event.post(pygame.event.Event(pygame.QUIT))
+        events = self.real_get(*args, **kwargs)
+        self.frame += 1
+        return events
+
+    def get_pressed(self):
+        return ScriptedKeys(self.held() if self.frame > 60 else set())
+
+
+def print_summary(summary):
+    print(f"{'stage':<10}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}   (ms)")
+    for stage, stats in summary.items():
+        print(f"{stage:<10}{stats['mean_ms']:9.3f}{stats['p50_ms']:9.3f}{stats['p95_ms']:9.3f}{stats['p99_ms']:9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--output', default='bench_game_loop.json', help="where to write the JSON results")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    pilot = ScriptedPilot(args.frames)
+    pygame.event.get = pilot.get_events
+    pygame.key.get_pressed = pilot.get_pressed
+
+    os.chdir(ROOT)  #The controller loads its logo from the working directory
+    controller = runpy.run_path(os.path.join(ROOT, 'HighRollerDroneControllerThreading.py'), run_name='__main__')
+    stage_timer = controller['stage_timer']
+
+    summary = stage_timer.summary()
+    print_summary(summary)
+    stage_timer.write_json(output, fps_target=controller['FPS'],
+                           budget_ms=1000 / controller['FPS'],
+                           rc_packets_sent=controller['movement_thread'].packets_sent)
+    print(f"wrote {output}")
+
+
+if __name__ == '__main__':
+    main()
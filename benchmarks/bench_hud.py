@@ -0,0 +1,67 @@
+"""HUD + controls overlay render time per frame, with and without the text cache.
+
+"uncached" renders every label with font.render and rebuilds the controls overlay each frame,
+like render_hud()/render_controls() used to. Telemetry changes every third frame, roughly the
+Tello's state packet rate at 30 FPS:
+
+    python benchmarks/bench_hud.py --frames 1000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+
+from HighRollerHud import Hud
+from HighRollerTelemetry import TelemetrySnapshot
+
+
+class UncachedHud(Hud):
+    def text(self, text, color=(255, 255, 255)):
+        return self.font.render(text, True, color)
+
+    def render_controls(self):
+        self.controls_surface = self.build_controls_surface()
+        super().render_controls()
+
+
+def run(name, hud, frames, key_states):
+    times = []
+    for i in range(frames):
+        packet = i // 3
+        telemetry = TelemetrySnapshot(i / 30, 90 - packet // 100, 60.0 + packet % 3, packet % 200, 1234.0, packet // 10)
+        start = time.perf_counter()
+        hud.render_hud(key_states, telemetry)
+        hud.render_controls()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    print(f"{name:<9} mean {statistics.mean(times):6.3f} ms  p50 {times[len(times) // 2]:6.3f} ms"
+          f"  p95 {times[int(len(times) * 0.95) - 1]:6.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=1000)
+    args = parser.parse_args()
+
+    pygame.init()
+    screen = pygame.display.set_mode((1280, 720))
+    font = pygame.font.Font(None, 25)
+    key_states = {key: False for key in (pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d, pygame.K_q,
+                                         pygame.K_e, pygame.K_SPACE, pygame.K_LCTRL, pygame.K_l)}
+    key_states[pygame.K_w] = True
+
+    run("uncached", UncachedHud(screen, font), args.frames, key_states)
+    cached = Hud(screen, font)
+    run("cached", cached, args.frames, key_states)
+    print(f"text cache hits {cached.text_cache.hits}, misses {cached.text_cache.misses}")
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""RC commands published per second with and without input shaping, for the same scripted session.
+
+A pilot taps and holds movement keys while a gamepad stick drifts around its centre with a bit of
+sensor noise and is pushed to a few deflections, at 30 FPS. "raw" is ControlInput with no
+deadzone, expo or ramp and a resolution of 1, i.e. every stick wobble is a new command; "shaped"
+uses the controllers' defaults. Every change of the vector is one command DroneMovementThread
+sends:
+
+    python benchmarks/bench_input.py --seconds 60
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pygame
+
+from HighRollerInput import JOYSTICK_AXES, ControlInput
+
+FPS = 30
+
+
+class ScriptedKeys:
+    def __init__(self):
+        self.held = set()
+
+    def __getitem__(self, key):
+        return key in self.held
+
+
+class ScriptedStick:
+    """Stands in for a pygame Joystick: the right stick pushed forward now and then, plus noise."""
+
+    def __init__(self, seed=0):
+        self.random = np.random.default_rng(seed)
+        self.forward = 0.0
+
+    def get_numaxes(self):
+        return 6
+
+    def get_axis(self, axis):
+        position = -self.forward if axis == JOYSTICK_AXES[1] else 0.0
+        return float(np.clip(position + self.random.normal(0, 0.02), -1, 1))
+
+
+def run(name, control_input, frames):
+    keys = ScriptedKeys()
+    stick = ScriptedStick()
+    control_input.joystick = stick
+    last = None
+    commands = 0
+    jumps = []
+    times = []
+    for i in range(frames):
+        second = i // FPS % 10
+        keys.held = {pygame.K_w} if second in (1, 2) else {pygame.K_q} if second == 4 else set()
+        stick.forward = 0.6 if second in (6, 7) else 0.0
+        start = time.perf_counter()
+        velocity = control_input.update(keys, i / FPS)
+        times.append((time.perf_counter() - start) * 1e6)
+        if velocity != last:
+            commands += 1
+            if last is not None:
+                jumps.append(max(abs(a - b) for a, b in zip(velocity, last)))
+            last = velocity
+    times.sort()
+    seconds = frames / FPS
+    print(f"{name:<7} {commands / seconds:6.1f} commands/s  largest step {max(jumps, default=0):4d}"
+          f"  mean step {statistics.mean(jumps) if jumps else 0:5.1f}"
+          f"  update p50 {times[len(times) // 2]:5.1f} us  p95 {times[int(len(times) * 0.95) - 1]:5.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=60.0)
+    args = parser.parse_args()
+
+    pygame.init()
+    frames = int(args.seconds * FPS)
+    run("raw", ControlInput(deadzone=0, expo=0, ramp_up=np.inf, ramp_down=np.inf, resolution=1), frames)
+    run("shaped", ControlInput(), frames)
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""How long a controller takes to show its window, connect and show video, from process start.
+
+Each run starts a fresh interpreter that executes the controller script as is under the SDL
+dummy video driver, with TAB pressed on the very first frame and QUIT after --seconds. Times are
+measured from just before the child process is started, so imports count. Per run it reports:
+- first frame: the window shows the logo,
+- connected: the drone answered (DroneConnection.connected),
+- cv2: when cv2 was first imported,
+- first video: a camera frame was on screen (HighRollerDroneControllerThreading.py only),
+- longest gap: the longest time between two frames, i.e. how long the loop was ever blocked.
+
+"sim" flies the local simulator; "unreachable" is a real Tello backend with no drone around,
+like starting the controller before switching the drone on:
+
+    python benchmarks/bench_startup.py --runs 3 --output bench_startup.json
+"""
+import argparse
+import json
+import os
+import runpy
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPTS = ('HighRollerDroneControllerThreading.py', 'HighRollerDroneController.py')
+SCENARIOS = {'sim': 'sim', 'unreachable': 'tello'}  #Name -> HIGHROLLER_DRONE
+EVENTS = ('first_frame', 'connected', 'cv2', 'first_video')
+
+
+class StartupProbe:
+    """Wraps pygame's display and event calls to timestamp what the controller has got to."""
+
+    def __init__(self, started, seconds):
+        import pygame
+
+        self.pygame = pygame
+        self.started = started
+        self.seconds = seconds
+        self.times = {}
+        self.last_present = None
+        self.longest_gap = 0.0
+        self.real_flip = pygame.display.flip
+        self.real_update = pygame.display.update
+        self.real_get = pygame.event.get
+        pygame.display.flip = self.flip
+        pygame.display.update = self.update
+        pygame.event.get = self.get_events
+
+    def mark(self, name, condition=True):
+        if condition and name not in self.times:
+            self.times[name] = time.time() - self.started
+
+    def presented(self):
+        now = time.time()
+        if self.last_present is not None:
+            self.longest_gap = max(self.longest_gap, now - self.last_present)
+        self.last_present = now
+        self.mark('first_frame')
+        self.mark('cv2', 'cv2' in sys.modules)
+
+        controller = vars(sys.modules['__main__'])
+        connection = controller.get('drone_connection')
+        self.mark('connected', connection is not None and connection.is_connected())
+        self.mark('first_video', controller.get('video_frame') is not None)
+
+    def flip(self):
+        self.real_flip()
+        self.presented()
+
+    def update(self, *args):
+        self.real_update(*args)
+        self.presented()
+
+    def get_events(self, *args, **kwargs):
+        pygame = self.pygame
+        if 'first_frame' in self.times and not hasattr(self, 'pressed'):
+            self.pressed = True
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_TAB, mod=0, unicode='', scancode=0))
+        if time.time() - self.started > self.seconds:
+            pygame.event.post(pygame.event.Event(pygame.QUIT))
+        return self.real_get(*args, **kwargs)
+
+
+def child(script, started, seconds):
+    probe = StartupProbe(started, seconds)
+    os.chdir(ROOT)  #The controller loads its logo from the working directory
+    sys.path.insert(0, ROOT)
+    try:
+        runpy.run_path(os.path.join(ROOT, script), run_name='__main__')
+    finally:
+        print('STARTUP ' + json.dumps({'times': probe.times, 'longest_gap': probe.longest_gap}), flush=True)
+
+
+def run(script, backend, seconds):
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', HIGHROLLER_DRONE=backend)
+    started = time.time()
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', script,
+                             '--started', repr(started), '--seconds', str(seconds)],
+                            env=env, cwd=ROOT, capture_output=True, text=True, timeout=seconds + 60)
+    for line in result.stdout.splitlines():
+        if line.startswith('STARTUP '):
+            return json.loads(line[len('STARTUP '):])
+    print(result.stdout[-2000:], result.stderr[-2000:])
+    return {'times': {}, 'longest_gap': None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--seconds', type=float, default=4.0, help="how long each controller runs")
+    parser.add_argument('--output', default='bench_startup.json', help="where to write the JSON results")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--started', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.started, args.seconds)
+        return
+
+    results = []
+    print(f"{'script':<40}{'scenario':<13}" + ''.join(f"{name:>13}" for name in EVENTS) + f"{'longest gap':>13}   (s)")
+    for script in SCRIPTS:
+        for scenario, backend in SCENARIOS.items():
+            runs = [run(script, backend, args.seconds) for _ in range(args.runs)]
+            median = {}
+            for name in EVENTS:
+                values = sorted(r['times'][name] for r in runs if name in r['times'])
+                median[name] = values[len(values) // 2] if len(values) == len(runs) else None
+            gaps = sorted(r['longest_gap'] for r in runs if r['longest_gap'] is not None)
+            median['longest_gap'] = gaps[len(gaps) // 2] if gaps else None
+            results.append({'script': script, 'scenario': scenario, 'runs': runs, 'median': median})
+            print(f"{script:<40}{scenario:<13}" + ''.join(
+                f"{median[name]:>13.3f}" if median[name] is not None else f"{'-':>13}"
+                for name in EVENTS + ('longest_gap',)))
+
+    output = os.path.abspath(args.output)
+    with open(output, 'w') as file:
+        json.dump({'seconds': args.seconds, 'results': results}, file, indent=2)
+    print(f"wrote {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""What ground-station viewers cost the camera feed, and what they receive, over loopback.
+
+A FrameBus gets 960x720 frames at 30 FPS, with telemetry changing like it does in flight, and a
+GroundStationServer streams them on 127.0.0.1. Loopback GroundStationClients connect in phases:
+- 0, 1 and 4 viewers,
+- 4 viewers plus one that connects and never reads, like a frozen laptop,
+- churn: viewers connecting and disconnecting every 200 ms.
+
+Per phase it reports how long publishing a frame to the bus takes (what the camera thread
+would feel), JPEG encodes per second (one per frame, however many viewers there are), frames
+and kB per second per viewer, and telemetry bytes per second against sending the whole
+snapshot as JSON on every sample:
+
+    python benchmarks/bench_streaming.py --seconds 5 --output bench_streaming.json
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from HighRollerCamera import CameraFrame
+from HighRollerFrameBus import FrameBus
+from HighRollerMovement import RcCommand
+from HighRollerStreaming import TELEMETRY_FIELDS, GroundStationClient, GroundStationServer
+from HighRollerTelemetry import TelemetrySnapshot
+
+FPS = 30
+
+
+class FakeFlight:
+    """Telemetry and RC commands like a drone in flight: height and RC change, the rest rarely."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+
+    @property
+    def snapshot(self):
+        t = time.monotonic() - self.started
+        return TelemetrySnapshot(time.monotonic(), 90 - int(t / 30), 68.0, int(100 + 30 * np.sin(t)),
+                                 10000 + round(30 * np.sin(t)), int(t))
+
+    @property
+    def command(self):
+        t = time.monotonic() - self.started
+        return RcCommand(0, 40 if int(t) % 4 < 2 else 0, 0, int(30 * np.sin(t)), 0, 0.0)
+
+
+class Feed:
+    """Publishes frames to the bus at FPS on its own thread, timing each publish()."""
+
+    def __init__(self, bus):
+        self.bus = bus
+        height, width = 720, 960
+        #Smooth gradients with a moving bar, so JPEG sizes are like a real scene and not like noise
+        self.base = np.empty((height, width, 3), dtype=np.uint8)
+        self.base[:, :, 0] = np.arange(width, dtype=np.uint16).astype(np.uint8)
+        self.base[:, :, 1] = (np.arange(height, dtype=np.uint16)[:, None] // 3).astype(np.uint8)
+        self.base[:, :, 2] = 96
+        self.timings = []
+        self.running = True
+        self.thread = threading.Thread(target=self.update, daemon=True)
+        self.thread.start()
+
+    def update(self):
+        sequence = 0
+        next_time = time.monotonic()
+        while self.running:
+            next_time += 1 / FPS
+            time.sleep(max(0.0, next_time - time.monotonic()))
+            sequence += 1
+            image = self.base.copy()
+            bar = sequence * 8 % image.shape[1]
+            image[:, bar:bar + 24] = 255
+            start = time.perf_counter()
+            self.bus.publish(CameraFrame(sequence, time.monotonic(), image))
+            self.timings.append(time.perf_counter() - start)
+
+    def take_timings(self):
+        timings, self.timings = self.timings, []
+        return np.array(timings) * 1e6
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+
+def phase(name, server, feed, seconds, viewers=0, stalled=False, churn=False):
+    clients = [GroundStationClient('127.0.0.1', server.port) for _ in range(viewers)]
+    stalled_socket = None
+    if stalled:
+        stalled_socket = socket.create_connection(('127.0.0.1', server.port))
+        stalled_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        stalled_socket.sendall(b'GET /video.mjpg HTTP/1.0\r\n\r\n')  #And never reads a byte
+
+    time.sleep(0.5)  #Let the viewers connect
+    feed.take_timings()
+    encoded = server.encoded
+    started = time.monotonic()
+    frames = [client.frames for client in clients]
+    video_bytes = [client.video_bytes for client in clients]
+    telemetry_bytes = [client.telemetry_bytes for client in clients]
+    churned = 0
+    end = started + seconds
+    while time.monotonic() < end:
+        if churn:
+            client = GroundStationClient('127.0.0.1', server.port)
+            time.sleep(0.2)
+            client.close()
+            churned += 1
+        else:
+            time.sleep(0.1)
+    elapsed = time.monotonic() - started
+
+    timings = feed.take_timings()
+    result = {
+        'viewers': viewers + stalled,
+        'publish_p50_us': float(np.percentile(timings, 50)),
+        'publish_p99_us': float(np.percentile(timings, 99)),
+        'encodes_per_s': (server.encoded - encoded) / elapsed,
+    }
+    if clients:
+        result['viewer_fps'] = min(c.frames - f for c, f in zip(clients, frames)) / elapsed
+        result['viewer_video_kB_per_s'] = float(np.mean([c.video_bytes - b for c, b in zip(clients, video_bytes)])) \
+            / elapsed / 1024
+        result['viewer_telemetry_B_per_s'] = float(np.mean([c.telemetry_bytes - b
+                                                            for c, b in zip(clients, telemetry_bytes)])) / elapsed
+    if churn:
+        result['churned'] = churned
+    for client in clients:
+        client.close()
+    if stalled_socket is not None:
+        stalled_socket.close()
+    time.sleep(0.3)  #Let the server notice the viewers are gone
+    print(f"{name:<24}" + '  '.join(f"{key} {value:.1f}" if isinstance(value, float) else f"{key} {value}"
+                                    for key, value in result.items()))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5.0, help="length of each phase")
+    parser.add_argument('--output', default='bench_streaming.json', help="where to write the JSON results")
+    args = parser.parse_args()
+
+    bus = FrameBus()
+    flight = FakeFlight()
+    server = GroundStationServer(bus, flight, flight, host='127.0.0.1', port=0)
+    feed = Feed(bus)
+    results = {}
+    try:
+        results['no viewers'] = phase('no viewers', server, feed, args.seconds)
+        results['1 viewer'] = phase('1 viewer', server, feed, args.seconds, viewers=1)
+        results['4 viewers'] = phase('4 viewers', server, feed, args.seconds, viewers=4)
+        results['4 viewers + stalled'] = phase('4 viewers + stalled', server, feed, args.seconds, viewers=4,
+                                               stalled=True)
+        results['churn'] = phase('churn', server, feed, args.seconds, viewers=1, churn=True)
+    finally:
+        feed.stop()
+        server.stop()
+
+    #Every sample as a JSON object, the obvious alternative to binary deltas
+    values = dict(zip(TELEMETRY_FIELDS, (90, 68.0, 123, 10012, 42, 0, 40, 0, -17)))
+    results['json_telemetry_B_per_s'] = len(json.dumps(values)) / server.telemetry_period
+    print(f"telemetry as JSON snapshots would be {results['json_telemetry_B_per_s']:.0f} B/s per viewer")
+
+    output = os.path.abspath(args.output)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"wrote {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""How swarm mode scales with the number of drones, against local simulators.
+
+For each swarm size the simulators run in a child process, so the CPU figure is the
+controller's alone. The controller side is the real SwarmTransport plus a SwarmView drawn at
+30 fps under the SDL dummy driver. RC vectors change ten times a second and every drone is
+asked for its battery twice a second. Per size it reports:
+- decoded frames and state packets per drone per second,
+- command round trip times,
+- how late the render task woke up,
+- controller CPU and thread count.
+
+    python benchmarks/bench_swarm.py --drones 1,2,4,8 --seconds 10 --output bench_swarm.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+
+from HighRollerSwarm import SwarmTransport, SwarmView, simulator_drones, start_simulators
+
+WARMUP = 2.0  #Seconds for every stream to reach its first keyframe before measuring
+
+
+def run_simulators(count, width, height, ready, stop):
+    simulators = start_simulators(count, width, height)
+    ready.set()
+    stop.wait()
+    for simulator in simulators:
+        simulator.stop()
+
+
+async def measure(drones, seconds):
+    screen = pygame.display.set_mode((1280, 720))
+    view = SwarmView(screen, drones, pygame.font.Font(None, 25))
+    transport = await SwarmTransport(drones, view.tile_size).start()
+    await transport.broadcast('command')
+    await transport.broadcast('streamon')
+
+    round_trips = []
+    lateness = []
+    measuring = False
+
+    async def render():
+        next_frame = time.monotonic()
+        while True:
+            view.draw()
+            pygame.display.flip()
+            next_frame = max(next_frame + 1 / 30, time.monotonic())
+            await asyncio.sleep(next_frame - time.monotonic())
+            if measuring:
+                lateness.append(time.monotonic() - next_frame)
+
+    async def query():
+        while True:
+            start = time.monotonic()
+            for response in await transport.broadcast('battery?', 1.0):
+                if measuring and not response.startswith('Aborting'):
+                    round_trips.append(time.monotonic() - start)
+            await asyncio.sleep(0.5)
+
+    async def steer():
+        step = 0
+        while True:
+            step += 1
+            for i, drone in enumerate(drones):
+                transport.set_rc(drone, 0, (step + i) % 3 * 50 - 50, 0, 0)
+            await asyncio.sleep(0.1)
+
+    tasks = [asyncio.create_task(task()) for task in (render, query, steer)]
+    await asyncio.sleep(WARMUP)
+
+    frames = [drone.frames_decoded for drone in drones]
+    states = [drone.states_received for drone in drones]
+    rc_packets = sum(drone.rc_packets for drone in drones)
+    measuring = True
+    wall, cpu = time.monotonic(), time.process_time()
+    await asyncio.sleep(seconds)
+    wall, cpu = time.monotonic() - wall, time.process_time() - cpu
+    threads = threading.active_count()
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await transport.broadcast('streamoff')
+    await transport.close()
+
+    frame_rates = [(drone.frames_decoded - start) / wall for drone, start in zip(drones, frames)]
+    ms = lambda values, p: float(np.percentile(values, p) * 1000) if values else float('nan')
+    return {
+        'drones': len(drones),
+        'frames_per_drone_per_s': {'mean': float(np.mean(frame_rates)), 'min': float(np.min(frame_rates))},
+        'states_per_drone_per_s': float(np.mean([(drone.states_received - start) / wall
+                                                 for drone, start in zip(drones, states)])),
+        'rc_packets_per_s': (sum(drone.rc_packets for drone in drones) - rc_packets) / wall,
+        'command_rtt_ms': {'p50': ms(round_trips, 50), 'p95': ms(round_trips, 95)},
+        'render_late_ms': {'p50': ms(lateness, 50), 'p95': ms(lateness, 95)},
+        'cpu_percent': cpu / wall * 100,
+        'threads': threads,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--drones', default='1,2,4,8', help="comma separated swarm sizes")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--width', type=int, default=480, help="simulated camera width")
+    parser.add_argument('--height', type=int, default=360, help="simulated camera height")
+    parser.add_argument('--output', default='bench_swarm.json', help="where to write the JSON results")
+    args = parser.parse_args()
+
+    pygame.init()
+    results = []
+    print(f"{'drones':>6}{'fps/drone':>11}{'min':>7}{'state/s':>9}{'rtt p50':>9}{'rtt p95':>9}"
+          f"{'late p95':>10}{'cpu %':>8}{'threads':>9}")
+    for count in (int(value) for value in args.drones.split(',')):
+        ready, stop = multiprocessing.Event(), multiprocessing.Event()
+        simulators = multiprocessing.Process(target=run_simulators, args=(count, args.width, args.height, ready, stop))
+        simulators.start()
+        ready.wait()
+        try:
+            result = asyncio.run(measure(simulator_drones(count), args.seconds))
+        finally:
+            stop.set()
+            simulators.join()
+        results.append(result)
+        print(f"{count:>6}{result['frames_per_drone_per_s']['mean']:>11.1f}{result['frames_per_drone_per_s']['min']:>7.1f}"
+              f"{result['states_per_drone_per_s']:>9.1f}{result['command_rtt_ms']['p50']:>9.1f}"
+              f"{result['command_rtt_ms']['p95']:>9.1f}{result['render_late_ms']['p95']:>10.1f}"
+              f"{result['cpu_percent']:>8.1f}{result['threads']:>9}")
+    pygame.quit()
+
+    output = os.path.abspath(args.output)
+    with open(output, 'w') as file:
+        json.dump({'seconds': args.seconds, 'camera': [args.width, args.height], 'results': results}, file, indent=2)
+    print(f"wrote {output}")
+
+
+if __name__ == '__main__':
+    main()
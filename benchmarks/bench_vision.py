@@ -0,0 +1,131 @@
+"""What object detection costs the render loop, and how fresh its boxes are.
+
+HighRollerDroneControllerThreading.py is executed as is under the SDL dummy video driver, flying
+the local simulator, whose video shows an ArUco marker. The video is turned on at frame 5 and,
+except for "off", detection (V) at frame 30 with the given number of workers. Each mode runs in
+a fresh process. Per mode it reports the render FPS, the loop's busy time per frame (everything
+but the FPS sleep), detections per second, the latency from decode to boxes published, camera
+frames skipped because every worker was busy, and the fraction of detections that found the
+marker:
+
+    python benchmarks/bench_vision.py --frames 600 --output bench_vision.json
+"""
+import argparse
+import json
+import os
+import runpy
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {'off': 0, '1 worker': 1, '2 workers': 2}  #Name -> workers, 0 leaves detection off
+
+
+def child(frames, workers):
+    sys.path.insert(0, ROOT)
+    import numpy as np
+    import pygame
+    import HighRollerVision
+
+    stages = []
+
+    class BenchVisionStage(HighRollerVision.VisionStage):
+        """Uses the benchmark's worker count and counts results that found something."""
+
+        def __init__(self, camera, detector, _workers, width):
+            self.hits = 0
+
+            def counting_detector():
+                detect = detector()
+
+                def run(image):
+                    detections = detect(image)
+                    self.hits += bool(detections)
+                    return detections
+                return run
+            super().__init__(camera, counting_detector, workers, width)
+            self.spans = HighRollerVision.SpanRing(capacity=100000, enabled=True)
+            stages.append(self)
+
+    HighRollerVision.VisionStage = BenchVisionStage
+
+    presses = {5: [pygame.K_TAB]}
+    if workers:
+        presses[30] = [pygame.K_v]
+    real_get = pygame.event.get
+    count = [0]
+    started = []
+
+    def get_events(*args, **kwargs):
+        frame = count[0]
+        if frame == 60:
+            started.append(time.monotonic())  #Measure once video and detection are up
+        for key in presses.get(frame, []):
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode='', scancode=0))
+        if frame >= frames:
+            pygame.event.post(pygame.event.Event(pygame.QUIT))
+        count[0] += 1
+        return real_get(*args, **kwargs)
+
+    pygame.event.get = get_events
+    os.chdir(ROOT)  #The controller loads its logo from the working directory
+    controller = runpy.run_path(os.path.join(ROOT, 'HighRollerDroneControllerThreading.py'), run_name='__main__')
+    seconds = time.monotonic() - started[0]
+
+    busy = controller['stage_timer'].summary()['busy']
+    result = {'render_fps': (frames - 60) / seconds, 'busy_p50_ms': busy['p50_ms'], 'busy_p95_ms': busy['p95_ms']}
+    if stages:
+        stage = stages[0]
+        latencies = stage.spans.values[:min(stage.spans.count, stage.spans.capacity)] * 1000
+        result.update({
+            'detections_per_s': stage.processed / seconds,
+            'latency_mean_ms': float(latencies.mean()) if len(latencies) else None,
+            'latency_p95_ms': float(np.percentile(latencies, 95)) if len(latencies) else None,
+            'skipped': stage.skipped,
+            'hit_rate': stage.hits / stage.processed if stage.processed else None,
+        })
+    print('VISION ' + json.dumps(result), flush=True)
+
+
+def run(frames, workers):
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', HIGHROLLER_DRONE='sim', HIGHROLLER_PROFILE='1')
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', str(workers),
+                             '--frames', str(frames)],
+                            env=env, cwd=ROOT, capture_output=True, text=True, timeout=frames / 10 + 120)
+    for line in result.stdout.splitlines():
+        if line.startswith('VISION '):
+            return json.loads(line[len('VISION '):])
+    print(result.stdout[-2000:], result.stderr[-2000:])
+    return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--output', default='bench_vision.json', help="where to write the JSON results")
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        child(args.frames, args.child)
+        return
+
+    columns = ('render_fps', 'busy_p50_ms', 'busy_p95_ms', 'detections_per_s', 'latency_mean_ms',
+               'latency_p95_ms', 'skipped', 'hit_rate')
+    print(f"{'mode':<11}" + ''.join(f"{name:>18}" for name in columns))
+    results = {}
+    for mode, workers in MODES.items():
+        results[mode] = result = run(args.frames, workers)
+        print(f"{mode:<11}" + ''.join(f"{result[name]:>18.2f}" if result.get(name) is not None else f"{'-':>18}"
+                                      for name in columns))
+
+    output = os.path.abspath(args.output)
+    with open(output, 'w') as file:
+        json.dump({'frames': args.frames, 'results': results}, file, indent=2)
+    print(f"wrote {output}")
+
+
+if __name__ == '__main__':
+    main()